@@ -1,5 +1,6 @@
 # Additional Models for SONAR Rock vs Mine Prediction
 # Add these cells to your SONAR_03.ipynb notebook
+# (train_sonar_models.py runs the same comparison in parallel from the command line)
 
 # Cell: Random Forest Classifier
 print("\n" + "="*70)
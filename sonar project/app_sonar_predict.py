@@ -1,11 +1,25 @@
-from flask import Flask, render_template, request, jsonify
-import pandas as pd
+from flask import Flask, render_template, request, jsonify, Response, stream_with_context, g
 import numpy as np
 import joblib
+import hashlib
+import functools
+import json
 import os
 import sys
+import threading
+import time
 from pathlib import Path
 import warnings
+from markupsafe import Markup
+
+import sonar_metrics as metrics
+from sonar_batcher import PredictionBatcher
+from sonar_cache import PredictionCache
+from sonar_profiler import SamplingProfiler, to_folded
+from sonar_wire import (
+    BAND_COUNT_HEADER, DTYPE_HEADER, decode_request_body, encode_binary_response, request_band_count,
+    request_wire_dtype, request_wire_format, response_wire_format
+)
 
 # Ensure UTF-8 encoding for console output
 if sys.platform == 'win32':
@@ -23,6 +37,18 @@ app.config['SECRET_KEY'] = 'sonar_rock_mine_prediction_2024'
 SCRIPT_DIR = Path(__file__).resolve().parent
 print(f"📍 Application directory: {SCRIPT_DIR}")
 
+# Training data; its rows double as a golden set for checking optimized predictors
+DATA_PATH = SCRIPT_DIR.parent / 'sonar_data' / 'sonar_data.csv'
+
+# Number of SONAR frequency bands expected per return
+N_BANDS = 60
+
+# SONAR_LAZY_LOAD=1 defers model loading from import time to the first request
+LAZY_LOAD = os.environ.get('SONAR_LAZY_LOAD', '0') == '1'
+
+# Map numpy arrays inside the joblib artifacts read-only instead of copying them
+MMAP_MODELS = os.environ.get('SONAR_MMAP_MODELS', '1') == '1'
+
 # ==========================================
 # 1. LOAD MODELS AND PREPROCESSORS
 # ==========================================
@@ -62,28 +88,64 @@ def load_models():
             return None
         
         print("📦 Loading model files...")
+        load_start = time.perf_counter()
+        mmap_mode = 'r' if MMAP_MODELS else None
+        
+        # Load feature information
+        feature_info = joblib.load(str(feature_info_path), mmap_mode=mmap_mode)
+        print(f"   ✓ Feature info loaded")
+        
+        # Bands the models read: a top-K subset model lists them, otherwise all 60
+        bands = feature_info.get('selected_bands')
+        if bands is not None and list(bands) != list(range(N_BANDS)):
+            bands = np.asarray(bands, dtype=np.intp)
+            print(f"   ✓ Band subset model: {len(bands)} of {N_BANDS} bands")
+        else:
+            bands = None
+        n_features = N_BANDS if bands is None else len(bands)
         
         # Load the main XGBoost model
-        model = joblib.load(str(model_path))
+        model = load_model_artifact(model_path, mmap_mode, n_features)
         print(f"   ✓ XGBoost model loaded: {type(model).__name__}")
         
         # Load backup logistic regression model
-        backup_model = joblib.load(str(backup_model_path))
+        backup_model = load_model_artifact(backup_model_path, mmap_mode, n_features)
         print(f"   ✓ Backup model loaded: {type(backup_model).__name__}")
         
-        # Load feature information
-        feature_info = joblib.load(str(feature_info_path))
-        print(f"   ✓ Feature info loaded")
-        
         # Load risk factors (feature importance)
-        risk_factors = joblib.load(str(risk_factors_path))
+        risk_factors = joblib.load(str(risk_factors_path), mmap_mode=mmap_mode)
         print(f"   ✓ Risk factors loaded")
         
+        # Fold the scaler into a direct Booster predictor (optional fast path)
+        fused_model = build_fused_predictor(model, bands)
+        
+        # Export the backup model to a closed-form scorer (microsecond tier)
+        fast_model = build_linear_predictor(backup_model, bands=bands)
+        
+        # How far float32 octet payloads can move the served probabilities
+        float32_max_diff = float32_wire_parity(fused_model or model, bands)
+        
+        # Content hash of the artifacts identifies the version
+        digest = hashlib.sha256()
+        for path in (model_path, backup_model_path, feature_info_path, risk_factors_path):
+            digest.update(path.read_bytes())
+        version = digest.hexdigest()[:12]
+        print(f"   ✓ Model version: {version}")
+        
+        load_time_ms = (time.perf_counter() - load_start) * 1000
+        print(f"   ✓ Loaded in {load_time_ms:.0f} ms")
+        
         return {
+            'version': version,
+            'load_time_ms': load_time_ms,
             'model': model,
+            'fused_model': fused_model,
             'backup_model': backup_model,
+            'fast_model': fast_model,
             'feature_info': feature_info,
-            'risk_factors': risk_factors
+            'risk_factors': risk_factors,
+            'bands': bands,
+            'float32_max_diff': float32_max_diff
         }
     except FileNotFoundError as e:
         print(f"❌ File not found error: {e}")
@@ -97,14 +159,450 @@ def load_models():
         return None
 
 
-# Load all models at startup
-MODELS = load_models()
+def load_model_artifact(path, mmap_mode, n_features=N_BANDS):
+    """
+    Load a pickled model, memory-mapped when possible.
+    
+    Some estimators (e.g. the libsvm SVC inside a trained voting ensemble)
+    cannot predict from read-only arrays; those are loaded into private
+    memory instead.
+    
+    Args:
+        path (Path): Artifact path
+        mmap_mode (str): joblib mmap mode, or None
+        n_features (int): Input columns the model expects
+    
+    Returns:
+        The loaded model
+    """
+    model = joblib.load(str(path), mmap_mode=mmap_mode)
+    if mmap_mode:
+        try:
+            model.predict_proba(np.zeros((1, n_features)))
+        except ValueError:
+            print(f"   ⚠️  {path.name} needs writable arrays; loaded without memory mapping")
+            model = joblib.load(str(path))
+    return model
+
+
+def load_reference_rows(limit=None):
+    """
+    Load SONAR returns from sonar_data.csv for parity checks.
+    
+    Args:
+        limit (int): Maximum number of rows to return (all rows if None)
+    
+    Returns:
+        ndarray: (N x 60) float64 band values, or None if the CSV is unavailable
+    """
+    try:
+        rows = np.loadtxt(str(DATA_PATH), delimiter=',', usecols=range(N_BANDS), ndmin=2)
+    except (OSError, ValueError) as e:
+        print(f"⚠️  Could not read reference rows from {DATA_PATH}: {e}")
+        return None
+    return rows[:limit] if limit else rows
+
+
+def _parity_rows(bands=None):
+    """Reference rows for parity checks, restricted to the model's bands."""
+    reference_rows = load_reference_rows()
+    if reference_rows is None:
+        reference_rows = np.random.default_rng(42).random((64, N_BANDS))
+    return reference_rows if bands is None else reference_rows[:, bands]
+
+
+# Maximum absolute probability difference tolerated between an optimized
+# predictor and the pickled pipeline it replaces
+PARITY_TOLERANCE = 1e-6
+
+
+class FusedBoosterPredictor:
+    """
+    StandardScaler + XGBClassifier pipeline compiled into one direct Booster call.
+    
+    The scaler is folded into a precomputed affine transform
+    (x * inv_scale + offset) and the trees are evaluated with
+    Booster.inplace_predict on the raw array, skipping sklearn's Pipeline
+    dispatch and the XGBClassifier wrapper.
+    """
+    
+    def __init__(self, scaler, classifier):
+        mean = scaler.mean_ if scaler.mean_ is not None else np.zeros(scaler.n_features_in_)
+        scale = scaler.scale_ if scaler.scale_ is not None else np.ones(scaler.n_features_in_)
+        self.inv_scale = 1.0 / scale
+        self.offset = -mean * self.inv_scale
+        self.booster = classifier.get_booster()
+        
+        # Honour early stopping if the classifier was trained with it
+        best_iteration = getattr(classifier, 'best_iteration', None)
+        self.iteration_range = (0, best_iteration + 1) if best_iteration is not None else (0, 0)
+    
+    def transform(self, features):
+        """Apply the folded scaler: (N x 60) raw values -> scaled values."""
+        scaled = np.multiply(features, self.inv_scale)
+        scaled += self.offset
+        return scaled
+    
+    def predict_scaled(self, scaled):
+        """Evaluate the trees on already-scaled values -> (N x 2) [Rock, Mine] probabilities."""
+        mine_probability = self.booster.inplace_predict(scaled, iteration_range=self.iteration_range)
+        return np.column_stack((1 - mine_probability, mine_probability))
+    
+    def predict_proba(self, features):
+        """Same output as the pipeline's predict_proba."""
+        return self.predict_scaled(self.transform(features))
+
+
+def build_fused_predictor(model, bands=None):
+    """
+    Compile the scaler+XGBoost pipeline and check it against the original.
+    
+    Args:
+        model: The pickled sklearn Pipeline (StandardScaler, XGBClassifier)
+        bands (ndarray): Band columns the model reads (None for all 60)
+    
+    Returns:
+        FusedBoosterPredictor (LinearFastPredictor for a scaler + linear
+        model), or None if the model has another shape or its output does
+        not match the pipeline within PARITY_TOLERANCE
+    """
+    steps = getattr(model, 'steps', None)
+    if not steps or len(steps) != 2:
+        print("   ⚠️  Fused predictor skipped: model is not a two-step pipeline")
+        return None
+    
+    scaler, classifier = steps[0][1], steps[1][1]
+    if type(scaler).__name__ == 'StandardScaler' and getattr(classifier, 'coef_', None) is not None:
+        # Linear primary model (e.g. a distilled student): closed-form scorer
+        return build_linear_predictor(model, name='Fused linear predictor', bands=bands)
+    if type(scaler).__name__ != 'StandardScaler' or not hasattr(classifier, 'get_booster'):
+        print("   ⚠️  Fused predictor skipped: expected StandardScaler + XGBClassifier")
+        return None
+    
+    try:
+        fused = FusedBoosterPredictor(scaler, classifier)
+        
+        reference_rows = _parity_rows(bands)
+        
+        difference = np.abs(fused.predict_proba(reference_rows) - model.predict_proba(reference_rows)).max()
+        if difference > PARITY_TOLERANCE:
+            print(f"   ⚠️  Fused predictor disabled: max difference {difference:.2e} exceeds {PARITY_TOLERANCE:.0e}")
+            return None
+        
+        print(f"   ✓ Fused booster predictor ready (max difference {difference:.2e} on {len(reference_rows)} rows)")
+        return fused
+    except Exception as e:
+        print(f"   ⚠️  Fused predictor skipped: {e}")
+        return None
+
+
+class LinearFastPredictor:
+    """
+    StandardScaler + LogisticRegression pipeline exported to one weight vector.
+    
+    The scaler is folded into the coefficients, so scoring is a single
+    dot product plus a sigmoid in pure NumPy.
+    """
+    
+    def __init__(self, scaler, classifier):
+        mean = scaler.mean_ if scaler.mean_ is not None else np.zeros(scaler.n_features_in_)
+        scale = scaler.scale_ if scaler.scale_ is not None else np.ones(scaler.n_features_in_)
+        coef = classifier.coef_.ravel()
+        self.weights = coef / scale
+        self.bias = float(classifier.intercept_[0] - np.dot(coef, mean / scale))
+    
+    def transform(self, features):
+        """The scaler is already folded into the weights; nothing to do."""
+        return features
+    
+    def predict_scaled(self, features):
+        """Dot product + sigmoid -> (N x 2) [Rock, Mine] probabilities."""
+        logits = features @ self.weights + self.bias
+        # tanh form of the sigmoid does not overflow for large |logit|
+        mine_probability = 0.5 * (1.0 + np.tanh(0.5 * logits))
+        return np.column_stack((1 - mine_probability, mine_probability))
+    
+    def predict_proba(self, features):
+        """Same output as the backup pipeline's predict_proba."""
+        return self.predict_scaled(features)
+
+
+def build_linear_predictor(model, name='Fast linear predictor', bands=None):
+    """
+    Export the scaler+LogisticRegression backup model and check it against the original.
+    
+    Args:
+        model: The pickled sklearn Pipeline (StandardScaler, LogisticRegression)
+        name (str): Label used in the load log
+        bands (ndarray): Band columns the model reads (None for all 60)
+    
+    Returns:
+        LinearFastPredictor, or None if the model has another shape or its
+        output does not match the pipeline within PARITY_TOLERANCE
+    """
+    steps = getattr(model, 'steps', None)
+    if not steps or len(steps) != 2:
+        print(f"   ⚠️  {name} skipped: model is not a two-step pipeline")
+        return None
+    
+    scaler, classifier = steps[0][1], steps[1][1]
+    if type(scaler).__name__ != 'StandardScaler' or getattr(classifier, 'coef_', None) is None \
+            or classifier.coef_.shape[0] != 1:
+        print(f"   ⚠️  {name} skipped: expected StandardScaler + binary linear model")
+        return None
+    
+    try:
+        fast = LinearFastPredictor(scaler, classifier)
+        
+        reference_rows = _parity_rows(bands)
+        
+        difference = np.abs(fast.predict_proba(reference_rows) - model.predict_proba(reference_rows)).max()
+        if difference > PARITY_TOLERANCE:
+            print(f"   ⚠️  {name} disabled: max difference {difference:.2e} exceeds {PARITY_TOLERANCE:.0e}")
+            return None
+        
+        print(f"   ✓ {name} ready (max difference {difference:.2e} on {len(reference_rows)} rows)")
+        return fast
+    except Exception as e:
+        print(f"   ⚠️  {name} skipped: {e}")
+        return None
+
+
+def float32_wire_parity(predictor, bands=None):
+    """
+    Compare the served model on float64 reference rows and on the same rows
+    rounded to float32, as an octet-stream client would send them.
+    
+    Tree thresholds sit exactly on float64 training values, so the rounding
+    can move a return to the other side of a split. The result is logged and
+    reported by /health; clients that need JSON parity send float64 bodies.
+    
+    Args:
+        predictor: Fused predictor or pipeline with predict_proba
+        bands (ndarray): Band columns the model reads (None for all 60)
+    
+    Returns:
+        float: Max absolute mine-probability difference, or None if the check failed
+    """
+    try:
+        reference_rows = _parity_rows(bands)
+        rounded_rows = reference_rows.astype(np.float32).astype(np.float64)
+        difference = float(np.abs(predictor.predict_proba(rounded_rows)[:, 1]
+                                  - predictor.predict_proba(reference_rows)[:, 1]).max())
+    except Exception as e:
+        print(f"   ⚠️  float32 wire parity check skipped: {e}")
+        return None
+    
+    if difference > PARITY_TOLERANCE:
+        print(f"   ⚠️  float32 octet payloads differ from JSON by up to {difference:.2e} "
+              f"(send {DTYPE_HEADER}: float64 for exact parity)")
+    else:
+        print(f"   ✓ float32 wire parity: max difference {difference:.2e}")
+    return difference
+
+
+MODELS = None
+_models_attempted = False
+_models_lock = threading.Lock()
+
+
+def ensure_models_loaded():
+    """
+    Load the models once per process (at import, or on first request when lazy).
+    
+    Returns:
+        dict: The loaded models, or None if loading failed
+    """
+    global MODELS, _models_attempted
+    
+    if _models_attempted:
+        return MODELS
+    
+    with _models_lock:
+        if not _models_attempted:
+            MODELS = load_models()
+            _models_attempted = True
+            
+            if MODELS is None:
+                print("❌ ERROR: Could not load required model files!")
+                print("Expected files: best_sonar_model.pkl, logistic_regression_model.pkl, etc.")
+            else:
+                print("✅ Models loaded successfully!")
+    
+    return MODELS
+
 
-if MODELS is None:
-    print("❌ ERROR: Could not load required model files!")
-    print("Expected files: best_sonar_model.pkl, logistic_regression_model.pkl, etc.")
+# Load all models at startup (unless deferred to the first request). With
+# gunicorn's preload_app this runs once in the master and forked workers
+# share the loaded pages copy-on-write (see gunicorn.conf.py).
+if LAZY_LOAD:
+    print("⏳ Lazy loading enabled: models will load on the first request")
 else:
-    print("✅ Models loaded successfully!")
+    ensure_models_loaded()
+
+
+# ------------------------------------------
+# Hot reload: load a retrained model in the background, check it against
+# a golden set from sonar_data.csv and swap it in atomically. Request
+# handlers read MODELS once, when the request starts, and pass that bundle
+# through validation, band selection, caching and inference, so in-flight
+# requests finish on the bundle they started with.
+# ------------------------------------------
+
+# Seconds between checks of the models/ directory for new artifacts (0 disables)
+MODEL_WATCH_INTERVAL = float(os.environ.get('SONAR_MODEL_WATCH_INTERVAL', 0))
+
+# Token required in the X-Admin-Token header of /admin/reload (unset disables the route)
+ADMIN_TOKEN = os.environ.get('SONAR_ADMIN_TOKEN')
+
+# A candidate model must reach this accuracy on the golden set to be served
+GOLDEN_SET_SIZE = 40
+GOLDEN_MIN_ACCURACY = float(os.environ.get('SONAR_GOLDEN_MIN_ACCURACY', 0.8))
+
+RELOAD_STATUS = {'state': 'idle', 'last_reload': None, 'last_error': None, 'reloads': 0}
+_reload_lock = threading.Lock()
+_watcher_pid = None
+
+
+def load_golden_set(size=GOLDEN_SET_SIZE):
+    """
+    Take an evenly spaced, labelled sample of sonar_data.csv.
+    
+    Returns:
+        tuple: ((N x 60) band values, N labels with 1 = Mine), or (None, None)
+    """
+    try:
+        raw = np.loadtxt(str(DATA_PATH), delimiter=',', dtype=str, ndmin=2)
+    except (OSError, ValueError) as e:
+        print(f"⚠️  Could not read golden set from {DATA_PATH}: {e}")
+        return None, None
+    
+    step = max(1, len(raw) // size)
+    sample = raw[::step][:size]
+    return sample[:, :N_BANDS].astype(np.float64), (sample[:, N_BANDS] == 'M').astype(int)
+
+
+def validate_candidate_models(models):
+    """
+    Warm a freshly loaded model bundle and check it on the golden set.
+    
+    Args:
+        models (dict): Output of load_models()
+    
+    Returns:
+        str: Error message, or None if the bundle may be served
+    """
+    features, labels = load_golden_set()
+    if features is None:
+        return "Golden set unavailable; refusing to swap models blind."
+    
+    if models.get('bands') is not None:
+        features = features[:, models['bands']]
+    predictor = models.get('fused_model') or models['model']
+    probabilities = predictor.predict_proba(features)
+    
+    if probabilities.shape != (len(features), 2) or not np.isfinite(probabilities).all():
+        return "Candidate model returned malformed probabilities."
+    
+    accuracy = float(((probabilities[:, 1] > DECISION_THRESHOLD).astype(int) == labels).mean())
+    if accuracy < GOLDEN_MIN_ACCURACY:
+        return f"Candidate model accuracy {accuracy:.3f} on golden set is below {GOLDEN_MIN_ACCURACY}."
+    
+    print(f"   ✓ Golden set accuracy: {accuracy:.3f} ({len(labels)} rows)")
+    return None
+
+
+def reload_models():
+    """
+    Load, warm and validate the artifacts in models/, then swap them in.
+    
+    The currently served models stay active if anything fails. Requests in
+    flight keep the bundle they read when they started (see
+    serve_prediction_api), even if the new one reads other bands.
+    
+    Returns:
+        dict: {'success': bool, 'version': served version, 'error': message if failed}
+    """
+    global MODELS
+    
+    if not _reload_lock.acquire(blocking=False):
+        return {'success': False, 'error': 'A reload is already in progress.'}
+    
+    try:
+        RELOAD_STATUS['state'] = 'loading'
+        print("🔄 Reloading models...")
+        
+        candidate = load_models()
+        error = "Could not load model files." if candidate is None else validate_candidate_models(candidate)
+        
+        if error:
+            print(f"❌ Reload rejected: {error}")
+            RELOAD_STATUS.update(state='idle', last_error=error)
+            return {'success': False, 'version': MODELS['version'] if MODELS else None, 'error': error}
+        
+        # Single reference assignment: requests see either the old or the new bundle
+        MODELS = candidate
+        RELOAD_STATUS.update(state='idle', last_error=None, last_reload=time.time(),
+                             reloads=RELOAD_STATUS['reloads'] + 1)
+        print(f"✅ Now serving model version {candidate['version']}")
+        return {'success': True, 'version': candidate['version']}
+    
+    except Exception as e:
+        RELOAD_STATUS.update(state='idle', last_error=str(e))
+        return {'success': False, 'version': MODELS['version'] if MODELS else None, 'error': str(e)}
+    
+    finally:
+        _reload_lock.release()
+
+
+def _artifact_signature():
+    """Modification time and size of every file in models/."""
+    models_dir = SCRIPT_DIR / 'models'
+    try:
+        return tuple(sorted(
+            (path.name, path.stat().st_mtime_ns, path.stat().st_size)
+            for path in models_dir.iterdir() if path.is_file()
+        ))
+    except OSError:
+        return None
+
+
+def _watch_models():
+    """Poll models/ and reload once a change has settled for one interval."""
+    served = _artifact_signature()
+    pending = None
+    
+    while True:
+        time.sleep(MODEL_WATCH_INTERVAL)
+        current = _artifact_signature()
+        
+        if current is None or current == served:
+            pending = None
+        elif current == pending:
+            # Unchanged since the last poll: the copy has finished
+            reload_models()
+            served, pending = current, None
+        else:
+            pending = current
+
+
+def start_model_watcher():
+    """Start the models/ watcher thread once per process (workers fork after preload)."""
+    global _watcher_pid
+    
+    if MODEL_WATCH_INTERVAL <= 0 or _watcher_pid == os.getpid():
+        return
+    
+    _watcher_pid = os.getpid()
+    threading.Thread(target=_watch_models, name='model-watcher', daemon=True).start()
+    print(f"👀 Watching {SCRIPT_DIR / 'models'} every {MODEL_WATCH_INTERVAL:g}s for new models")
+
+
+@app.before_request
+def load_models_on_first_request():
+    """Make sure models are loaded before any route runs (no-op once loaded)."""
+    ensure_models_loaded()
+    start_model_watcher()
 
 
 # ==========================================
@@ -177,199 +675,1404 @@ def get_confidence_level(confidence):
 # 3. FEATURE ENGINEERING FOR PREDICTION
 # ==========================================
 
-def prepare_prediction_input(frequency_values):
+# Per-thread (1 x width) float64 buffers, one per row width, reused as the model
+# input for single predictions. float64 matches the dtype the scaler was fitted
+# with: XGBoost split thresholds sit exactly on scaled training values, so
+# float32 rounding before scaling flips splits.
+_input_buffers = threading.local()
+
+
+def _get_input_buffer(width=N_BANDS):
+    """Return this thread's reusable contiguous (1 x width) float64 input buffer."""
+    buffers = getattr(_input_buffers, 'by_width', None)
+    if buffers is None:
+        buffers = _input_buffers.by_width = {}
+    buffer = buffers.get(width)
+    if buffer is None:
+        buffer = buffers[width] = np.empty((1, width), dtype=np.float64)
+    return buffer
+
+
+def model_bands(models=None):
+    """Band indices a model bundle (default: the served one) reads, or None when it reads all 60."""
+    if models is None:
+        models = MODELS
+    return models.get('bands') if models is not None else None
+
+
+def accepted_band_counts(bands):
+    """Values accepted per return: all 60 bands, or just the ones a subset model reads."""
+    return (N_BANDS,) if bands is None else (N_BANDS, len(bands))
+
+
+def band_count_error(bands):
+    """Error message for a return with the wrong number of values."""
+    if bands is None:
+        return "Must provide exactly 60 frequency band values."
+    return (f"Must provide 60 frequency band values, or only the {len(bands)} bands "
+            f"the model reads: {bands.tolist()}.")
+
+
+def select_model_bands(values, models=None):
+    """Take the columns a model bundle (default: the served one) reads from (N x 60) band values."""
+    bands = model_bands(models)
+    return values if bands is None else values[:, bands]
+
+
+def describe_invalid_bands(values, invalid, bands=None):
+    """
+    Build an error message naming every out-of-range or NaN band.
+    
+    Args:
+        values (ndarray): The band values of one return, as fed to the model
+        invalid (ndarray): Boolean mask of bad values
+        bands (ndarray): Band number of each value (None when values are all 60 bands)
+    
+    Returns:
+        str: Error message listing each bad band index and its value
+    """
+    positions = np.flatnonzero(invalid)
+    numbers = positions if bands is None else bands[positions]
+    if len(positions) == 1:
+        return f"Frequency band {numbers[0]} has invalid value {values[positions[0]]}. Must be between 0 and 1."
+    details = ', '.join(f"{band}={values[position]}" for band, position in zip(numbers, positions))
+    return f"Frequency bands {numbers.tolist()} have invalid values ({details}). Must be between 0 and 1."
+
+
+def prepare_prediction_input(frequency_values, models=None):
     """
     Prepare and validate SONAR frequency data for prediction.
     
+    The values are converted once into a reusable contiguous float64
+    buffer and checked with vectorized range/NaN tests; no DataFrame is
+    built. The returned array belongs to the calling thread and is
+    overwritten by its next call.
+    
+    When a band subset model is served, clients may send just its bands (in
+    band order). A 60-value return is validated in full and then cut down
+    to the model's bands, so a bad value in an unused band is still an error.
+    
     Args:
-        frequency_values (list): List of 60 frequency band values (0-1)
+        frequency_values (list): List of 60 frequency band values (0-1), or
+            the subset model's bands
+        models (dict): Model bundle the request is scored with (default: the served one)
     
     Returns:
-        tuple: (DataFrame for prediction, error message if any)
+        tuple: ((1 x bands read by the model) float64 array for prediction,
+                error message if any)
     """
     try:
-        if not frequency_values or len(frequency_values) != 60:
-            return None, "Must provide exactly 60 frequency band values."
+        bands = model_bands(models)
+        if frequency_values is None or len(frequency_values) not in accepted_band_counts(bands):
+            return None, band_count_error(bands)
         
-        # Convert to numeric
-        values = [float(v) for v in frequency_values]
+        # Single conversion straight into an input buffer
+        width = len(frequency_values)
+        values = _get_input_buffer(width)
+        values[0] = np.asarray(frequency_values, dtype=np.float64)
         
-        # Validate range
-        for i, v in enumerate(values):
-            if not (0 <= v <= 1):
-                return None, f"Frequency band {i} has invalid value {v}. Must be between 0 and 1."
+        # Validate range (NaN fails both comparisons)
+        invalid = ~((values[0] >= 0) & (values[0] <= 1))
+        if invalid.any():
+            return None, describe_invalid_bands(values[0], invalid, None if width == N_BANDS else bands)
         
-        # Create DataFrame
-        features_df = pd.DataFrame([values])
+        if bands is not None and width == N_BANDS:
+            # Subset model: fetch only its bands into the model input buffer
+            features = _get_input_buffer(len(bands))
+            np.take(values[0], bands, out=features[0])
+            return features, None
         
-        return features_df, None
+        return values, None
     
     except (ValueError, TypeError) as e:
         return None, f"Invalid input: {str(e)}"
 
 
-# ==========================================
-# 4. PREDICTION LOGIC (Goal 1: Classify Rock vs Mine)
-# ==========================================
+def _is_number(token):
+    try:
+        float(token)
+        return True
+    except (ValueError, TypeError):
+        return False
 
-def make_prediction(features_df):
+
+def parse_band_tokens(tokens):
     """
-    Make rock vs mine prediction using trained model.
+    Convert one return's 60 text values (form fields or a pasted row) to
+    floats in a single vectorized conversion.
+    
+    Args:
+        tokens (list): Band values as strings, in band order
     
     Returns:
-        dict: Prediction result with confidence and risk assessment
+        tuple: (60-value float64 array, error message naming the bad bands)
     """
-    if MODELS is None:
-        error_msg = (
-            'Models not loaded. Please check system files.\n\n'
-            'Troubleshooting:\n'
-            '1. Ensure all .pkl files exist in the sonar project folder\n'
-            '2. Check that SONAR_03.ipynb was run successfully\n'
-            '3. Verify Python 3.11 is being used (conda)\n'
-            '4. Check console output for model loading errors'
-        )
-        return {
-            'success': False,
-            'error': error_msg
-        }
+    if len(tokens) != N_BANDS:
+        return None, f"Must provide exactly 60 frequency band values (got {len(tokens)})."
     
     try:
-        # Use the model pipeline
-        prediction = MODELS['model'].predict(features_df)[0]
-        prediction_proba = MODELS['model'].predict_proba(features_df)[0]
-        
-        # Confidence as percentage (0-100%)
-        # prediction_proba[0] = probability of Rock (0)
-        # prediction_proba[1] = probability of Mine (1)
-        
-        if prediction == 0:  # Rock
-            confidence = prediction_proba[0] * 100
-            prediction_text = "🪨 ROCK DETECTED"
-        else:  # Mine
-            confidence = prediction_proba[1] * 100
-            prediction_text = "💣 MINE ALERT"
-        
-        # Risk assessment
-        if prediction == 1:  # Mine
-            if confidence >= 90:
-                risk_level = "CRITICAL"
-                recommendation = "🚨 IMMEDIATE EVASION REQUIRED! Confidence in mine detection is critical."
-            elif confidence >= 75:
-                risk_level = "HIGH"
-                recommendation = "⚠️  HIGH ALERT! Mine detection is probable. Recommend immediate evasion and reporting."
-            else:
-                risk_level = "MODERATE"
-                recommendation = "🟡 CAUTION - Possible mine detected. Recommend further investigation before proceeding."
-        else:  # Rock
-            if confidence >= 90:
-                risk_level = "SAFE"
-                recommendation = "✅ SAFE - High confidence this is a natural rock. Safe to proceed."
-            elif confidence >= 75:
-                risk_level = "LIKELY SAFE"
-                recommendation = "✅ Likely safe. This appears to be a natural formation. Exercise normal caution."
-            else:
-                risk_level = "UNCERTAIN"
-                recommendation = "⚠️  Uncertain - Object may be rock or mine. Recommend detailed analysis."
-        
-        # Risk color
-        if prediction == 1 and confidence >= 75:
-            risk_color = "🔴"  # Critical mine
-        elif prediction == 1:
-            risk_color = "🟠"  # Possible mine
-        elif prediction == 0 and confidence >= 90:
-            risk_color = "🟢"  # Safe rock
-        else:
-            risk_color = "🟡"  # Uncertain
-        
-        return {
-            'success': True,
-            'prediction': prediction,
-            'object_type': 'Mine' if prediction == 1 else 'Rock',
-            'confidence_percent': confidence,
-            'confidence_level': get_confidence_level(confidence),
-            'prediction_text': prediction_text,
-            'risk_level': risk_level,
-            'recommendation': recommendation,
-            'risk_color': risk_color,
-            'rock_probability': prediction_proba[0] * 100,
-            'mine_probability': prediction_proba[1] * 100
-        }
-    except Exception as e:
-        return {
-            'success': False,
-            'error': f"Prediction error: {str(e)}"
-        }
-
+        return np.array(tokens, dtype=np.float64), None
+    except (ValueError, TypeError):
+        # Only on failure: find every band that did not parse
+        bands = [band for band, token in enumerate(tokens) if not _is_number(token)]
+        if len(bands) == 1:
+            return None, f"Frequency band {bands[0]} has non-numeric value {tokens[bands[0]]!r}."
+        details = ', '.join(f"{band}={tokens[band]!r}" for band in bands)
+        return None, f"Frequency bands {bands} have non-numeric values ({details})."
 
-# ==========================================
-# 5. RISK FACTOR EXPLANATION (Goal 2: Feature Importance)
-# ==========================================
 
-def get_risk_factors():
+def parse_pasted_rows(text):
     """
-    Get top frequency bands that distinguish mines from rocks.
-    Goal 2: Explain which SONAR frequencies are most important.
+    Split pasted CSV text into SONAR returns.
+    
+    Each non-blank line is one return of 60 values separated by commas,
+    semicolons, tabs or spaces. A trailing R/M label (the sonar_data.csv
+    layout) is ignored.
+    
+    Args:
+        text (str): Contents of the paste field
     
     Returns:
-        list: Top risk factors with importance scores
+        tuple: (list of (60-value array or None, error or None) per line,
+                error message if nothing usable was pasted)
     """
-    if MODELS is None:
-        return []
+    lines = [line for line in text.splitlines() if line.strip()]
     
-    try:
-        risk_factors = MODELS['risk_factors']
-        
-        # Convert to list format
-        factors = []
-        max_importance = risk_factors.max() if len(risk_factors) > 0 else 1
-        
-        for rank, (freq_band, importance) in enumerate(risk_factors.items(), 1):
-            percentage = (importance / max_importance) * 100 if max_importance > 0 else 0
-            factors.append({
-                'rank': rank,
-                'frequency_band': int(freq_band),
-                'importance': importance,
-                'percentage': percentage
-            })
-        
-        return factors
+    if not lines:
+        return None, "Paste at least one row of 60 frequency band values."
+    if len(lines) > MAX_BATCH_ROWS:
+        return None, f"Too many rows: {len(lines)} (maximum {MAX_BATCH_ROWS})."
     
-    except Exception as e:
-        print(f"⚠️  Error getting risk factors: {e}")
-        return []
+    rows = []
+    for line in lines:
+        tokens = line.replace(',', ' ').replace(';', ' ').split()
+        if len(tokens) == N_BANDS + 1 and tokens[-1].upper() in ('R', 'M'):
+            tokens = tokens[:-1]
+        rows.append(parse_band_tokens(tokens))
+    
+    return rows, None
+
+
+# Upper bound on rows accepted by /api/predict/batch in one request
+MAX_BATCH_ROWS = int(os.environ.get('SONAR_MAX_BATCH_ROWS', 10000))
+
+
+def _convert_rows(rows, width):
+    """
+    Convert equal-length rows to one float64 matrix.
+
+    Falls back to row-by-row conversion when some row holds a non-numeric or
+    nested value (nested lists of equal length would otherwise convert to a
+    3-D array).
+
+    Returns:
+        tuple: ((M x width) values of the rows that converted, their positions
+                in rows, dict of position -> error)
+    """
+    try:
+        values = np.array(rows, dtype=np.float64)
+        if values.ndim == 2 and values.shape[1] == width:
+            return values, list(range(len(rows))), {}
+    except (ValueError, TypeError):
+        pass
+
+    parsed, positions, errors = [], [], {}
+    for position, row in enumerate(rows):
+        try:
+            parsed.append([float(v) for v in row])
+            positions.append(position)
+        except (ValueError, TypeError) as e:
+            errors[position] = f"Invalid input: {str(e)}"
+    return np.array(parsed, dtype=np.float64).reshape(len(parsed), width), positions, errors
+
+
+def _validate_rows(values, row_indices, errors, bands=None):
+    """
+    Range-check a block of equal-width rows and keep the valid ones.
+
+    Every supplied value is checked, including bands a subset model does not
+    read; 60-value rows are then cut down to the model's bands.
+
+    Args:
+        values (ndarray): (M x 60) rows, or (M x K) rows of a subset model's bands
+        row_indices (list): Request row index of each row
+        errors (dict): Row index -> error message, updated in place
+        bands (ndarray): Bands the model reads (None for all 60)
+
+    Returns:
+        tuple: ((valid rows x bands read by the model) values, their row indices)
+    """
+    value_bands = None if values.shape[1] == N_BANDS else bands
+
+    # Vectorized range check (NaN fails both comparisons)
+    out_of_range = ~((values >= 0) & (values <= 1))
+    bad_rows = out_of_range.any(axis=1)
+    if bad_rows.any():
+        for position in np.flatnonzero(bad_rows):
+            errors[row_indices[position]] = describe_invalid_bands(
+                values[position], out_of_range[position], value_bands)
+        values = values[~bad_rows]
+        row_indices = [row for row, bad in zip(row_indices, bad_rows) if not bad]
+
+    if bands is not None and values.shape[1] == N_BANDS:
+        values = values[:, bands]
+    return values, row_indices
+
+
+def _parse_batch_rows(frequency_matrix, bands=None):
+    """
+    Convert a JSON-style list of rows to a validated float64 matrix, noting bad rows.
+
+    Args:
+        frequency_matrix (list): Rows of 60 band values, or of the subset model's bands
+        bands (ndarray): Bands the model reads (None for all 60)
+
+    Returns:
+        tuple: ((M x bands read by the model) values of the valid rows,
+                their row indices, dict of row index -> error, error message if unusable)
+    """
+    if not isinstance(frequency_matrix, list) or not frequency_matrix:
+        return None, None, None, "Must provide a non-empty list of rows with 60 frequency band values each."
+
+    if len(frequency_matrix) > MAX_BATCH_ROWS:
+        return None, None, None, f"Batch too large: {len(frequency_matrix)} rows (maximum {MAX_BATCH_ROWS})."
+
+    errors = {}
+
+    # Shape check first; rows of each accepted width are converted together
+    rows_by_width = {width: [] for width in accepted_band_counts(bands)}
+    for i, row in enumerate(frequency_matrix):
+        if not isinstance(row, (list, tuple)) or len(row) not in rows_by_width:
+            errors[i] = band_count_error(bands)
+        else:
+            rows_by_width[len(row)].append(i)
+
+    blocks, valid_rows = [], []
+    for width, row_indices in rows_by_width.items():
+        values, positions, row_errors = _convert_rows([frequency_matrix[i] for i in row_indices], width)
+        for position, error in row_errors.items():
+            errors[row_indices[position]] = error
+        values, row_indices = _validate_rows(values, [row_indices[position] for position in positions],
+                                             errors, bands)
+        blocks.append(values)
+        valid_rows.extend(row_indices)
+
+    if len(blocks) == 1:
+        return blocks[0], valid_rows, errors, None
+
+    # Subset model with both 60-value and K-value rows: back to request order
+    order = np.argsort(valid_rows, kind='stable')
+    return np.concatenate(blocks)[order], [valid_rows[i] for i in order], errors, None
+
+
+def prepare_batch_input(frequency_matrix, models=None):
+    """
+    Validate an N x 60 matrix of SONAR returns in one pass.
+
+    Bad rows are reported individually so one malformed return does not
+    fail the whole batch.
+
+    Args:
+        frequency_matrix (list or ndarray): List of rows, each with 60 frequency
+            band values (0-1), or an already decoded (N x 60) array. With a band
+            subset model, rows may carry only its bands.
+        models (dict): Model bundle the rows are scored with (default: the served one)
+
+    Returns:
+        tuple: (batch dict with 'features' float64 array of the valid rows,
+                'rows' holding their original indices and 'errors' mapping
+                row index -> message; error message if the matrix is unusable)
+    """
+    bands = model_bands(models)
+    if isinstance(frequency_matrix, np.ndarray):
+        # Binary payloads arrive already decoded into an (N x 60) array
+        if frequency_matrix.ndim != 2 or frequency_matrix.shape[1] not in accepted_band_counts(bands) \
+                or not len(frequency_matrix):
+            return None, "Must provide a non-empty N x 60 matrix of frequency band values."
+        if len(frequency_matrix) > MAX_BATCH_ROWS:
+            return None, f"Batch too large: {len(frequency_matrix)} rows (maximum {MAX_BATCH_ROWS})."
+        errors = {}
+        values, valid_rows = _validate_rows(frequency_matrix, list(range(len(frequency_matrix))), errors, bands)
+    else:
+        values, valid_rows, errors, error = _parse_batch_rows(frequency_matrix, bands)
+        if error:
+            return None, error
+
+    # JSON rows are used as parsed; binary float32 rows are widened once,
+    # since the scaler and tree thresholds are float64
+    features = np.ascontiguousarray(values, dtype=np.float64)
+
+    if errors:
+        metrics.ERRORS.inc('invalid_row', amount=len(errors))
+    
+    return {'features': features, 'rows': valid_rows, 'errors': errors}, None
+
+
+# ==========================================
+# 4. PREDICTION LOGIC (Goal 1: Classify Rock vs Mine)
+# ==========================================
+
+# Mine probability above which a return is classified as a mine
+# (matches the rule XGBClassifier.predict applies to binary outputs)
+DECISION_THRESHOLD = 0.5
+
+
+# Model tiers a request can ask for with ?model=<tier>
+#   primary: XGBoost pipeline (most accurate)
+#   fast:    closed-form logistic regression (microsecond latency)
+MODEL_TIERS = ('primary', 'fast')
+
+# When > 0, requests that don't pick a tier are served by the fast tier while
+# the primary tier's recent latency (EWMA) is over this budget
+LATENCY_BUDGET_MS = float(os.environ.get('SONAR_LATENCY_BUDGET_MS', 0))
+
+# While over budget, every Nth request still goes to the primary tier so its
+# latency estimate can recover
+LATENCY_PROBE_INTERVAL = 50
+
+_primary_latency = {'ewma_ms': 0.0, 'requests': 0}
+_latency_lock = threading.Lock()
+
+
+def select_model_tier(requested=None, models=None):
+    """
+    Pick the model tier for a request.
+    
+    Args:
+        requested (str): Tier named by the client, or None for automatic selection
+        models (dict): Model bundle the request is scored with (default: the served one)
+    
+    Returns:
+        tuple: (tier name, error message if the requested tier is unusable)
+    """
+    if models is None:
+        models = MODELS
+    
+    if requested:
+        if requested not in MODEL_TIERS:
+            return None, f"Unknown model '{requested}'. Choose one of: {', '.join(MODEL_TIERS)}."
+        if requested == 'fast' and (models is None or models.get('fast_model') is None):
+            return None, "Fast model tier is not available."
+        return requested, None
+    
+    if LATENCY_BUDGET_MS > 0 and models is not None and models.get('fast_model') is not None:
+        with _latency_lock:
+            over_budget = _primary_latency['ewma_ms'] > LATENCY_BUDGET_MS
+            probe = _primary_latency['requests'] % LATENCY_PROBE_INTERVAL == 0
+        if over_budget and not probe:
+            with _latency_lock:
+                _primary_latency['requests'] += 1
+            return 'fast', None
+    
+    return 'primary', None
+
+
+def _record_primary_latency(elapsed_ms):
+    """Update the primary tier's exponentially weighted latency estimate."""
+    with _latency_lock:
+        if _primary_latency['requests'] == 0:
+            _primary_latency['ewma_ms'] = elapsed_ms
+        else:
+            _primary_latency['ewma_ms'] = 0.9 * _primary_latency['ewma_ms'] + 0.1 * elapsed_ms
+        _primary_latency['requests'] += 1
+
+
+def run_inference(features, tier='primary', models=None):
+    """
+    Run the model pipeline exactly once and time each stage.
+    
+    The primary tier uses the fused Booster predictor when it passed its
+    parity check, otherwise calls the pipeline's scaler and classifier
+    steps directly. Either way the preprocessing and the tree walk each
+    run a single time. The fast tier uses the closed-form linear scorer.
+    
+    Args:
+        features: N rows x 60 validated frequency band values
+        tier (str): 'primary' or 'fast'
+        models (dict): Bundle the features were validated against (default: the served one)
+    
+    Returns:
+        tuple: (N x 2 array of [Rock, Mine] probabilities, dict of stage timings in ms)
+    """
+    if models is None:
+        models = MODELS
+    predictor = models.get('fast_model') if tier == 'fast' else models.get('fused_model')
+    
+    start = time.perf_counter()
+    if predictor is not None:
+        scaled = predictor.transform(features)
+        scaled_at = time.perf_counter()
+        probabilities = predictor.predict_scaled(scaled)
+    else:
+        pipeline = models['model']
+        scaled = features
+        for _, step in pipeline.steps[:-1]:
+            scaled = step.transform(scaled)
+        scaled_at = time.perf_counter()
+        probabilities = pipeline.steps[-1][1].predict_proba(scaled)
+    finished_at = time.perf_counter()
+    
+    if tier == 'primary':
+        _record_primary_latency((finished_at - start) * 1000)
+    
+    timings = {
+        'scale_ms': (scaled_at - start) * 1000,
+        'trees_ms': (finished_at - scaled_at) * 1000
+    }
+    metrics.STAGE_SECONDS.observe(scaled_at - start, 'scale')
+    metrics.STAGE_SECONDS.observe(finished_at - scaled_at, 'trees')
+    metrics.INFERENCE_BATCH_SIZE.observe(len(features), tier)
+    return probabilities, timings
+
+
+# ------------------------------------------
+# Micro-batching: concurrent single-row requests (gunicorn --threads, the
+# ASGI entry point) are coalesced into one vectorized model call
+# (see sonar_batcher.py)
+# ------------------------------------------
+
+# How long the first queued request waits for others to join its batch (0 disables batching)
+BATCH_WINDOW_MS = float(os.environ.get('SONAR_BATCH_WINDOW_MS', 0))
+
+# A batch is dispatched as soon as it holds this many requests
+BATCH_MAX_SIZE = int(os.environ.get('SONAR_BATCH_MAX_SIZE', 64))
+
+# A request that gets no batched result within this time is scored on its own
+BATCH_RESULT_TIMEOUT = 1.0
+
+PREDICTION_BATCHER = PredictionBatcher(run_inference, BATCH_WINDOW_MS, BATCH_MAX_SIZE, BATCH_RESULT_TIMEOUT)
+
+
+# ------------------------------------------
+# Prediction cache: rigs often re-send the same (or nearly the same) return,
+# so probabilities are cached per quantized input vector (see sonar_cache.py)
+# ------------------------------------------
+
+# Maximum cached results (0 disables the cache); each entry is ~200 bytes
+PREDICTION_CACHE_SIZE = int(os.environ.get('SONAR_CACHE_SIZE', 10000))
+
+# Seconds a cached result stays valid
+PREDICTION_CACHE_TTL = float(os.environ.get('SONAR_CACHE_TTL', 300))
+
+# Decimal places inputs are rounded to before hashing (sonar_data.csv uses 4)
+PREDICTION_CACHE_DECIMALS = int(os.environ.get('SONAR_CACHE_DECIMALS', 4))
+
+PREDICTION_CACHE = PredictionCache(PREDICTION_CACHE_SIZE, PREDICTION_CACHE_TTL, PREDICTION_CACHE_DECIMALS)
+
+
+def make_prediction(features, tier='primary', models=None):
+    """
+    Make rock vs mine prediction using trained model.
+    
+    The class, confidence, risk level and color are all derived from a
+    single predict_proba pass.
+    
+    Args:
+        features (ndarray): (1 x 60) validated frequency band values
+        tier (str): Model tier to use ('primary' or 'fast')
+        models (dict): Bundle the features were validated against (default: the served one)
+    
+    Returns:
+        dict: Prediction result with confidence, risk assessment and stage timings
+    """
+    if models is None:
+        models = MODELS
+    
+    if models is None:
+        error_msg = (
+            'Models not loaded. Please check system files.\n\n'
+            'Troubleshooting:\n'
+            '1. Ensure all .pkl files exist in the sonar project folder\n'
+            '2. Check that SONAR_03.ipynb was run successfully\n'
+            '3. Verify Python 3.11 is being used (conda)\n'
+            '4. Check console output for model loading errors'
+        )
+        return {
+            'success': False,
+            'error': error_msg
+        }
+    
+    try:
+        probabilities = None
+        if PREDICTION_CACHE.enabled:
+            version = models['version']
+            cache_key = PREDICTION_CACHE.key(features, tier)
+            probabilities = PREDICTION_CACHE.get(cache_key, version)
+        
+        cache_hit = probabilities is not None
+        if cache_hit:
+            timings = {}
+        else:
+            # Use the model pipeline (one pass, coalesced with concurrent requests if enabled)
+            if PREDICTION_BATCHER.enabled:
+                probabilities, timings = PREDICTION_BATCHER.infer(features, tier, models)
+            else:
+                probabilities, timings = run_inference(features, tier, models)
+            if PREDICTION_CACHE.enabled:
+                PREDICTION_CACHE.put(cache_key, version, probabilities)
+        prediction_proba = probabilities[0]
+        prediction = int(prediction_proba[1] > DECISION_THRESHOLD)
+        
+        post_start = time.perf_counter()
+        result = interpret_prediction(prediction, prediction_proba)
+        timings['post_ms'] = (time.perf_counter() - post_start) * 1000
+        metrics.STAGE_SECONDS.observe(timings['post_ms'] / 1000, 'post')
+        metrics.PREDICTIONS.inc(result['object_type'], tier)
+        
+        result['model_tier'] = tier
+        result['cache_hit'] = cache_hit
+        result['timings_ms'] = timings
+        return result
+    except Exception as e:
+        metrics.ERRORS.inc('prediction')
+        return {
+            'success': False,
+            'error': f"Prediction error: {str(e)}"
+        }
+
+
+def make_batch_prediction(features, tier='primary', models=None):
+    """
+    Classify many SONAR returns with a single vectorized model call.
+    
+    Args:
+        features (ndarray): N rows x 60 validated frequency band values
+        tier (str): Model tier to use ('primary' or 'fast')
+        models (dict): Bundle the features were validated against (default: the served one)
+    
+    Returns:
+        dict: {'success': True, 'results': [one prediction dict per row], 'timings_ms': {...}}
+    """
+    if models is None:
+        models = MODELS
+    
+    if models is None:
+        return {
+            'success': False,
+            'error': 'Models not loaded. Please check system files.'
+        }
+    
+    try:
+        # One pass over all rows; labels follow from the probabilities
+        probabilities, timings = run_inference(features, tier, models)
+        predictions = (probabilities[:, 1] > DECISION_THRESHOLD).astype(int)
+        
+        post_start = time.perf_counter()
+        results = [
+            interpret_prediction(prediction, prediction_proba)
+            for prediction, prediction_proba in zip(predictions, probabilities)
+        ]
+        timings['post_ms'] = (time.perf_counter() - post_start) * 1000
+        metrics.STAGE_SECONDS.observe(timings['post_ms'] / 1000, 'post')
+        
+        mines = int(predictions.sum())
+        metrics.PREDICTIONS.inc('Mine', tier, amount=mines)
+        metrics.PREDICTIONS.inc('Rock', tier, amount=len(predictions) - mines)
+        
+        return {'success': True, 'results': results, 'model_tier': tier, 'timings_ms': timings}
+    except Exception as e:
+        metrics.ERRORS.inc('prediction')
+        return {
+            'success': False,
+            'error': f"Prediction error: {str(e)}"
+        }
+
+
+def interpret_prediction(prediction, prediction_proba):
+    """
+    Turn a model output into confidence, risk level and recommendation.
+    
+    Args:
+        prediction (int): 0 = Rock, 1 = Mine
+        prediction_proba (array): [probability of Rock, probability of Mine]
+    
+    Returns:
+        dict: Prediction result with confidence and risk assessment
+    """
+    prediction = int(prediction)
+    
+    # Confidence as percentage (0-100%)
+    # prediction_proba[0] = probability of Rock (0)
+    # prediction_proba[1] = probability of Mine (1)
+    
+    if prediction == 0:  # Rock
+        confidence = prediction_proba[0] * 100
+        prediction_text = "🪨 ROCK DETECTED"
+    else:  # Mine
+        confidence = prediction_proba[1] * 100
+        prediction_text = "💣 MINE ALERT"
+    
+    # Risk assessment
+    if prediction == 1:  # Mine
+        if confidence >= 90:
+            risk_level = "CRITICAL"
+            recommendation = "🚨 IMMEDIATE EVASION REQUIRED! Confidence in mine detection is critical."
+        elif confidence >= 75:
+            risk_level = "HIGH"
+            recommendation = "⚠️  HIGH ALERT! Mine detection is probable. Recommend immediate evasion and reporting."
+        else:
+            risk_level = "MODERATE"
+            recommendation = "🟡 CAUTION - Possible mine detected. Recommend further investigation before proceeding."
+    else:  # Rock
+        if confidence >= 90:
+            risk_level = "SAFE"
+            recommendation = "✅ SAFE - High confidence this is a natural rock. Safe to proceed."
+        elif confidence >= 75:
+            risk_level = "LIKELY SAFE"
+            recommendation = "✅ Likely safe. This appears to be a natural formation. Exercise normal caution."
+        else:
+            risk_level = "UNCERTAIN"
+            recommendation = "⚠️  Uncertain - Object may be rock or mine. Recommend detailed analysis."
+    
+    # Risk color
+    if prediction == 1 and confidence >= 75:
+        risk_color = "🔴"  # Critical mine
+    elif prediction == 1:
+        risk_color = "🟠"  # Possible mine
+    elif prediction == 0 and confidence >= 90:
+        risk_color = "🟢"  # Safe rock
+    else:
+        risk_color = "🟡"  # Uncertain
+    
+    return {
+        'success': True,
+        'prediction': prediction,
+        'object_type': 'Mine' if prediction == 1 else 'Rock',
+        'confidence_percent': float(confidence),
+        'confidence_level': get_confidence_level(confidence),
+        'prediction_text': prediction_text,
+        'risk_level': risk_level,
+        'recommendation': recommendation,
+        'risk_color': risk_color,
+        'rock_probability': float(prediction_proba[0] * 100),
+        'mine_probability': float(prediction_proba[1] * 100)
+    }
+
+
+# ==========================================
+# 5. RISK FACTOR EXPLANATION (Goal 2: Feature Importance)
+# ==========================================
+
+# Risk factors never change while a model version is loaded, so the list and
+# the /api/risk-factors JSON body are built once per version
+_risk_factor_cache = None
+_risk_factor_lock = threading.Lock()
+
+# Seconds clients and proxies may reuse /api/risk-factors before revalidating
+RISK_FACTORS_MAX_AGE = int(os.environ.get('SONAR_RISK_FACTORS_MAX_AGE', 300))
+
+
+def build_risk_factors(risk_factors):
+    """
+    Convert the feature-importance Series into a ranked list of dicts.
+    
+    Args:
+        risk_factors (Series): Importance indexed by frequency band
+    
+    Returns:
+        list: Top risk factors with importance scores and percentages
+    """
+    factors = []
+    max_importance = risk_factors.max() if len(risk_factors) > 0 else 1
+    
+    for rank, (freq_band, importance) in enumerate(risk_factors.items(), 1):
+        percentage = (importance / max_importance) * 100 if max_importance > 0 else 0
+        factors.append({
+            'rank': rank,
+            'frequency_band': int(freq_band),
+            'importance': float(importance),
+            'percentage': float(percentage)
+        })
+    
+    return factors
+
+
+def _refresh_risk_factor_cache(models):
+    """
+    Return the cached risk factors of a model bundle, rebuilding them if its
+    version is not the cached one.
+    
+    Only the served bundle's entry is kept: a request that started before a
+    reload gets its own bundle's risk factors without evicting the new ones.
+    """
+    global _risk_factor_cache
+    
+    version = models.get('version')
+    
+    cache = _risk_factor_cache
+    if cache is not None and cache['version'] == version:
+        return cache
+    
+    with _risk_factor_lock:
+        cache = _risk_factor_cache
+        if cache is not None and cache['version'] == version:
+            return cache
+        
+        factors = build_risk_factors(models['risk_factors'])
+        body = app.json.dumps({
+            'success': True,
+            'risk_factors': factors,
+            'note': 'Top frequency bands that distinguish mines from rocks'
+        })
+        etag = hashlib.sha256(f"{version}:{body}".encode('utf-8')).hexdigest()[:16]
+        
+        # Swap in the new entry in one step so readers never see a half-built one
+        cache = {'version': version, 'factors': factors, 'body': body, 'etag': etag}
+        if models is MODELS:
+            _risk_factor_cache = cache
+        return cache
+
+
+def get_risk_factors_body(models=None):
+    """
+    Pre-serialized /api/risk-factors response for a model bundle.
+    
+    Args:
+        models (dict): Bundle snapshot of the request (default: the served one)
+    
+    Returns:
+        tuple: (JSON body string, ETag), or (None, None) if models are not loaded
+    """
+    if models is None:
+        models = MODELS
+    if models is None:
+        return None, None
+    
+    cache = _refresh_risk_factor_cache(models)
+    return cache['body'], cache['etag']
+
+
+def get_risk_factors(models=None):
+    """
+    Get top frequency bands that distinguish mines from rocks.
+    Goal 2: Explain which SONAR frequencies are most important.
+    
+    The list is computed once per loaded model version and shared, so
+    callers must not modify it.
+    
+    Args:
+        models (dict): Bundle snapshot of the request, so the risk factors
+            come from the model that made the prediction (default: the served one)
+    
+    Returns:
+        list: Top risk factors with importance scores
+    """
+    if models is None:
+        models = MODELS
+    if models is None:
+        return []
+    
+    try:
+        return _refresh_risk_factor_cache(models)['factors']
+    
+    except Exception as e:
+        print(f"⚠️  Error getting risk factors: {e}")
+        return []
+
+
+# ==========================================
+# 6. API REQUEST HANDLERS
+# ==========================================
+# Framework-independent bodies of the JSON endpoints, shared by the Flask
+# routes below and the ASGI app in asgi_sonar_predict.py. Each returns
+# (payload dict, HTTP status).
+
+def format_prediction(prediction_result, rounded=True):
+    """
+    Public 'prediction' and 'probabilities' fields of one prediction result.
+    
+    Percentages are rounded to 2 decimals for JSON; the octet encoder asks
+    for them unrounded (rounded=False).
+    """
+    def percent(value):
+        return round(value, 2) if rounded else float(value)
+    
+    return {
+        'prediction': {
+            'object_type': prediction_result['object_type'],
+            'confidence_percent': percent(prediction_result['confidence_percent']),
+            'confidence_level': prediction_result['confidence_level'],
+            'risk_level': prediction_result['risk_level'],
+            'recommendation': prediction_result['recommendation']
+        },
+        'probabilities': {
+            'rock': percent(prediction_result['rock_probability']),
+            'mine': percent(prediction_result['mine_probability'])
+        }
+    }
+
+
+def handle_predict(data, requested_model=None, rounded=True, models=None):
+    """
+    Score one SONAR return.
+    
+    Args:
+        data (dict): Parsed JSON body with 'frequency_values'
+        requested_model (str): Value of the ?model= query parameter
+        rounded (bool): Round percentages to 2 decimals (False for octet responses)
+        models (dict): Model bundle snapshot taken when the request started
+            (default: the served one, read once here)
+    
+    Returns:
+        tuple: (response payload, HTTP status)
+    """
+    if models is None:
+        models = MODELS
+    tier, error = select_model_tier(requested_model, models)
+    
+    if error:
+        return {'success': False, 'error': error}, 400
+    
+    if not isinstance(data, dict) or 'frequency_values' not in data:
+        return {
+            'success': False,
+            'error': 'Missing required field: frequency_values'
+        }, 400
+    
+    frequency_values = data['frequency_values']
+    
+    # Prepare input
+    with metrics.time_stage('validate'):
+        features, error = prepare_prediction_input(frequency_values, models)
+    
+    if error:
+        metrics.ERRORS.inc('invalid_input')
+        return {'success': False, 'error': error}, 400
+    
+    # Make prediction
+    prediction_result = make_prediction(features, tier, models)
+    
+    if not prediction_result['success']:
+        return prediction_result, 500
+    
+    # Get characteristics and risk factors
+    object_char = assess_object_characteristics(
+        prediction_result['prediction'],
+        prediction_result['confidence_percent']
+    )
+    with metrics.time_stage('risk_factors'):
+        risk_factors = get_risk_factors(models)
+    
+    return {
+        'success': True,
+        **format_prediction(prediction_result, rounded),
+        'characteristics': object_char,
+        'top_risk_factors': risk_factors[:5],
+        'model_tier': tier,
+        'cache_hit': prediction_result['cache_hit'],
+        'timings_ms': {
+            stage: round(ms, 3) for stage, ms in prediction_result['timings_ms'].items()
+        }
+    }, 200
+
+
+def handle_predict_batch(data, requested_model=None, rounded=True, models=None):
+    """
+    Score an N x 60 matrix of SONAR returns with per-row errors.
+    
+    Args:
+        data (dict): Parsed JSON body with 'frequency_matrix'
+        requested_model (str): Value of the ?model= query parameter
+        rounded (bool): Round percentages to 2 decimals (False for octet responses)
+        models (dict): Model bundle snapshot taken when the request started
+            (default: the served one, read once here)
+    
+    Returns:
+        tuple: (response payload, HTTP status)
+    """
+    if models is None:
+        models = MODELS
+    tier, error = select_model_tier(requested_model, models)
+    
+    if error:
+        return {'success': False, 'error': error}, 400
+    
+    if not isinstance(data, dict) or 'frequency_matrix' not in data:
+        return {
+            'success': False,
+            'error': 'Missing required field: frequency_matrix'
+        }, 400
+    
+    # Validate the whole matrix at once
+    with metrics.time_stage('validate'):
+        batch, error = prepare_batch_input(data['frequency_matrix'], models)
+    
+    if error:
+        return {'success': False, 'error': error}, 400
+    
+    results = [None] * len(data['frequency_matrix'])
+    timings = {}
+    for row, row_error in batch['errors'].items():
+        results[row] = {'row': row, 'success': False, 'error': row_error}
+    
+    if batch['rows']:
+        # One vectorized model call for every valid row
+        batch_result = make_batch_prediction(batch['features'], tier, models)
+        
+        if not batch_result['success']:
+            return batch_result, 500
+        timings = batch_result['timings_ms']
+        
+        for row, prediction_result in zip(batch['rows'], batch_result['results']):
+            results[row] = {'row': row, 'success': True, **format_prediction(prediction_result, rounded)}
+    
+    return {
+        'success': True,
+        'total_rows': len(results),
+        'scored_rows': len(batch['rows']),
+        'failed_rows': len(batch['errors']),
+        'results': results,
+        'top_risk_factors': get_risk_factors(models)[:5],
+        'model_tier': tier,
+        'timings_ms': {stage: round(ms, 3) for stage, ms in timings.items()}
+    }, 200
+
+
+# Records scored together by the streaming endpoint
+STREAM_BATCH_SIZE = int(os.environ.get('SONAR_STREAM_BATCH_SIZE', 16))
+
+# Longest accepted NDJSON input line; longer lines are skipped with an error
+STREAM_MAX_LINE_BYTES = 64 * 1024
+
+
+def score_ndjson_lines(lines, first_line_number, requested_model=None):
+    """
+    Score a small batch of NDJSON records with one vectorized model call.
+    
+    Each input line is either {"frequency_values": [60 floats], "id": ...}
+    (id optional, echoed back) or a bare JSON array of 60 floats.
+    
+    Args:
+        lines (list): Raw input lines (bytes), at most STREAM_BATCH_SIZE
+        first_line_number (int): 1-based line number of lines[0] in the stream
+        requested_model (str): Value of the ?model= query parameter
+    
+    Returns:
+        bytes: One NDJSON result line per non-blank input line
+    """
+    models = MODELS  # one bundle for the whole batch of lines
+    tier, error = select_model_tier(requested_model, models)
+    
+    records, rows, results = [], [], []
+    for offset, line in enumerate(lines):
+        line_number = first_line_number + offset
+        if not line.strip():
+            continue
+        result = {'line': line_number}
+        results.append(result)
+        
+        if error:
+            result.update(success=False, error=error)
+            continue
+        if len(line) > STREAM_MAX_LINE_BYTES:
+            result.update(success=False, error=f"Line longer than {STREAM_MAX_LINE_BYTES} bytes.")
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as e:
+            result.update(success=False, error=f"Invalid JSON: {str(e)}")
+            continue
+        
+        if isinstance(record, dict):
+            if 'id' in record:
+                result['id'] = record['id']
+            record = record.get('frequency_values')
+        records.append(result)
+        rows.append(record)
+    
+    if rows:
+        batch, batch_error = prepare_batch_input(rows, models)
+        if batch_error:
+            for result in records:
+                result.update(success=False, error=batch_error)
+        else:
+            for index, row_error in batch['errors'].items():
+                records[index].update(success=False, error=row_error)
+            
+            if batch['rows']:
+                batch_result = make_batch_prediction(batch['features'], tier, models)
+                for position, index in enumerate(batch['rows']):
+                    if batch_result['success']:
+                        records[index].update(success=True, **format_prediction(batch_result['results'][position]))
+                    else:
+                        records[index].update(success=False, error=batch_result['error'])
+    
+    return b''.join(json.dumps(result).encode('utf-8') + b'\n' for result in results)
+
+
+def iter_ndjson_results(stream, requested_model=None):
+    """
+    Score a blocking NDJSON input stream batch by batch.
+    
+    Reads at most STREAM_BATCH_SIZE lines before yielding their results, so
+    memory stays constant whatever the stream length. The next lines are only
+    read once the server has taken the previous output, so a slow consumer
+    slows down reading instead of growing a buffer.
+    
+    Args:
+        stream: File-like object with readline(limit)
+        requested_model (str): Value of the ?model= query parameter
+    
+    Yields:
+        bytes: NDJSON result lines
+    """
+    line_number = 1
+    batch = []
+    
+    while True:
+        line = stream.readline(STREAM_MAX_LINE_BYTES + 1)
+        if not line:
+            break
+        
+        if len(line) > STREAM_MAX_LINE_BYTES and not line.endswith(b'\n'):
+            # Oversized record: drop the rest of it, keep the error marker
+            while True:
+                rest = stream.readline(STREAM_MAX_LINE_BYTES)
+                if not rest or rest.endswith(b'\n'):
+                    break
+        
+        batch.append(line)
+        if len(batch) >= STREAM_BATCH_SIZE:
+            yield score_ndjson_lines(batch, line_number, requested_model)
+            line_number += len(batch)
+            batch = []
+    
+    if batch:
+        yield score_ndjson_lines(batch, line_number, requested_model)
+
+
+def health_status():
+    """
+    Health payload: model status, version, reload, batching and cache statistics.
+    
+    Returns:
+        tuple: (response payload, 200 if models are loaded else 503)
+    """
+    models = MODELS
+    models_loaded = models is not None
+    return {
+        'status': 'healthy' if models_loaded else 'unhealthy',
+        'models_loaded': models_loaded,
+        'model_version': models['version'] if models_loaded else None,
+        'model_load_time_ms': round(models['load_time_ms'], 1) if models_loaded else None,
+        'model_bands': models['bands'].tolist() if models_loaded and models['bands'] is not None else None,
+        'float32_wire_max_diff': models['float32_max_diff'] if models_loaded else None,
+        'model_reload': dict(RELOAD_STATUS),
+        'batching': PREDICTION_BATCHER.stats(),
+        'prediction_cache': PREDICTION_CACHE.stats(),
+        'application': 'SONAR Rock vs Mine Prediction',
+        'endpoints': {
+            'form': '/',
+            'api_predict': '/api/predict (POST)',
+            'api_predict_batch': '/api/predict/batch (POST)',
+            'api_predict_stream': '/api/predict/stream (POST, NDJSON)',
+            'risk_factors': '/api/risk-factors (GET)',
+            'sonar_info': '/api/sonar-info (GET)',
+            'metrics': '/metrics (GET, Prometheus)',
+            'health': '/health (GET)'
+        }
+    }, 200 if models_loaded else 503
 
 
 # ==========================================
-# 6. FLASK ROUTES
+# 7. FLASK ROUTES
 # ==========================================
 
+# 400 error for a JSON request body that does not parse (same text on the ASGI app)
+INVALID_JSON_ERROR = 'Request body is not valid JSON.'
+
+
+def serve_prediction_api(handler, field):
+    """
+    Decode the request in its wire format, run a prediction handler and
+    answer in the negotiated format (JSON unless binary was asked for).
+    """
+    try:
+        models = MODELS  # one bundle from decoding to inference
+        request_wire = request_wire_format(request.mimetype)
+        wire = response_wire_format(request.headers.get('Accept'), request_wire)
+        
+        dtype, error = request_wire_dtype(request.headers.get(DTYPE_HEADER))
+        
+        with metrics.time_stage('decode'):
+            if request_wire == 'json':
+                data = request.get_json(force=True, silent=True)
+                if data is None:
+                    error = error or INVALID_JSON_ERROR
+            elif not error:
+                width, error = request_band_count(request.headers.get(BAND_COUNT_HEADER),
+                                                  accepted_band_counts(model_bands(models)))
+                if not error:
+                    data, error = decode_request_body(request.get_data(), request_wire, field, width, dtype)
+        
+        if error:
+            payload, status = {'success': False, 'error': error}, 400
+        else:
+            payload, status = handler(data, request.args.get('model'), wire != 'octet', models)
+        
+        with metrics.time_stage('encode'):
+            encoded = encode_binary_response(payload, wire, dtype)
+            if encoded is None:
+                return jsonify(payload), status
+            body, mimetype = encoded
+            return Response(body, status=status, mimetype=mimetype)
+    
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+# ------------------------------------------
+# Metrics: per-route request counters and latency (see sonar_metrics.py);
+# application state is read when /metrics is scraped
+# ------------------------------------------
+
+def _model_info_samples():
+    models = MODELS
+    if models is None:
+        return []
+    return [((models['version'], tier), 1) for tier in MODEL_TIERS
+            if tier == 'primary' or models.get('fast_model') is not None]
+
+
+def _prediction_cache_samples():
+    stats = PREDICTION_CACHE.stats()
+    return [((field,), stats[field]) for field in ('hits', 'misses', 'evictions', 'entries')]
+
+
+metrics.GaugeFunction('sonar_model_info', 'Loaded model version per available tier',
+                      _model_info_samples, ('version', 'tier'))
+metrics.GaugeFunction('sonar_model_load_seconds', 'Time taken to load the current models',
+                      lambda: [((), MODELS['load_time_ms'] / 1000)] if MODELS is not None else [])
+metrics.GaugeFunction('sonar_model_reloads', 'Successful hot model reloads in this process',
+                      lambda: [((), RELOAD_STATUS['reloads'])])
+metrics.GaugeFunction('sonar_prediction_cache', 'Prediction cache counters and size',
+                      _prediction_cache_samples, ('field',))
+
+
+@app.before_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+
+
+@app.after_request
+def record_request_metrics(response):
+    """Count the request and its latency under its route pattern (bounded label set)."""
+    start = g.pop('request_start', None)
+    route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+    metrics.REQUESTS.inc(route, request.method, response.status_code)
+    if start is not None:
+        metrics.REQUEST_SECONDS.observe(time.perf_counter() - start, route)
+    if response.status_code >= 500:
+        metrics.ERRORS.inc('server')
+    return response
+
+
+# ------------------------------------------
+# Profiling: prediction routes are sampled while they run and the stack
+# profile is kept when the request turns out to be slow (or was asked for)
+# ------------------------------------------
+
+# Keep a profile of any profiled request slower than this (0 disables automatic capture)
+PROFILE_THRESHOLD_MS = float(os.environ.get('SONAR_PROFILE_THRESHOLD_MS', 0))
+
+# Stack sampling interval; requests much shorter than this get few or no samples
+PROFILE_INTERVAL_MS = float(os.environ.get('SONAR_PROFILE_INTERVAL_MS', 5))
+
+PROFILER = SamplingProfiler(
+    Path(os.environ.get('SONAR_PROFILE_DIR', SCRIPT_DIR / 'profiles')),
+    interval_ms=PROFILE_INTERVAL_MS,
+    max_profiles=int(os.environ.get('SONAR_PROFILE_MAX', 50))
+)
+
+
+def is_admin_request():
+    """True if the X-Admin-Token header matches SONAR_ADMIN_TOKEN (never when unset)."""
+    return bool(ADMIN_TOKEN) and request.headers.get('X-Admin-Token') == ADMIN_TOKEN
+
+
+def profiled(view):
+    """
+    Sample a view's stacks and store the profile if it is slow.
+    
+    Requests are profiled when SONAR_PROFILE_THRESHOLD_MS is set, or when
+    an admin sends 'X-Sonar-Profile: 1' (always kept). The stored profile
+    name is returned in the X-Sonar-Profile response header.
+    """
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        forced = request.headers.get('X-Sonar-Profile') == '1' and is_admin_request()
+        if not forced and PROFILE_THRESHOLD_MS <= 0:
+            return view(*args, **kwargs)
+        
+        token = PROFILER.start()
+        start = time.perf_counter()
+        response = None
+        try:
+            response = app.make_response(view(*args, **kwargs))
+            return response
+        finally:
+            duration_ms = (time.perf_counter() - start) * 1000
+            keep = forced or duration_ms >= PROFILE_THRESHOLD_MS
+            name = PROFILER.finish(token, duration_ms, keep, {
+                'route': request.url_rule.rule if request.url_rule is not None else request.path,
+                'method': request.method,
+                'status': response.status_code if response is not None else 500,
+                'model_version': MODELS['version'] if MODELS is not None else None
+            })
+            if name and response is not None:
+                response.headers['X-Sonar-Profile'] = name
+    
+    return wrapper
+
+
+# Pages built only from SONAR_INFO (/about and the empty form) are rendered
+# once per process, i.e. once per deploy, and revalidated with their ETag
+STATIC_PAGE_MAX_AGE = int(os.environ.get('SONAR_STATIC_PAGE_MAX_AGE', 3600))
+
+_static_pages = {}
+
+# Result-page risk-factor cards, rendered once per model version
+_risk_factor_cards = None
+
+
+def serve_static_page(template_name):
+    """
+    Serve a page that never changes while the process runs.
+    
+    Args:
+        template_name (str): Template rendered with SONAR_INFO only
+    
+    Returns:
+        Response: Cached HTML with ETag and public Cache-Control
+                  (304 Not Modified on a matching If-None-Match)
+    """
+    page = _static_pages.get(template_name)
+    if page is None:
+        body = render_template(template_name, sonar_info=SONAR_INFO)
+        page = {'body': body, 'etag': hashlib.sha256(body.encode('utf-8')).hexdigest()[:16]}
+        _static_pages[template_name] = page
+    
+    response = Response(page['body'], mimetype='text/html')
+    response.set_etag(page['etag'])
+    response.cache_control.public = True
+    response.cache_control.max_age = STATIC_PAGE_MAX_AGE
+    return response.make_conditional(request)
+
+
+def get_risk_factor_cards(models=None):
+    """
+    Pre-rendered risk-factor cards for a model bundle (default: the served one).
+    
+    Returns:
+        Markup: HTML fragment inserted as-is into sonar_result.html
+    """
+    global _risk_factor_cards
+    
+    if models is None:
+        models = MODELS
+    version = models.get('version') if models is not None else None
+    cards = _risk_factor_cards
+    if cards is None or cards['version'] != version:
+        html = app.jinja_env.get_template('_risk_factor_cards.html').render(risk_factors=get_risk_factors(models))
+        cards = {'version': version, 'html': Markup(html)}
+        if models is MODELS:
+            _risk_factor_cards = cards
+    return cards['html']
+
+
+def score_form_rows(rows, models=None):
+    """
+    Score the rows pasted into the form with one batch model call.
+    
+    Args:
+        rows (list): (values, error) per pasted line from parse_pasted_rows()
+        models (dict): Model bundle snapshot taken when the request started
+    
+    Returns:
+        dict: Template context with per-row 'results' (1-based 'row') and
+              rock/mine/failed counts
+    """
+    results = [None] * len(rows)
+    parsed = []
+    for i, (values, error) in enumerate(rows):
+        if error:
+            results[i] = {'row': i + 1, 'success': False, 'error': error}
+        else:
+            parsed.append(i)
+    
+    if parsed:
+        # Same vectorized validation and inference as /api/predict/batch
+        batch, error = prepare_batch_input(np.array([rows[i][0] for i in parsed]), models)
+        if error:
+            raise ValueError(error)
+        
+        for position, row_error in batch['errors'].items():
+            i = parsed[position]
+            results[i] = {'row': i + 1, 'success': False, 'error': row_error}
+        
+        if batch['rows']:
+            batch_result = make_batch_prediction(batch['features'], models=models)
+            if not batch_result['success']:
+                raise RuntimeError(batch_result.get('error', 'Unknown prediction error'))
+            
+            for position, prediction_result in zip(batch['rows'], batch_result['results']):
+                i = parsed[position]
+                results[i] = {'row': i + 1, 'success': True, **prediction_result}
+    
+    scored = [result for result in results if result['success']]
+    return {
+        'results': results,
+        'mine_count': sum(result['prediction'] == 1 for result in scored),
+        'rock_count': sum(result['prediction'] == 0 for result in scored),
+        'failed_count': len(results) - len(scored),
+        'risk_factors': get_risk_factors(models)
+    }
+
+
 @app.route('/', methods=['GET', 'POST'])
+@profiled
 def index():
     """
     Home page: Display prediction form (GET) or process prediction (POST).
     """
     if request.method == 'GET':
-        return render_template('sonar_form.html', sonar_info=SONAR_INFO)
+        return serve_static_page('sonar_form.html')
     
     elif request.method == 'POST':
         try:
-            # Extract frequency values from form
-            frequency_values = []
-            for i in range(60):
-                try:
-                    val = float(request.form.get(f'freq_{i}', 0))
-                    frequency_values.append(val)
-                except ValueError:
-                    pass
+            models = MODELS  # one bundle for the whole request
+            pasted = request.form.get('paste', '').strip()
+            
+            if pasted:
+                # Pasted CSV: one row scores like the grid, several give a table
+                with metrics.time_stage('decode'):
+                    rows, error = parse_pasted_rows(pasted)
+                
+                if error:
+                    return render_template('sonar_form.html', error=error, sonar_info=SONAR_INFO, paste=pasted)
+                
+                if len(rows) > 1:
+                    return render_template('sonar_batch_result.html', **score_form_rows(rows, models), sonar_info=SONAR_INFO)
+                
+                frequency_values, error = rows[0]
+            else:
+                # Extract all 60 grid fields in one pass
+                with metrics.time_stage('decode'):
+                    frequency_values, error = parse_band_tokens(
+                        [request.form.get(f'freq_{i}', '') for i in range(N_BANDS)]
+                    )
             
             # Validate and prepare input
-            features_df, error = prepare_prediction_input(frequency_values)
+            if not error:
+                with metrics.time_stage('validate'):
+                    features, error = prepare_prediction_input(frequency_values, models)
             
             if error:
-                return render_template('sonar_form.html', error=error, sonar_info=SONAR_INFO)
+                metrics.ERRORS.inc('invalid_input')
+                return render_template('sonar_form.html', error=error, sonar_info=SONAR_INFO, paste=pasted)
             
             # Make prediction (Goal 1)
-            prediction_result = make_prediction(features_df)
+            prediction_result = make_prediction(features, models=models)
             
             if not prediction_result['success']:
                 error_msg = prediction_result.get('error', 'Unknown prediction error')
@@ -381,8 +2084,9 @@ def index():
                 prediction_result['confidence_percent']
             )
             
-            # Get risk factors explanation (Goal 2)
-            risk_factors = get_risk_factors()
+            # Risk factors explanation (Goal 2), pre-rendered once per model version
+            with metrics.time_stage('risk_factors'):
+                risk_factor_cards = get_risk_factor_cards(models)
             
             # Prepare result data
             result_data = {
@@ -396,12 +2100,13 @@ def index():
                 'rock_probability': prediction_result['rock_probability'],
                 'mine_probability': prediction_result['mine_probability'],
                 'object_char': object_char,
-                'risk_factors': risk_factors,
+                'risk_factor_cards': risk_factor_cards,
                 'sonar_info': SONAR_INFO
             }
             
             # Render result page
-            return render_template('sonar_result.html', **result_data)
+            with metrics.time_stage('render'):
+                return render_template('sonar_result.html', **result_data)
         
         except Exception as e:
             error = f"An unexpected error occurred: {str(e)}"
@@ -410,79 +2115,70 @@ def index():
 
 @app.route('/about', methods=['GET'])
 def about():
-    """About page: Display project information."""
-    return render_template('sonar_about.html', sonar_info=SONAR_INFO)
+    """About page: Display project information (rendered once, cacheable)."""
+    return serve_static_page('sonar_about.html')
 
 
 @app.route('/api/predict', methods=['POST'])
+@profiled
 def api_predict():
     """
     API endpoint for programmatic predictions.
     Expects JSON: {'frequency_values': [array of 60 floats]}
+    or 240 bytes of little-endian float32 (application/octet-stream;
+    480 bytes of float64 with X-Sonar-Dtype: float64)
+    or the same object as MessagePack (application/msgpack).
+    Optional query parameter: ?model=primary|fast
     """
-    try:
-        data = request.get_json()
-        
-        if 'frequency_values' not in data:
-            return jsonify({
-                'success': False,
-                'error': 'Missing required field: frequency_values'
-            }), 400
-        
-        frequency_values = data['frequency_values']
-        
-        # Prepare input
-        features_df, error = prepare_prediction_input(frequency_values)
-        
-        if error:
-            return jsonify({'success': False, 'error': error}), 400
-        
-        # Make prediction
-        prediction_result = make_prediction(features_df)
-        
-        if not prediction_result['success']:
-            return jsonify(prediction_result), 500
-        
-        # Get characteristics and risk factors
-        object_char = assess_object_characteristics(
-            prediction_result['prediction'],
-            prediction_result['confidence_percent']
-        )
-        risk_factors = get_risk_factors()
-        
-        return jsonify({
-            'success': True,
-            'prediction': {
-                'object_type': prediction_result['object_type'],
-                'confidence_percent': round(prediction_result['confidence_percent'], 2),
-                'confidence_level': prediction_result['confidence_level'],
-                'risk_level': prediction_result['risk_level'],
-                'recommendation': prediction_result['recommendation']
-            },
-            'probabilities': {
-                'rock': round(prediction_result['rock_probability'], 2),
-                'mine': round(prediction_result['mine_probability'], 2)
-            },
-            'characteristics': object_char,
-            'top_risk_factors': risk_factors[:5]
-        }), 200
-    
-    except Exception as e:
-        return jsonify({'success': False, 'error': str(e)}), 500
+    return serve_prediction_api(handle_predict, 'frequency_values')
+
+
+@app.route('/api/predict/batch', methods=['POST'])
+@profiled
+def api_predict_batch():
+    """
+    API endpoint for scoring many SONAR returns in one request.
+    Expects JSON: {'frequency_matrix': [[60 floats], [60 floats], ...]}
+    or N x 240 bytes of little-endian float32 (application/octet-stream;
+    N x 480 bytes of float64 with X-Sonar-Dtype: float64)
+    or the same object as MessagePack (application/msgpack).
+    Invalid rows get a per-row error; the remaining rows are still scored.
+    Optional query parameter: ?model=primary|fast
+    """
+    return serve_prediction_api(handle_predict_batch, 'frequency_matrix')
+
+
+@app.route('/api/predict/stream', methods=['POST'])
+def api_predict_stream():
+    """
+    Streaming endpoint for continuous SONAR feeds.
+    Expects NDJSON (one return per line, chunked upload is fine) and
+    streams back one NDJSON result per line as each small batch is scored.
+    Optional query parameter: ?model=primary|fast
+    """
+    results = iter_ndjson_results(request.stream, request.args.get('model'))
+    return Response(stream_with_context(results), mimetype='application/x-ndjson')
 
 
 @app.route('/api/risk-factors', methods=['GET'])
 def api_risk_factors():
     """
     API endpoint to get top frequency bands (Goal 2).
+    Serves a pre-serialized body with an ETag; clients that send a matching
+    If-None-Match get 304 Not Modified without a body.
     """
     try:
-        risk_factors = get_risk_factors()
-        return jsonify({
-            'success': True,
-            'risk_factors': risk_factors,
-            'note': 'Top frequency bands that distinguish mines from rocks'
-        }), 200
+        body, etag = get_risk_factors_body()
+        
+        if body is None:
+            return jsonify({'success': True, 'risk_factors': [],
+                            'note': 'Top frequency bands that distinguish mines from rocks'}), 200
+        
+        response = Response(body, mimetype='application/json')
+        response.set_etag(etag)
+        response.cache_control.public = True
+        response.cache_control.max_age = RISK_FACTORS_MAX_AGE
+        return response.make_conditional(request)
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
@@ -501,28 +2197,87 @@ def api_sonar_info():
         return jsonify({'success': False, 'error': str(e)}), 500
 
 
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    """Prometheus scrape endpoint (text exposition format)."""
+    return Response(metrics.render(), content_type=metrics.CONTENT_TYPE)
+
+
 @app.route('/health', methods=['GET'])
 def health_check():
     """
     Health check endpoint. Verifies that models are loaded.
     """
-    models_loaded = MODELS is not None
+    payload, status = health_status()
+    return jsonify(payload), status
+
+
+@app.route('/admin/reload', methods=['POST'])
+def admin_reload():
+    """
+    Reload models from models/ without restarting the worker.
+    Requires the X-Admin-Token header to match SONAR_ADMIN_TOKEN.
+    Runs in the background (202) unless ?wait=1 is given.
+    Only the worker that receives the call reloads; use
+    SONAR_MODEL_WATCH_INTERVAL to roll a new model out to every worker.
+    """
+    if not is_admin_request():
+        return jsonify({'success': False, 'error': 'Forbidden'}), 403
+    
+    if request.args.get('wait') == '1':
+        result = reload_models()
+        return jsonify(result), 200 if result['success'] else 409
+    
+    if RELOAD_STATUS['state'] != 'idle':
+        return jsonify({'success': False, 'error': 'A reload is already in progress.'}), 409
+    
+    threading.Thread(target=reload_models, name='model-reload', daemon=True).start()
     return jsonify({
-        'status': 'healthy' if models_loaded else 'unhealthy',
-        'models_loaded': models_loaded,
-        'application': 'SONAR Rock vs Mine Prediction',
-        'endpoints': {
-            'form': '/',
-            'api_predict': '/api/predict (POST)',
-            'risk_factors': '/api/risk-factors (GET)',
-            'sonar_info': '/api/sonar-info (GET)',
-            'health': '/health (GET)'
-        }
-    }), 200 if models_loaded else 503
+        'success': True,
+        'status': 'reload started',
+        'serving_version': MODELS['version'] if MODELS else None
+    }), 202
+
+
+@app.route('/admin/profiles', methods=['GET'])
+def admin_profiles():
+    """
+    List stored request profiles, newest first (X-Admin-Token required).
+    """
+    if not is_admin_request():
+        return jsonify({'success': False, 'error': 'Forbidden'}), 403
+    
+    return jsonify({
+        'success': True,
+        'threshold_ms': PROFILE_THRESHOLD_MS,
+        'interval_ms': PROFILE_INTERVAL_MS,
+        'max_profiles': PROFILER.max_profiles,
+        'profiles': PROFILER.list_profiles()
+    }), 200
+
+
+@app.route('/admin/profiles/<name>', methods=['GET'])
+def admin_profile_download(name):
+    """
+    Download one profile (X-Admin-Token required).
+    ?format=folded returns folded stacks for flamegraph.pl / speedscope;
+    the default is the JSON profile with its metadata.
+    """
+    if not is_admin_request():
+        return jsonify({'success': False, 'error': 'Forbidden'}), 403
+    
+    profile = PROFILER.read_profile(name)
+    if profile is None:
+        return jsonify({'success': False, 'error': 'Profile not found'}), 404
+    
+    if request.args.get('format') == 'folded':
+        return Response(to_folded(profile), mimetype='text/plain',
+                        headers={'Content-Disposition': f'attachment; filename={name[:-5]}.folded'})
+    return jsonify(profile), 200
 
 
 # ==========================================
-# 7. ERROR HANDLERS
+# 8. ERROR HANDLERS
 # ==========================================
 
 @app.errorhandler(404)
@@ -538,7 +2293,7 @@ def internal_error(error):
 
 
 # ==========================================
-# 8. MAIN EXECUTION
+# 9. MAIN EXECUTION
 # ==========================================
 
 if __name__ == '__main__':
@@ -549,9 +2304,11 @@ if __name__ == '__main__':
     print(f"   - Models Loaded: {MODELS is not None}")
     print(f"   - Form Route: http://localhost:5000/")
     print(f"   - API Endpoint: http://localhost:5000/api/predict")
+    print(f"   - Batch API: http://localhost:5000/api/predict/batch")
     print(f"   - Risk Factors: http://localhost:5000/api/risk-factors")
     print(f"   - SONAR Info: http://localhost:5000/api/sonar-info")
     print(f"   - Health Check: http://localhost:5000/health")
+    print(f"   - Metrics: http://localhost:5000/metrics")
     print("\n Goal 1: Classify underwater objects as rocks or mines")
     print(" Goal 2: Identify which SONAR frequencies best distinguish objects")
     print("\n" + "=" * 70 + "\n")
@@ -0,0 +1,275 @@
+"""
+ASGI entry point for the SONAR Rock vs Mine prediction API.
+
+Serves the JSON endpoints of app_sonar_predict.py (/api/predict,
+/api/predict/batch, /api/predict/stream, /api/risk-factors,
+/api/sonar-info, /health, /metrics) on an
+event loop, so slow clients only cost a coroutine instead of a whole
+sync worker. Validation and inference run on a bounded thread pool;
+XGBoost and NumPy release the GIL while they compute.
+
+Run with:
+    uvicorn asgi_sonar_predict:app --host 0.0.0.0 --port 5000
+or under gunicorn (one process per core, see gunicorn.conf.py):
+    gunicorn asgi_sonar_predict:app -k uvicorn.workers.UvicornWorker -w 2
+
+The HTML form and /about stay on the Flask app (app_sonar_predict:app).
+"""
+
+import os
+import json
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from urllib.parse import parse_qs
+import asyncio
+import time
+
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.responses import JSONResponse, Response
+from starlette.routing import Route
+
+import app_sonar_predict as sonar
+import sonar_wire as wire_formats
+from sonar_metrics import time_stage
+
+
+# Threads available for validation + inference per process. Keep it near
+# the core count: more threads only queue on the same CPUs.
+INFERENCE_THREADS = int(os.environ.get('SONAR_INFERENCE_THREADS', os.cpu_count() or 1))
+
+_executor = None
+
+
+def _get_executor():
+    """Create the inference pool lazily (once per worker process)."""
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=INFERENCE_THREADS, thread_name_prefix='sonar-inference')
+    return _executor
+
+
+def _shutdown_executor():
+    """Stop the inference pool; a later startup of the app creates a new one."""
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False)
+        _executor = None
+
+
+async def run_in_pool(function, *args):
+    """Run a blocking handler on the bounded inference pool."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_get_executor(), function, *args)
+
+
+async def read_json(request):
+    """Parse the request body as JSON (None if it is not valid JSON)."""
+    body = await request.body()
+    try:
+        with time_stage('decode'):
+            return json.loads(body)
+    except ValueError:
+        return None
+
+
+async def serve_prediction_api(request, handler, field):
+    """Decode, score on the pool and encode in the negotiated wire format."""
+    try:
+        models = sonar.MODELS  # one bundle from decoding to inference
+        mimetype = request.headers.get('content-type', '').split(';')[0].strip()
+        request_wire = wire_formats.request_wire_format(mimetype)
+        wire = wire_formats.response_wire_format(request.headers.get('accept'), request_wire)
+        
+        dtype, error = wire_formats.request_wire_dtype(request.headers.get(wire_formats.DTYPE_HEADER))
+        
+        if request_wire == 'json':
+            data = await read_json(request)
+            if data is None:
+                error = error or sonar.INVALID_JSON_ERROR
+        elif not error:
+            body = await request.body()
+            with time_stage('decode'):
+                width, error = wire_formats.request_band_count(
+                    request.headers.get(wire_formats.BAND_COUNT_HEADER),
+                    sonar.accepted_band_counts(sonar.model_bands(models)))
+                if not error:
+                    data, error = wire_formats.decode_request_body(body, request_wire, field, width, dtype)
+        
+        if error:
+            payload, status = {'success': False, 'error': error}, 400
+        else:
+            payload, status = await run_in_pool(handler, data, request.query_params.get('model'),
+                                                wire != 'octet', models)
+        
+        with time_stage('encode'):
+            encoded = wire_formats.encode_binary_response(payload, wire, dtype)
+            if encoded is None:
+                return JSONResponse(payload, status_code=status)
+            body, media_type = encoded
+            return Response(body, status_code=status, media_type=media_type)
+    except Exception as e:
+        return JSONResponse({'success': False, 'error': str(e)}, status_code=500)
+
+
+async def api_predict(request):
+    """POST /api/predict - same contract (JSON, octet-stream, MessagePack) as the Flask route."""
+    return await serve_prediction_api(request, sonar.handle_predict, 'frequency_values')
+
+
+async def api_predict_batch(request):
+    """POST /api/predict/batch - same contract (JSON, octet-stream, MessagePack) as the Flask route."""
+    return await serve_prediction_api(request, sonar.handle_predict_batch, 'frequency_matrix')
+
+
+class PredictStreamEndpoint:
+    """
+    POST /api/predict/stream - NDJSON in, NDJSON out.
+    
+    A raw ASGI endpoint: it owns both receive() and send(), so the request
+    body can be read while results are streamed back. Complete lines are
+    scored as soon as their chunk arrives (up to STREAM_BATCH_SIZE per
+    model call). The next chunk is only received after send() for the
+    previous results returned, and send() waits while the client is slow
+    to read, so a slow consumer throttles the producer instead of growing
+    a buffer.
+    """
+    
+    async def __call__(self, scope, receive, send):
+        query = parse_qs(scope.get('query_string', b'').decode('latin-1'))
+        requested_model = query.get('model', [None])[0]
+        
+        await send({
+            'type': 'http.response.start',
+            'status': 200,
+            'headers': [(b'content-type', b'application/x-ndjson')]
+        })
+        
+        pending = b''
+        line_number = 1
+        oversized = False
+        more_body = True
+        
+        while more_body:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                return
+            more_body = message.get('more_body', False)
+            
+            pending += message.get('body', b'')
+            *lines, pending = pending.split(b'\n')
+            
+            if oversized and lines:
+                # First newline after an oversized record ends it
+                lines[0] = b'x' * (sonar.STREAM_MAX_LINE_BYTES + 1)
+                oversized = False
+            if len(pending) > sonar.STREAM_MAX_LINE_BYTES:
+                pending, oversized = b'', True
+            
+            if not more_body:
+                if oversized:
+                    pending = b'x' * (sonar.STREAM_MAX_LINE_BYTES + 1)
+                if pending:
+                    lines.append(pending)
+            
+            for start in range(0, len(lines), sonar.STREAM_BATCH_SIZE):
+                batch = lines[start:start + sonar.STREAM_BATCH_SIZE]
+                output = await run_in_pool(sonar.score_ndjson_lines, batch, line_number, requested_model)
+                line_number += len(batch)
+                if output:
+                    await send({'type': 'http.response.body', 'body': output, 'more_body': True})
+        
+        await send({'type': 'http.response.body', 'body': b'', 'more_body': False})
+
+
+async def api_risk_factors(request):
+    """GET /api/risk-factors - pre-serialized body with ETag / Cache-Control."""
+    try:
+        body, etag = sonar.get_risk_factors_body()
+        if body is None:
+            return JSONResponse({'success': True, 'risk_factors': [],
+                                 'note': 'Top frequency bands that distinguish mines from rocks'})
+        
+        headers = {
+            'ETag': f'"{etag}"',
+            'Cache-Control': f'public, max-age={sonar.RISK_FACTORS_MAX_AGE}'
+        }
+        if f'"{etag}"' in request.headers.get('if-none-match', ''):
+            return Response(status_code=304, headers=headers)
+        return Response(body, media_type='application/json', headers=headers)
+    except Exception as e:
+        return JSONResponse({'success': False, 'error': str(e)}, status_code=500)
+
+
+async def api_sonar_info(request):
+    """GET /api/sonar-info"""
+    return JSONResponse({'success': True, 'sonar_info': sonar.SONAR_INFO})
+
+
+async def health_check(request):
+    """GET /health"""
+    payload, status = sonar.health_status()
+    return JSONResponse(payload, status_code=status)
+
+
+async def metrics_endpoint(request):
+    """GET /metrics - Prometheus text format, same metrics as the Flask route."""
+    return Response(sonar.metrics.render(), media_type=sonar.metrics.CONTENT_TYPE)
+
+
+class MetricsMiddleware:
+    """
+    Count requests and time them to the start of the response, matching
+    the Flask after_request hook (streams are timed to their first byte).
+    """
+    
+    def __init__(self, app):
+        self.app = app
+    
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+        
+        start = time.perf_counter()
+        # Label by route pattern; unknown paths share one label
+        route = scope['path'] if scope['path'] in ROUTE_PATHS else 'unmatched'
+        
+        async def send_with_metrics(message):
+            if message['type'] == 'http.response.start':
+                status = message['status']
+                sonar.metrics.REQUESTS.inc(route, scope['method'], status)
+                sonar.metrics.REQUEST_SECONDS.observe(time.perf_counter() - start, route)
+                if status >= 500:
+                    sonar.metrics.ERRORS.inc('server')
+            await send(message)
+        
+        await self.app(scope, receive, send_with_metrics)
+
+
+@asynccontextmanager
+async def lifespan(app):
+    """Load models (if still lazy) and start the model watcher in this worker."""
+    await run_in_pool(sonar.ensure_models_loaded)
+    sonar.start_model_watcher()
+    yield
+    _shutdown_executor()
+
+
+routes = [
+    Route('/api/predict', api_predict, methods=['POST']),
+    Route('/api/predict/batch', api_predict_batch, methods=['POST']),
+    Route('/api/predict/stream', PredictStreamEndpoint(), methods=['POST']),
+    Route('/api/risk-factors', api_risk_factors, methods=['GET']),
+    Route('/api/sonar-info', api_sonar_info, methods=['GET']),
+    Route('/health', health_check, methods=['GET']),
+    Route('/metrics', metrics_endpoint, methods=['GET']),
+]
+
+ROUTE_PATHS = {route.path for route in routes}
+
+app = Starlette(
+    routes=routes,
+    middleware=[Middleware(MetricsMiddleware)],
+    lifespan=lifespan
+)
@@ -0,0 +1,360 @@
+"""
+Latency and throughput benchmark for the SONAR prediction service.
+
+Replays rows of sonar_data/sonar_data.csv against the Flask test client
+(in-process, no network) or a locally launched gunicorn server, and
+reports throughput and p50/p95/p99 latency for these workloads:
+
+    core        prepare_prediction_input + make_prediction called directly (client target only)
+    single      sequential POST /api/predict
+    batch       sequential POST /api/predict/batch with --batch-size rows
+    concurrent  POST /api/predict from --concurrency threads
+
+Results are written as JSON. Passing --baseline compares them against a
+stored run and exits with status 1 when a workload regressed by more than
+--tolerance, so it can gate CI.
+
+The prediction cache is disabled by default (replayed rows would otherwise
+measure cache hits); pass --cache to keep it.
+
+Usage:
+    python benchmark_sonar.py -o bench.json
+    python benchmark_sonar.py --target server --workers 2 --threads 4 -o bench_server.json
+    python benchmark_sonar.py --url http://127.0.0.1:8000 --workloads single concurrent
+    python benchmark_sonar.py -o new.json --baseline bench.json
+"""
+
+import argparse
+import http.client
+import json
+import os
+import platform
+import socket
+import subprocess
+import sys
+import threading
+import time
+from urllib.parse import urlsplit
+
+import numpy as np
+
+
+WORKLOADS = ('core', 'single', 'batch', 'concurrent')
+
+# Compared against the baseline: higher latency or lower throughput is worse
+LATENCY_KEYS = ('p50_ms', 'p95_ms', 'p99_ms')
+THROUGHPUT_KEYS = ('rows_per_s',)
+
+
+def summarize(latencies, rows, elapsed, errors):
+    """
+    Throughput and latency percentiles of one workload.
+
+    Args:
+        latencies (list): Per-request latency in seconds
+        rows (int): SONAR returns scored
+        elapsed (float): Wall-clock seconds for the whole workload
+        errors (int): Requests that did not return 200
+
+    Returns:
+        dict: Machine-readable workload result
+    """
+    latency_ms = np.asarray(latencies) * 1000
+    return {
+        'requests': len(latencies),
+        'rows': rows,
+        'errors': errors,
+        'elapsed_s': round(elapsed, 4),
+        'requests_per_s': round(len(latencies) / elapsed, 1),
+        'rows_per_s': round(rows / elapsed, 1),
+        'mean_ms': round(float(latency_ms.mean()), 4),
+        'p50_ms': round(float(np.percentile(latency_ms, 50)), 4),
+        'p95_ms': round(float(np.percentile(latency_ms, 95)), 4),
+        'p99_ms': round(float(np.percentile(latency_ms, 99)), 4),
+        'max_ms': round(float(latency_ms.max()), 4)
+    }
+
+
+class TestClientTransport:
+    """POSTs through the Flask test client (one client per thread)."""
+
+    def __init__(self, sonar):
+        self.sonar = sonar
+        self.local = threading.local()
+
+    def post(self, path, body):
+        client = getattr(self.local, 'client', None)
+        if client is None:
+            client = self.local.client = self.sonar.app.test_client()
+        response = client.post(path, data=body, content_type='application/json')
+        return response.status_code
+
+    def model_version(self):
+        return self.sonar.MODELS['version'] if self.sonar.MODELS is not None else None
+
+
+class HTTPTransport:
+    """POSTs over keep-alive HTTP connections (one connection per thread)."""
+
+    def __init__(self, url):
+        parts = urlsplit(url)
+        self.host, self.port = parts.hostname, parts.port or 80
+        self.local = threading.local()
+
+    def _connection(self):
+        connection = getattr(self.local, 'connection', None)
+        if connection is None:
+            connection = self.local.connection = http.client.HTTPConnection(self.host, self.port, timeout=30)
+        return connection
+
+    def post(self, path, body):
+        connection = self._connection()
+        try:
+            connection.request('POST', path, body, {'Content-Type': 'application/json'})
+            response = connection.getresponse()
+            response.read()
+            return response.status
+        except (OSError, http.client.HTTPException):
+            connection.close()
+            self.local.connection = None
+            return 0
+
+    def model_version(self):
+        connection = self._connection()
+        connection.request('GET', '/health')
+        response = connection.getresponse()
+        return json.loads(response.read()).get('model_version')
+
+
+def run_requests(transport, path, bodies, rows_per_request, count, concurrency=1):
+    """
+    Send count requests cycling over bodies from concurrency threads.
+
+    Returns:
+        dict: summarize() of the run
+    """
+    latencies = []
+    errors = [0]
+    next_index = [0]
+    lock = threading.Lock()
+
+    def worker():
+        local_latencies = []
+        local_errors = 0
+        while True:
+            with lock:
+                i = next_index[0]
+                next_index[0] += 1
+            if i >= count:
+                break
+            start = time.perf_counter()
+            status = transport.post(path, bodies[i % len(bodies)])
+            local_latencies.append(time.perf_counter() - start)
+            local_errors += status != 200
+        with lock:
+            latencies.extend(local_latencies)
+            errors[0] += local_errors
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    return summarize(latencies, count * rows_per_request, elapsed, errors[0])
+
+
+def run_core(sonar, rows, count):
+    """Time the input path and make_prediction without HTTP or Flask."""
+    latencies = []
+    start = time.perf_counter()
+    for i in range(count):
+        row_start = time.perf_counter()
+        features, _ = sonar.prepare_prediction_input(rows[i % len(rows)])
+        sonar.make_prediction(features)
+        latencies.append(time.perf_counter() - row_start)
+    return summarize(latencies, count, time.perf_counter() - start, 0)
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def launch_server(workers, threads, env):
+    """
+    Start gunicorn on a free local port and wait until /health answers.
+
+    Returns:
+        tuple: (Popen, base URL)
+    """
+    port = _free_port()
+    command = [sys.executable, '-m', 'gunicorn', 'app_sonar_predict:app',
+               '--bind', f'127.0.0.1:{port}', '--workers', str(workers), '--threads', str(threads)]
+    process = subprocess.Popen(command, env=env, cwd=os.path.dirname(os.path.abspath(__file__)),
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        if process.poll() is not None:
+            sys.exit("⚠️  gunicorn exited during startup (pip install gunicorn?)")
+        try:
+            connection = http.client.HTTPConnection('127.0.0.1', port, timeout=2)
+            connection.request('GET', '/health')
+            if connection.getresponse().status == 200:
+                return process, f'http://127.0.0.1:{port}'
+        except OSError:
+            pass
+        time.sleep(0.2)
+
+    process.terminate()
+    sys.exit("⚠️  Server did not become healthy within 60s")
+
+
+def compare_to_baseline(results, baseline, tolerance):
+    """
+    Find workloads that got slower than the baseline or failed more requests.
+
+    A fast run of failing requests is not an improvement: any rise in the
+    error count over the baseline is a regression, whatever the tolerance.
+
+    Args:
+        results (dict): This run's 'workloads'
+        baseline (dict): Stored run's 'workloads'
+        tolerance (float): Allowed relative change (0.2 = 20%)
+
+    Returns:
+        list: Human-readable regression descriptions
+    """
+    regressions = []
+    for name, current in results.items():
+        previous = baseline.get(name)
+        if previous is None:
+            continue
+        for key in LATENCY_KEYS:
+            if previous.get(key) and current[key] > previous[key] * (1 + tolerance):
+                regressions.append(f"{name}.{key}: {previous[key]:.3f} -> {current[key]:.3f} ms")
+        for key in THROUGHPUT_KEYS:
+            if previous.get(key) and current[key] < previous[key] * (1 - tolerance):
+                regressions.append(f"{name}.{key}: {previous[key]:,.0f} -> {current[key]:,.0f}")
+        if current.get('errors', 0) > previous.get('errors', 0):
+            regressions.append(f"{name}.errors: {previous.get('errors', 0):,} -> {current['errors']:,}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the SONAR prediction service.")
+    parser.add_argument('--target', choices=('client', 'server'), default='client',
+                        help="Flask test client in-process, or a launched gunicorn server")
+    parser.add_argument('--url', help="Benchmark an already running server instead (e.g. the ASGI app)")
+    parser.add_argument('--workloads', nargs='+', choices=WORKLOADS, default=list(WORKLOADS))
+    parser.add_argument('--requests', type=int, default=2000, help="Requests per workload (default 2000)")
+    parser.add_argument('--batch-size', type=int, default=100, help="Rows per batch request (default 100)")
+    parser.add_argument('--concurrency', type=int, default=8, help="Threads for the concurrent workload")
+    parser.add_argument('--warmup', type=int, default=50, help="Untimed requests before each workload")
+    parser.add_argument('--workers', type=int, default=2, help="gunicorn workers (--target server)")
+    parser.add_argument('--threads', type=int, default=4, help="gunicorn threads per worker (--target server)")
+    parser.add_argument('--cache', action='store_true', help="Keep the prediction cache enabled")
+    parser.add_argument('-o', '--output', help="Write results as JSON to this path")
+    parser.add_argument('--baseline', help="Compare against a previous JSON result")
+    parser.add_argument('--tolerance', type=float, default=0.2, help="Allowed regression (default 0.2 = 20%%)")
+    args = parser.parse_args(argv)
+
+    if not args.cache:
+        os.environ['SONAR_CACHE_SIZE'] = '0'
+
+    # Imported after the environment is set so the cache setting applies
+    import app_sonar_predict as sonar
+
+    rows = sonar.load_reference_rows()
+    if rows is None:
+        sys.exit("⚠️  sonar_data.csv is required for the benchmark")
+    single_bodies = [json.dumps({'frequency_values': row.tolist()}).encode() for row in rows]
+    batch_bodies = []
+    for offset in range(0, len(rows), args.batch_size):
+        # Rows repeat cyclically when the batch is larger than the dataset
+        matrix = np.resize(np.roll(rows, -offset, axis=0), (args.batch_size, sonar.N_BANDS))
+        batch_bodies.append(json.dumps({'frequency_matrix': matrix.tolist()}).encode())
+
+    server = None
+    if args.url:
+        target = 'url'
+        transport = HTTPTransport(args.url)
+    elif args.target == 'server':
+        target = 'server'
+        server, url = launch_server(args.workers, args.threads, dict(os.environ))
+        transport = HTTPTransport(url)
+    else:
+        target = 'client'
+        if sonar.ensure_models_loaded() is None:
+            sys.exit("⚠️  Could not load model files from models/")
+        transport = TestClientTransport(sonar)
+
+    print(f"⏱️  Benchmarking ({target}) with {len(rows)} replayed rows, {args.requests} requests per workload")
+
+    results = {}
+    try:
+        for name in args.workloads:
+            if name == 'core':
+                if target != 'client':
+                    continue
+                run_core(sonar, rows, args.warmup)
+                results[name] = run_core(sonar, rows, args.requests)
+            elif name == 'batch':
+                run_requests(transport, '/api/predict/batch', batch_bodies, args.batch_size, max(1, args.warmup // 10))
+                results[name] = run_requests(transport, '/api/predict/batch', batch_bodies,
+                                             args.batch_size, max(1, args.requests // 10))
+            else:
+                concurrency = args.concurrency if name == 'concurrent' else 1
+                run_requests(transport, '/api/predict', single_bodies, 1, args.warmup, concurrency)
+                results[name] = run_requests(transport, '/api/predict', single_bodies, 1, args.requests, concurrency)
+
+            stats = results[name]
+            print(f"   ✓ {name:<11} {stats['requests_per_s']:>9,.0f} req/s {stats['rows_per_s']:>10,.0f} rows/s   "
+                  f"p50 {stats['p50_ms']:.3f}  p95 {stats['p95_ms']:.3f}  p99 {stats['p99_ms']:.3f} ms"
+                  + (f"   ⚠️  {stats['errors']} errors" if stats['errors'] else ""))
+
+        model_version = transport.model_version()
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+    report = {
+        'meta': {
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'target': target,
+            'model_version': model_version,
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'settings': {key: value for key, value in vars(args).items()
+                         if key not in ('output', 'baseline', 'url')}
+        },
+        'workloads': results
+    }
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"\n💾 Results saved to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare_to_baseline(results, baseline.get('workloads', {}), args.tolerance)
+        if regressions:
+            print(f"\n❌ {len(regressions)} regression(s) beyond {args.tolerance:.0%} vs {args.baseline}:")
+            for regression in regressions:
+                print(f"   - {regression}")
+            return 1
+        print(f"\n✅ No regressions beyond {args.tolerance:.0%} vs {args.baseline}")
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,235 @@
+"""
+Distill the soft-voting ensemble into a compact student model for SONAR Rock vs Mine.
+
+The ensemble of ADDITIONAL_MODELS_CODE.py (XGBoost + random forest + RBF
+SVM with Platt scaling + logistic regression) is the most accurate
+candidate. Serving it, however, runs four models on every request.
+Here a small student learns to imitate it:
+
+- the teacher's mine probabilities are blended with the true labels
+  (target = alpha * teacher + (1 - alpha) * label). Each row is used twice,
+  as Mine with weight target and as Rock with weight 1 - target, so the
+  student minimizes cross-entropy against the soft targets while staying a
+  plain XGBClassifier / LogisticRegression
+- students: shallow boosted trees (depth 2 or 3) and an L1 logistic
+  regression that keeps only the bands it needs
+- everything is cross-validated on the cached folds (sonar_fold_cache.py).
+  In each fold the teacher is fitted on the training rows only, so the
+  student's test rows never influence its targets
+- the report lists CV accuracy / ROC-AUC next to the single-row and
+  per-row batch latency of each model, so the trade-off is visible
+- the chosen student is refitted on all rows and exported as
+  best_sonar_model.pkl, to staging/ unless --deploy. A StandardScaler + XGBClassifier student is served
+  through the app's fused Booster path, and a linear student through the
+  closed-form linear scorer
+
+Usage:
+    python distill_sonar_model.py
+    python distill_sonar_model.py --student logistic_l1 --alpha 0.7
+    python distill_sonar_model.py --no-export --report distillation.json
+"""
+
+import argparse
+import json
+import sys
+import time
+
+import numpy as np
+from joblib import Parallel, delayed
+from sklearn.linear_model import LogisticRegression
+from sklearn.pipeline import Pipeline
+from xgboost import XGBClassifier
+
+from sonar_latency import measure_latency
+from train_sonar_models import (
+    BACKUP_MODEL, CANDIDATES, DATA_PATH, ENSEMBLE_MEMBERS, ENSEMBLE_NAME, RANDOM_STATE, add_output_arguments,
+    assemble_voting_classifier, export_models, load_dataset, make_fold_cache, output_dir_from,
+    print_deploy_hint, refit_on_all_rows, risk_factors_from, score_oof
+)
+
+
+# Student name -> factory for a fresh, unfitted classifier
+STUDENTS = {
+    'xgboost_depth2': lambda: XGBClassifier(n_estimators=150, max_depth=2, learning_rate=0.1, eval_metric='logloss',
+                                            random_state=RANDOM_STATE, n_jobs=1),
+    'xgboost_depth3': lambda: XGBClassifier(n_estimators=100, max_depth=3, learning_rate=0.1, eval_metric='logloss',
+                                            random_state=RANDOM_STATE, n_jobs=1),
+    'logistic_l1': lambda: LogisticRegression(penalty='l1', C=1.0, solver='liblinear', random_state=RANDOM_STATE),
+}
+
+# Weight of the teacher's probabilities in the student targets (0 = plain labels)
+ALPHA = 0.5
+
+
+def fit_soft(classifier, X, targets):
+    """
+    Fit a binary classifier on soft targets.
+
+    Every row appears as Mine with weight target and as Rock with weight
+    1 - target, so the weighted log loss equals the cross-entropy against
+    the soft targets.
+
+    Returns:
+        The fitted classifier
+    """
+    X_twice = np.concatenate([X, X])
+    y_twice = np.concatenate([np.ones(len(X), dtype=int), np.zeros(len(X), dtype=int)])
+    weights = np.concatenate([targets, 1 - targets])
+    keep = weights > 0  # zero-weight rows carry nothing and trip some solvers
+    return classifier.fit(X_twice[keep], y_twice[keep], sample_weight=weights[keep])
+
+
+def _fit_member(name, X_train, y_train, X_test):
+    """One teacher member x fold job: mine probabilities on the fold's train and test rows."""
+    classifier = CANDIDATES[name]().fit(X_train, y_train)
+    return classifier.predict_proba(X_train)[:, 1], classifier.predict_proba(X_test)[:, 1]
+
+
+def _fit_student(name, X_train, targets, X_test):
+    """One student x fold job: test mine probabilities and fit seconds."""
+    start = time.perf_counter()
+    student = fit_soft(STUDENTS[name](), X_train, targets)
+    return student.predict_proba(X_test)[:, 1], time.perf_counter() - start
+
+
+def cross_validate_students(cache, students, alpha=ALPHA, n_jobs=-1):
+    """
+    Score the teacher and every student on the cached folds.
+
+    Returns:
+        dict: Model name -> N out-of-fold mine probabilities (teacher under ENSEMBLE_NAME)
+    """
+    folds = range(cache.n_splits)
+    member_jobs = [(name, fold) for fold in folds for name in ENSEMBLE_MEMBERS]
+    outputs = Parallel(n_jobs=n_jobs)(
+        delayed(_fit_member)(name, *cache.fold(fold)[:3]) for name, fold in member_jobs
+    )
+
+    teacher_train = {fold: [] for fold in folds}
+    teacher_test = {fold: [] for fold in folds}
+    for (_, fold), (train_probability, test_probability) in zip(member_jobs, outputs):
+        teacher_train[fold].append(train_probability)
+        teacher_test[fold].append(test_probability)
+
+    oof = {ENSEMBLE_NAME: np.empty(len(cache.y))}
+    targets = {}
+    for fold in folds:
+        _, y_train, _, _ = cache.fold(fold)
+        oof[ENSEMBLE_NAME][cache.folds[fold][1]] = np.mean(teacher_test[fold], axis=0)
+        targets[fold] = alpha * np.mean(teacher_train[fold], axis=0) + (1 - alpha) * y_train
+
+    student_jobs = [(name, fold) for name in students for fold in folds]
+    outputs = Parallel(n_jobs=n_jobs)(
+        delayed(_fit_student)(name, cache.fold(fold)[0], targets[fold], cache.fold(fold)[2])
+        for name, fold in student_jobs
+    )
+    for name in students:
+        oof[name] = np.empty(len(cache.y))
+    for (name, fold), (probabilities, _) in zip(student_jobs, outputs):
+        oof[name][cache.folds[fold][1]] = probabilities
+    return oof
+
+
+def model_size(classifier):
+    """Rough size of a fitted classifier: trees, or non-zero coefficients and the bands they use."""
+    if hasattr(classifier, 'get_booster'):
+        trees = classifier.get_booster().trees_to_dataframe()
+        return {'trees': int(trees['Tree'].nunique()), 'nodes': len(trees)}
+    coef = np.ravel(getattr(classifier, 'coef_', []))
+    return {'bands': int(np.count_nonzero(coef))}
+
+
+def fit_final(X, y, students, alpha=ALPHA, n_jobs=-1):
+    """
+    Fit the teacher and the students on all rows.
+
+    Returns:
+        tuple: (teacher pipeline, dict name -> student pipeline,
+                backup pipeline, fitted teacher members)
+    """
+    scaler, fitted = refit_on_all_rows(X, y, list(ENSEMBLE_MEMBERS), n_jobs)
+    teacher = assemble_voting_classifier(fitted)
+    X_scaled = scaler.transform(X)
+    targets = alpha * teacher.predict_proba(X_scaled)[:, 1] + (1 - alpha) * y
+
+    fitted_students = Parallel(n_jobs=n_jobs)(
+        delayed(fit_soft)(STUDENTS[name](), X_scaled, targets) for name in students
+    )
+    student_models = {name: Pipeline([('scaler', scaler), ('clf', student)])
+                      for name, student in zip(students, fitted_students)}
+    backup_model = Pipeline([('scaler', scaler), ('clf', fitted[BACKUP_MODEL])])
+    return Pipeline([('scaler', scaler), ('clf', teacher)]), student_models, backup_model, fitted
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Distill the SONAR soft-voting ensemble into a small student.")
+    parser.add_argument('--data', default=str(DATA_PATH), help="Training CSV (sonar_data.csv layout)")
+    parser.add_argument('--student', choices=list(STUDENTS),
+                        help="Student to export (default: the most accurate in CV)")
+    parser.add_argument('--alpha', type=float, default=ALPHA, help="Teacher weight in the targets (0-1)")
+    parser.add_argument('--jobs', type=int, default=-1, help="Parallel jobs (default: all cores)")
+    parser.add_argument('--cache-dir', help="Memory-map the scaled folds from this folder")
+    add_output_arguments(parser)
+    parser.add_argument('--no-export', action='store_true', help="Only print the trade-off report")
+    parser.add_argument('--report', help="Also write the report as JSON")
+    args = parser.parse_args(argv)
+
+    if not 0 <= args.alpha <= 1:
+        print("❌ --alpha must be between 0 and 1")
+        return 1
+
+    start = time.perf_counter()
+    X, y = load_dataset(args.data)
+    cache = make_fold_cache(X, y, args.cache_dir)
+    students = list(STUDENTS)
+    print(f"📂 {len(y)} returns; teacher: {ENSEMBLE_NAME} ({', '.join(ENSEMBLE_MEMBERS)}), alpha {args.alpha:g}")
+
+    oof = cross_validate_students(cache, students, args.alpha, args.jobs)
+    teacher_model, student_models, backup_model, members = fit_final(X, y, students, args.alpha, args.jobs)
+
+    rows = []
+    for name, model in [(ENSEMBLE_NAME, teacher_model)] + list(student_models.items()):
+        scores = score_oof(y, oof[name], cache.folds)
+        size = {} if name == ENSEMBLE_NAME else model_size(model.steps[-1][1])
+        rows.append({'model': name, **scores, **measure_latency(model, X), **size})
+
+    teacher_row = rows[0]
+    print("\n" + "=" * 70)
+    print("DISTILLATION: ACCURACY VS LATENCY (5-fold CV; predict_proba latency)")
+    print("=" * 70)
+    print(f"{'model':>16} {'accuracy':>9} {'roc_auc':>8} {'1 row':>10} {'per row':>10}  size")
+    for row in rows:
+        size = ', '.join(f"{value} {key}" for key, value in row.items() if key in ('trees', 'nodes', 'bands'))
+        print(f"{row['model']:>16} {row['accuracy']:9.4f} {row['roc_auc']:8.4f} "
+              f"{row['single_row_us']:8.0f}us {row['batch_row_us']:8.1f}us  {size or '4 models'}")
+
+    if args.student:
+        chosen = next(row for row in rows if row['model'] == args.student)
+    else:
+        chosen = max(rows[1:], key=lambda row: (row['accuracy'], row['roc_auc']))
+    print(f"\n🎯 Student: {chosen['model']} (accuracy {chosen['accuracy']:.4f} vs teacher "
+          f"{teacher_row['accuracy']:.4f}, {teacher_row['single_row_us'] / chosen['single_row_us']:.1f}x "
+          f"faster per single-row call)")
+    print(f"⏱️  Distillation finished in {time.perf_counter() - start:.1f}s")
+
+    if args.report:
+        with open(args.report, 'w') as f:
+            json.dump({'teacher': ENSEMBLE_NAME, 'alpha': args.alpha, 'chosen': chosen['model'], 'results': rows},
+                      f, indent=2)
+        print(f"💾 Report saved to {args.report}")
+
+    if args.no_export:
+        return 0
+
+    student_model = student_models[chosen['model']]
+    risk_factors = risk_factors_from([student_model.steps[-1][1], members['xgboost']])
+    output_dir = output_dir_from(args)
+    export_models(output_dir, student_model, backup_model, risk_factors, f"distilled_{chosen['model']}", chosen,
+                  {'teacher': ENSEMBLE_NAME, 'alpha': args.alpha})
+    print(f"✅ Exported distilled {chosen['model']} to {output_dir}")
+    print_deploy_hint(output_dir)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
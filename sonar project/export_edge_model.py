@@ -0,0 +1,357 @@
+"""
+Export the served scaler + XGBoost pipeline as a compact edge model.
+
+Small boxes next to the sonar head cannot hold best_sonar_model.pkl plus
+sklearn, pandas and xgboost. This script turns the pipeline in models/
+into the flat, quantized arrays read by sonar_edge.py, which needs only
+NumPy:
+
+- trees are read from the booster's JSON model, which stores exact float32
+  split conditions
+- the StandardScaler is folded into every threshold
+  (x_scaled < t  <=>  x < t * scale + mean), so the edge model reads raw
+  band values
+- thresholds are quantized on a 2**bits grid over [0, 1], the validated
+  input range. Leaf values are quantized to signed integers with one
+  shared scale
+- splits that every [0, 1] input takes the same way are pruned, and so are
+  splits whose two leaves quantize to the same value. This only matters at
+  low bit widths: the served model loses no split at 16 bits and 2 of its
+  738 at 8 bits, so the size saving comes from the flat integer arrays
+- the parity report compares the edge model with the pipeline on
+  sonar_data.csv and on random returns. The benchmark prints file size,
+  dependency footprint, single-row / batch latency and cold-start time
+
+Usage:
+    python export_edge_model.py
+    python export_edge_model.py --threshold-bits 8 --leaf-bits 8 --output edge/sonar_edge_model_8bit.npz
+    python export_edge_model.py --report edge_report.json
+"""
+
+import argparse
+import json
+import math
+import subprocess
+import sys
+import time
+from importlib import metadata
+from pathlib import Path
+
+import joblib
+import numpy as np
+
+from sonar_edge import FORMAT_VERSION, N_BANDS, EdgeModel
+from train_sonar_models import DATA_PATH, MODELS_DIR, SCRIPT_DIR, load_dataset
+
+
+EDGE_PATH = SCRIPT_DIR / 'edge' / 'sonar_edge_model.npz'
+
+# Random [0, 1] returns added to the parity check
+PARITY_RANDOM_ROWS = 10000
+
+# Packages the pickled pipeline needs at runtime vs the edge evaluator
+PIPELINE_PACKAGES = ('numpy', 'scipy', 'scikit-learn', 'xgboost', 'joblib', 'threadpoolctl')
+EDGE_PACKAGES = ('numpy',)
+
+LATENCY_REPEATS = 200
+
+
+def load_pipeline(models_dir):
+    """
+    Load the served pipeline and the bands it reads.
+
+    Returns:
+        tuple: (scaler, XGBClassifier, band indices or None, feature_info dict)
+
+    Raises:
+        ValueError: If the model is not a StandardScaler + XGBClassifier pipeline
+    """
+    model = joblib.load(models_dir / 'best_sonar_model.pkl')
+    feature_info = joblib.load(models_dir / 'feature_info.pkl')
+    steps = getattr(model, 'steps', None)
+    if not steps or len(steps) != 2 or type(steps[0][1]).__name__ != 'StandardScaler' \
+            or not hasattr(steps[1][1], 'get_booster'):
+        raise ValueError("Edge export needs a StandardScaler + XGBClassifier pipeline in best_sonar_model.pkl")
+    bands = feature_info.get('selected_bands')
+    return steps[0][1], steps[1][1], (np.asarray(bands) if bands is not None else None), feature_info
+
+
+def read_trees(classifier):
+    """
+    Trees, base margin and objective from the booster's JSON model.
+
+    Returns:
+        tuple: (list of tree dicts, base margin)
+    """
+    learner = json.loads(classifier.get_booster().save_raw(raw_format='json'))['learner']
+    if learner['objective']['name'] != 'binary:logistic':
+        raise ValueError(f"Unsupported objective {learner['objective']['name']}")
+    trees = learner['gradient_booster']['model']['trees']
+
+    # Honour early stopping if the classifier was trained with it
+    best_iteration = getattr(classifier, 'best_iteration', None)
+    if best_iteration is not None:
+        trees = trees[:best_iteration + 1]
+
+    base_score = float(learner['learner_model_param']['base_score'])
+    return trees, math.log(base_score / (1 - base_score))
+
+
+def flatten_trees(trees, mean, scale, threshold_bits, leaf_bits):
+    """
+    Fold the scaler into the thresholds, quantize, prune and flatten the trees.
+
+    Args:
+        trees (list): Tree dicts of the XGBoost JSON model
+        mean (ndarray): Scaler mean per input column
+        scale (ndarray): Scaler scale per input column
+        threshold_bits (int): 8 or 16
+        leaf_bits (int): 8 or 16
+
+    Returns:
+        tuple: (dict of node arrays, leaf scale, max depth, pruning stats dict)
+    """
+    code_max = (1 << threshold_bits) - 1
+    leaf_max = (1 << (leaf_bits - 1)) - 1
+    leaf_values = [value for tree in trees for node, value in enumerate(tree['split_conditions'])
+                   if tree['left_children'][node] == -1]
+    # All-zero leaves (a constant model) would give a zero scale
+    leaf_scale = max((abs(value) for value in leaf_values), default=0.0) / leaf_max or 1.0
+
+    nodes = []  # [feature, threshold code, left, right, leaf code]
+    roots, depths = [], []
+    stats = {'splits': 0, 'pruned_constant': 0, 'pruned_equal_leaves': 0}
+
+    def emit(tree, node, depth):
+        """Append a subtree; return (its index, its depth below this point)."""
+        left, right = tree['left_children'][node], tree['right_children'][node]
+        value = tree['split_conditions'][node]
+        if left == -1:
+            nodes.append([0, 0, len(nodes), len(nodes), int(round(value / leaf_scale))])
+            return len(nodes) - 1, 0
+
+        stats['splits'] += 1
+        feature = tree['split_indices'][node]
+        # x_scaled < value  <=>  x < value * scale + mean. Hist cut points are band
+        # values and x == cut goes right, so a row in the cut's cell must go right
+        code = math.floor((float(np.float32(value)) * scale[feature] + mean[feature]) * code_max)
+        if code <= 0:  # no input in [0, 1] goes left
+            stats['pruned_constant'] += 1
+            return emit(tree, right, depth)
+        if code > code_max:  # every input in [0, 1] goes left
+            stats['pruned_constant'] += 1
+            return emit(tree, left, depth)
+
+        index = len(nodes)
+        nodes.append([feature, code, 0, 0, 0])
+        left_index, left_depth = emit(tree, left, depth + 1)
+        right_index, right_depth = emit(tree, right, depth + 1)
+        if left_depth == right_depth == 0 and nodes[left_index][4] == nodes[right_index][4]:
+            # Both children are leaves with the same quantized value
+            stats['pruned_equal_leaves'] += 1
+            leaf_code = nodes[left_index][4]
+            del nodes[index:]
+            nodes.append([0, 0, index, index, leaf_code])
+            return index, 0
+        nodes[index][2:4] = [left_index, right_index]
+        return index, 1 + max(left_depth, right_depth)
+
+    for tree in trees:
+        root, depth = emit(tree, 0, 0)
+        roots.append(root)
+        depths.append(depth)
+
+    table = np.array(nodes, dtype=np.int64)
+    index_dtype = np.uint16 if len(nodes) <= np.iinfo(np.uint16).max else np.uint32
+    arrays = {
+        'feature': table[:, 0].astype(np.uint8),
+        'threshold': table[:, 1].astype(np.uint8 if threshold_bits == 8 else np.uint16),
+        'left': table[:, 2].astype(index_dtype),
+        'right': table[:, 3].astype(index_dtype),
+        'leaf': table[:, 4].astype(np.int8 if leaf_bits == 8 else np.int16),
+        'roots': np.array(roots, dtype=index_dtype),
+    }
+    stats['nodes'] = len(nodes)
+    return arrays, leaf_scale, max(depths), stats
+
+
+def build_edge_model(models_dir, threshold_bits=16, leaf_bits=16):
+    """
+    Convert the pipeline in models_dir into an EdgeModel.
+
+    Returns:
+        tuple: (EdgeModel, original pipeline, pruning stats)
+    """
+    scaler, classifier, bands, feature_info = load_pipeline(models_dir)
+    n_features = scaler.n_features_in_
+    mean = scaler.mean_ if scaler.mean_ is not None else np.zeros(n_features)
+    scale = scaler.scale_ if scaler.scale_ is not None else np.ones(n_features)
+
+    trees, base_margin = read_trees(classifier)
+    arrays, leaf_scale, max_depth, stats = flatten_trees(trees, mean, scale, threshold_bits, leaf_bits)
+    stats['trees'] = len(trees)
+    meta = {
+        'format_version': FORMAT_VERSION,
+        'threshold_bits': threshold_bits,
+        'leaf_bits': leaf_bits,
+        'leaf_scale': leaf_scale,
+        'base_margin': base_margin,
+        'max_depth': max_depth,
+        'n_features': int(n_features),
+        'bands': bands.tolist() if bands is not None else None,
+        'model_name': feature_info.get('model_name', 'xgboost'),
+    }
+    pipeline = joblib.load(models_dir / 'best_sonar_model.pkl')
+    return EdgeModel(arrays, meta), pipeline, stats
+
+
+def parity_report(edge, pipeline, X, y, random_rows=PARITY_RANDOM_ROWS):
+    """
+    Compare edge and pipeline probabilities on the training data and random returns.
+
+    Returns:
+        dict: Per data set: rows, max / mean absolute mine-probability
+              difference, label agreement, and accuracy where labels exist
+    """
+    bands = edge.bands
+    random_X = np.random.default_rng(42).random((random_rows, N_BANDS))
+    report = {}
+    for name, rows, labels in (('sonar_data', X, y), ('random', random_X, None)):
+        model_input = rows if bands is None else rows[:, bands]
+        expected = pipeline.predict_proba(model_input)[:, 1]
+        actual = edge.predict_proba(rows)[:, 1]
+        difference = np.abs(actual - expected)
+        entry = {
+            'rows': len(rows),
+            'max_abs_diff': float(difference.max()),
+            'mean_abs_diff': float(difference.mean()),
+            'label_agreement': float(((actual > 0.5) == (expected > 0.5)).mean()),
+        }
+        if labels is not None:
+            entry['pipeline_accuracy'] = float(((expected > 0.5).astype(int) == labels).mean())
+            entry['edge_accuracy'] = float(((actual > 0.5).astype(int) == labels).mean())
+        report[name] = entry
+    return report
+
+
+def _time_calls(function, argument, repeats=LATENCY_REPEATS):
+    function(argument)  # warm-up
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        function(argument)
+        timings.append(time.perf_counter() - start)
+    return float(np.median(timings))
+
+
+def package_footprint(names):
+    """Installed size in bytes of the named distributions (missing ones count as 0)."""
+    total = 0
+    for name in names:
+        try:
+            files = metadata.distribution(name).files or []
+        except metadata.PackageNotFoundError:
+            continue
+        total += sum(file.size or 0 for file in files)
+    return total
+
+
+def cold_start_seconds(code):
+    """Wall time of a fresh interpreter running code (imports + load + one prediction)."""
+    start = time.perf_counter()
+    subprocess.run([sys.executable, '-W', 'ignore', '-c', code], cwd=SCRIPT_DIR, check=True,
+                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    return time.perf_counter() - start
+
+
+def benchmark(edge, pipeline, edge_path, pickle_path, X):
+    """
+    Size and latency of the edge model vs the pickled pipeline.
+
+    Returns:
+        dict: file / in-memory / dependency bytes, single-row and per-row batch
+              microseconds, and cold-start seconds for both
+    """
+    model_input = X if edge.bands is None else X[:, edge.bands]
+    probe = 'np.full((1, %d), 0.5)' % model_input.shape[1]
+    return {
+        'file_bytes': {'pipeline': pickle_path.stat().st_size, 'edge': edge_path.stat().st_size},
+        'memory_bytes': {'edge': edge.nbytes},
+        'dependency_bytes': {'pipeline': package_footprint(PIPELINE_PACKAGES),
+                             'edge': package_footprint(EDGE_PACKAGES)},
+        'single_row_us': {'pipeline': _time_calls(pipeline.predict_proba, model_input[:1]) * 1e6,
+                          'edge': _time_calls(edge.predict_proba, model_input[:1]) * 1e6},
+        'batch_row_us': {'pipeline': _time_calls(pipeline.predict_proba, model_input, 20) / len(X) * 1e6,
+                         'edge': _time_calls(edge.predict_proba, model_input, 20) / len(X) * 1e6},
+        'cold_start_s': {
+            'pipeline': cold_start_seconds(
+                f"import joblib, numpy as np; joblib.load({str(pickle_path)!r}).predict_proba({probe})"),
+            'edge': cold_start_seconds(
+                f"import numpy as np, sonar_edge; sonar_edge.EdgeModel.load({str(edge_path)!r}).predict_proba({probe})"),
+        },
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export the SONAR XGBoost pipeline as a NumPy-only edge model.")
+    parser.add_argument('--models-dir', default=str(MODELS_DIR), help="Folder with best_sonar_model.pkl")
+    parser.add_argument('--output', default=str(EDGE_PATH), help="Edge model path (.npz)")
+    parser.add_argument('--threshold-bits', type=int, choices=(8, 16), default=16)
+    parser.add_argument('--leaf-bits', type=int, choices=(8, 16), default=16)
+    parser.add_argument('--data', default=str(DATA_PATH), help="Labelled CSV for the parity report")
+    parser.add_argument('--report', help="Also write the parity and benchmark report as JSON")
+    args = parser.parse_args(argv)
+
+    models_dir = Path(args.models_dir)
+    try:
+        edge, pipeline, stats = build_edge_model(models_dir, args.threshold_bits, args.leaf_bits)
+    except (OSError, ValueError) as e:
+        print(f"❌ {e}")
+        return 1
+
+    output = Path(args.output)
+    output.parent.mkdir(parents=True, exist_ok=True)
+    edge.save(output)
+    pruned = stats['pruned_constant'] + stats['pruned_equal_leaves']
+    print(f"📦 {stats['trees']} trees, {stats['splits']} splits -> {stats['nodes']} nodes "
+          f"({stats['pruned_constant']} constant and {stats['pruned_equal_leaves']} equal-leaf splits pruned), "
+          f"depth {edge.meta['max_depth']}, {args.threshold_bits}-bit thresholds, {args.leaf_bits}-bit leaves")
+    if not pruned:
+        print("   No split could be pruned: pruning only removes splits at low bit widths (e.g. 8-bit)")
+
+    X, y = load_dataset(args.data)
+    parity = parity_report(edge, pipeline, X, y)
+    bench = benchmark(edge, pipeline, output, models_dir / 'best_sonar_model.pkl', X)
+
+    print("\n" + "=" * 70)
+    print("PARITY (mine probability, edge vs pipeline)")
+    print("=" * 70)
+    for name, entry in parity.items():
+        accuracy = ''
+        if 'edge_accuracy' in entry:
+            accuracy = f", accuracy {entry['pipeline_accuracy']:.4f} -> {entry['edge_accuracy']:.4f}"
+        print(f"{name:>10}: {entry['rows']} rows, max diff {entry['max_abs_diff']:.2e}, "
+              f"mean {entry['mean_abs_diff']:.2e}, same label {entry['label_agreement']:.2%}{accuracy}")
+
+    print("\n" + "=" * 70)
+    print("SIZE AND LATENCY (pipeline -> edge)")
+    print("=" * 70)
+    print(f"   Model file:       {bench['file_bytes']['pipeline'] / 1024:.0f} KB -> "
+          f"{bench['file_bytes']['edge'] / 1024:.1f} KB ({bench['memory_bytes']['edge'] / 1024:.1f} KB in memory)")
+    print(f"   Dependencies:     {bench['dependency_bytes']['pipeline'] / 2 ** 20:.0f} MB -> "
+          f"{bench['dependency_bytes']['edge'] / 2 ** 20:.0f} MB (numpy only)")
+    print(f"   Single row:       {bench['single_row_us']['pipeline']:.0f} -> {bench['single_row_us']['edge']:.0f} us")
+    print(f"   Batch, per row:   {bench['batch_row_us']['pipeline']:.1f} -> {bench['batch_row_us']['edge']:.1f} us")
+    print(f"   Cold start:       {bench['cold_start_s']['pipeline']:.2f} -> {bench['cold_start_s']['edge']:.2f} s "
+          f"(new interpreter, load, one prediction)")
+    print(f"✅ Edge model written to {output}")
+
+    if args.report:
+        with open(args.report, 'w') as f:
+            json.dump({'meta': edge.meta, 'pruning': stats, 'parity': parity, 'benchmark': bench}, f, indent=2)
+        print(f"💾 Report saved to {args.report}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
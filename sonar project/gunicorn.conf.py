@@ -0,0 +1,14 @@
+# Gunicorn configuration for the SONAR prediction app
+# Picked up automatically by `gunicorn app_sonar_predict:app` (see Procfile).
+# Bind address and worker count keep gunicorn's defaults ($PORT, $WEB_CONCURRENCY).
+
+import os
+
+# SONAR_PRELOAD=1 imports the app (and loads the models) once in the master
+# before forking, so workers share the library and model pages copy-on-write
+# instead of each holding a private copy. Worker boot becomes near-instant.
+preload_app = os.environ.get('SONAR_PRELOAD', '0') == '1'
+
+if preload_app:
+    # Lazy loading would defer the models past the fork and defeat sharing
+    os.environ['SONAR_LAZY_LOAD'] = '0'
@@ -0,0 +1,278 @@
+"""
+Offline bulk scoring for SONAR CSV files.
+
+Reads files in the sonar_data/sonar_data.csv layout (60 float columns,
+optional R/M label as column 61, no header) in chunks, scores the chunks
+across a process pool with the same models the Flask app serves, and
+writes predictions and probabilities to CSV or Parquet. Memory stays
+bounded by chunk size x workers, so files larger than RAM are fine.
+When labels are present, accuracy and ROC-AUC are reported.
+
+Rows with a missing or non-numeric cell (e.g. a header line) or an
+out-of-range value are written with an error column instead of a
+prediction, and the run continues.
+
+Usage:
+    python score_sonar_csv.py ../sonar_data/sonar_data.csv -o predictions.csv
+    python score_sonar_csv.py big_sweep.csv -o scores.parquet --workers 8 --chunk-size 100000
+"""
+
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+# Load the models explicitly in each worker instead of at import time
+os.environ.setdefault('SONAR_LAZY_LOAD', '1')
+
+import app_sonar_predict as sonar
+
+
+# Probability histogram resolution used for the streaming ROC-AUC
+AUC_BINS = 10000
+
+
+# Error column text of rows that were not scored
+NON_NUMERIC_ERROR = 'Missing or non-numeric band value'
+OUT_OF_RANGE_ERROR = 'Band values must be between 0 and 1'
+
+
+def init_worker():
+    """Load the models once per worker process."""
+    if sonar.ensure_models_loaded() is None:
+        raise RuntimeError("Could not load model files from models/")
+
+
+def score_chunk(values, tier):
+    """
+    Score one chunk of raw band values.
+
+    Every row is validated on all 60 values, like the API does, so the
+    valid and non-numeric masks always describe the same columns.
+
+    Args:
+        values (ndarray): (N x 60) float64 band values (a band subset model reads only its bands)
+        tier (str): 'primary' or 'fast'
+
+    Returns:
+        tuple: (N mine probabilities with NaN for invalid rows, N-length bool
+                mask of valid rows, N-length bool mask of rows with NaN cells)
+    """
+    models = sonar.MODELS  # one bundle for band selection and inference
+    if tier == 'fast' and models.get('fast_model') is None:
+        # run_inference would quietly use the primary pipeline instead
+        raise RuntimeError("Fast model tier is not available in this worker")
+    non_numeric = np.isnan(values).any(axis=1)
+    valid = ((values >= 0) & (values <= 1)).all(axis=1)
+    mine_probability = np.full(len(values), np.nan)
+    if valid.any():
+        model_values = sonar.select_model_bands(values[valid], models)
+        probabilities, _ = sonar.run_inference(np.ascontiguousarray(model_values), tier, models)
+        mine_probability[valid] = probabilities[:, 1]
+    return mine_probability, valid, non_numeric
+
+
+class StreamingMetrics:
+    """Accuracy and histogram-based ROC-AUC in constant memory."""
+
+    def __init__(self):
+        self.correct = 0
+        self.total = 0
+        self.positive_hist = np.zeros(AUC_BINS, dtype=np.int64)
+        self.negative_hist = np.zeros(AUC_BINS, dtype=np.int64)
+
+    def update(self, labels, mine_probability):
+        """Add a chunk of 0/1 labels and their mine probabilities."""
+        predictions = (mine_probability > sonar.DECISION_THRESHOLD).astype(int)
+        self.correct += int((predictions == labels).sum())
+        self.total += len(labels)
+
+        bins = np.minimum((mine_probability * AUC_BINS).astype(int), AUC_BINS - 1)
+        self.positive_hist += np.bincount(bins[labels == 1], minlength=AUC_BINS)
+        self.negative_hist += np.bincount(bins[labels == 0], minlength=AUC_BINS)
+
+    def accuracy(self):
+        return self.correct / self.total if self.total else float('nan')
+
+    def roc_auc(self):
+        """P(score of a mine > score of a rock), ties within a bin counted as half."""
+        positives, negatives = self.positive_hist.sum(), self.negative_hist.sum()
+        if positives == 0 or negatives == 0:
+            return float('nan')
+        negatives_below = np.cumsum(self.negative_hist) - self.negative_hist
+        wins = (self.positive_hist * (negatives_below + 0.5 * self.negative_hist)).sum()
+        return float(wins / (positives * negatives))
+
+
+class OutputWriter:
+    """Append prediction chunks to a CSV or Parquet file."""
+
+    def __init__(self, path):
+        self.path = path
+        self.parquet = path.lower().endswith('.parquet')
+        self.writer = None
+        self.first = True
+        if self.parquet:
+            try:
+                import pyarrow  # noqa: F401
+            except ImportError:
+                sys.exit("⚠️  Parquet output needs pyarrow. Install with: pip install pyarrow")
+
+    def write(self, frame):
+        if self.parquet:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+            table = pa.Table.from_pandas(frame, preserve_index=False)
+            if self.writer is None:
+                self.writer = pq.ParquetWriter(self.path, table.schema)
+            self.writer.write_table(table)
+        else:
+            frame.to_csv(self.path, mode='w' if self.first else 'a', header=self.first, index=False)
+        self.first = False
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+
+
+def iter_chunks(path, chunk_size):
+    """
+    Yield (band values, labels or None) per chunk of the input CSV.
+
+    Labels are the optional 61st column (R = 0, M = 1). Cells that are not
+    numbers (a header line, a stray string) become NaN, so their rows are
+    reported as errors instead of stopping the run.
+
+    Raises:
+        ValueError: If a chunk does not have 60 or 61 columns
+    """
+    for chunk in pd.read_csv(path, header=None, chunksize=chunk_size):
+        if chunk.shape[1] not in (sonar.N_BANDS, sonar.N_BANDS + 1):
+            raise ValueError(f"Expected {sonar.N_BANDS} band columns (+ optional label), got {chunk.shape[1]}")
+        bands = chunk.iloc[:, :sonar.N_BANDS]
+        if not all(pd.api.types.is_numeric_dtype(dtype) for dtype in bands.dtypes):
+            bands = bands.apply(pd.to_numeric, errors='coerce')
+        values = bands.to_numpy(dtype=np.float64)
+        labels = None
+        if chunk.shape[1] == sonar.N_BANDS + 1:
+            labels = chunk.iloc[:, sonar.N_BANDS].astype(str).str.strip().str.upper().to_numpy()
+        yield values, labels
+
+
+def write_chunk(writer, metrics, rows_done, mine_probability, valid, labels, non_numeric, tier):
+    """
+    Write one scored chunk and add its labelled rows to the metrics.
+
+    Returns:
+        tuple: (rows written so far, non-numeric rows, out-of-range rows in this chunk)
+    """
+    frame = pd.DataFrame({
+        'row': np.arange(rows_done, rows_done + len(valid)),
+        'prediction': np.where(mine_probability > sonar.DECISION_THRESHOLD, 'M', 'R'),
+        'object_type': np.where(mine_probability > sonar.DECISION_THRESHOLD, 'Mine', 'Rock'),
+        'rock_probability': 1 - mine_probability,
+        'mine_probability': mine_probability,
+        'model_tier': tier,
+    })
+    frame.loc[~valid, ['prediction', 'object_type']] = ''
+    frame['error'] = np.where(valid, '', np.where(non_numeric, NON_NUMERIC_ERROR, OUT_OF_RANGE_ERROR))
+
+    if labels is not None:
+        frame['label'] = labels
+        labelled = valid & np.isin(labels, ['R', 'M'])
+        metrics.update((labels[labelled] == 'M').astype(int), mine_probability[labelled])
+
+    writer.write(frame)
+    return rows_done + len(valid), int(non_numeric.sum()), int((~valid & ~non_numeric).sum())
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Score SONAR CSV files offline.")
+    parser.add_argument('input', help="CSV in sonar_data.csv layout (60 bands, optional R/M label)")
+    parser.add_argument('-o', '--output', required=True, help="Output path (.csv or .parquet)")
+    parser.add_argument('--chunk-size', type=int, default=50000, help="Rows per chunk (default 50000)")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help="Worker processes")
+    parser.add_argument('--model', choices=sonar.MODEL_TIERS, default='primary', help="Model tier")
+    args = parser.parse_args(argv)
+
+    # Check the tier up front: the workers inherit (fork) or reload the same files
+    models = sonar.ensure_models_loaded()
+    if models is None:
+        print("❌ Could not load model files from models/")
+        return 1
+    _, error = sonar.select_model_tier(args.model, models)
+    if error:
+        print(f"❌ {error} Use --model primary.")
+        return 1
+
+    print(f"📂 Scoring {args.input} with {args.workers} worker(s), {args.chunk_size} rows per chunk, "
+          f"{args.model} tier (model version {models['version']})")
+
+    writer = OutputWriter(args.output)
+    metrics = StreamingMetrics()
+    rows_done = 0
+    non_numeric_rows = 0
+    invalid_rows = 0
+    read_error = None
+    start = time.perf_counter()
+
+    # Bounded number of chunks in flight keeps memory flat for any file size
+    max_in_flight = max(2, args.workers * 2)
+
+    with ProcessPoolExecutor(max_workers=args.workers, initializer=init_worker) as pool:
+        in_flight = []
+        chunks = iter_chunks(args.input, args.chunk_size)
+        exhausted = False
+
+        while in_flight or not exhausted:
+            while not exhausted and len(in_flight) < max_in_flight:
+                try:
+                    values, labels = next(chunks)
+                except StopIteration:
+                    exhausted = True
+                    break
+                except (ValueError, pd.errors.ParserError) as e:
+                    # Unreadable chunk (e.g. wrong column count): keep what is already scored
+                    read_error, exhausted = e, True
+                    break
+                in_flight.append((pool.submit(score_chunk, values, args.model), labels))
+
+            if not in_flight:
+                break
+
+            # Write results in input order
+            future, labels = in_flight.pop(0)
+            mine_probability, valid, non_numeric = future.result()
+            rows_done, chunk_non_numeric, chunk_invalid = write_chunk(
+                writer, metrics, rows_done, mine_probability, valid, labels, non_numeric, args.model)
+            non_numeric_rows += chunk_non_numeric
+            invalid_rows += chunk_invalid
+
+            elapsed = time.perf_counter() - start
+            print(f"   ✓ {rows_done:,} rows ({rows_done / elapsed:,.0f} rows/s)")
+
+    writer.close()
+    elapsed = time.perf_counter() - start
+
+    if read_error is not None:
+        print(f"❌ Stopped reading {args.input} after {rows_done:,} rows: {read_error}")
+        print(f"   The {rows_done:,} rows scored before it are in {args.output}")
+        return 1
+
+    print(f"\n✅ Scored {rows_done:,} rows in {elapsed:.2f}s ({rows_done / elapsed:,.0f} rows/s) -> {args.output}")
+    if non_numeric_rows:
+        print(f"⚠️  {non_numeric_rows:,} rows had missing or non-numeric values and were not scored")
+    if invalid_rows:
+        print(f"⚠️  {invalid_rows:,} rows had out-of-range values and were not scored")
+    if metrics.total:
+        print(f"   Accuracy: {metrics.accuracy():.4f}")
+        print(f"   ROC-AUC:  {metrics.roc_auc():.4f}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,209 @@
+"""
+Band subset model for SONAR Rock vs Mine: retrain on the top-K risk-factor bands.
+
+top_risk_factors.pkl ranks the bands that separate mines from rocks, but
+the served model reads all 60. This stage finds how few bands are enough:
+
+- bands are ranked by XGBoost feature importance. In cross-validation the
+  ranking is redone on each fold's training rows, so the test rows play no
+  part in choosing their bands
+- the model (xgboost by default) is cross-validated on the top K bands for
+  every K in the grid, on the cached folds (sonar_fold_cache.py), in
+  parallel across K x fold fits
+- K is the smallest value whose CV accuracy is within --max-loss of the
+  60-band model. The curve, the accuracy cost and the payload / latency
+  savings are printed
+- the subset model and a logistic-regression backup on the same bands are
+  refitted on all rows and exported to staging/ (models/ with --deploy).
+  feature_info.pkl lists the bands, so the app fetches only those columns
+  and clients may send only the K bands (see "Band Subset Models" in the
+  README)
+
+Usage:
+    python select_sonar_bands.py
+    python select_sonar_bands.py --max-loss 0.02 --report bands.json
+    python select_sonar_bands.py --k 12 --output-dir /tmp/subset_models
+"""
+
+import argparse
+import json
+import sys
+import time
+
+import numpy as np
+from joblib import Parallel, delayed
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import StandardScaler
+
+from sonar_latency import measure_latency
+from train_sonar_models import (
+    BACKUP_MODEL, CANDIDATES, DATA_PATH, N_BANDS, add_output_arguments, available_candidates, export_models,
+    load_dataset, make_fold_cache, output_dir_from, print_deploy_hint, risk_factors_from, score_oof
+)
+
+
+# Band counts on the CV curve
+K_GRID = (5, 8, 10, 12, 15, 20, 25, 30, 40, 50, 60)
+
+# Largest CV accuracy drop from the 60-band model accepted for a smaller K
+MAX_ACCURACY_LOSS = 0.01
+
+# Model whose feature importances rank the bands
+RANKING_MODEL = 'xgboost'
+
+
+def rank_bands(X_scaled, y):
+    """
+    Band numbers ordered by feature importance, most important first.
+
+    Returns:
+        ndarray: All 60 band numbers
+    """
+    importances = CANDIDATES[RANKING_MODEL]().fit(X_scaled, y).feature_importances_
+    return np.argsort(-importances, kind='stable')
+
+
+def top_bands(ranking, k):
+    """The k highest-ranked bands in band order (the column order of a subset model)."""
+    return np.sort(ranking[:k])
+
+
+def _fit_subset(name, X_train, y_train, X_test, bands):
+    """One K x fold job: fit on the fold's subset columns, return test mine probabilities."""
+    classifier = CANDIDATES[name]().fit(X_train[:, bands], y_train)
+    return classifier.predict_proba(X_test[:, bands])[:, 1]
+
+
+def band_curve(cache, name, k_grid=K_GRID, n_jobs=-1):
+    """
+    Cross-validated scores of a candidate on the top-K bands for every K.
+
+    Returns:
+        list: One dict per K with 'k' and the score_oof() metrics
+    """
+    folds = range(cache.n_splits)
+    rankings = Parallel(n_jobs=n_jobs)(delayed(rank_bands)(*cache.fold(fold)[:2]) for fold in folds)
+
+    jobs = [(k, fold) for k in k_grid for fold in folds]
+    outputs = Parallel(n_jobs=n_jobs)(
+        delayed(_fit_subset)(name, *cache.fold(fold)[:3], top_bands(rankings[fold], k)) for k, fold in jobs
+    )
+
+    oof = {k: np.empty(len(cache.y)) for k in k_grid}
+    for (k, fold), probabilities in zip(jobs, outputs):
+        oof[k][cache.folds[fold][1]] = probabilities
+    return [{'k': k, **score_oof(cache.y, oof[k], cache.folds)} for k in k_grid]
+
+
+def choose_k(curve, max_loss=MAX_ACCURACY_LOSS):
+    """Smallest K whose accuracy is within max_loss of the full-band model's."""
+    full = max(curve, key=lambda row: row['k'])
+    return min((row for row in curve if row['accuracy'] >= full['accuracy'] - max_loss),
+               key=lambda row: row['k'])
+
+
+def fit_subset_models(X, y, name, bands):
+    """
+    Fit the subset model and its backup on all rows, on the selected bands only.
+
+    Returns:
+        tuple: (model pipeline, backup pipeline, risk factors Series)
+    """
+    X_subset = X[:, bands]
+    scaler = StandardScaler().fit(X_subset)
+    X_scaled = scaler.transform(X_subset)
+    classifier = CANDIDATES[name]().fit(X_scaled, y)
+    backup = CANDIDATES[BACKUP_MODEL]().fit(X_scaled, y)
+
+    sources = [classifier]
+    if getattr(classifier, 'feature_importances_', None) is None:
+        sources.append(CANDIDATES[RANKING_MODEL]().fit(X_scaled, y))
+    risk_factors = risk_factors_from(sources, bands)
+    return (Pipeline([('scaler', scaler), ('clf', classifier)]),
+            Pipeline([('scaler', scaler), ('clf', backup)]), risk_factors)
+
+
+def payload_bytes(X, bands=None):
+    """Mean JSON body size of a single-return /api/predict request."""
+    rows = X if bands is None else X[:, bands]
+    return float(np.mean([len(json.dumps({'frequency_values': row.tolist()})) for row in rows]))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Retrain a SONAR model on the top-K risk-factor bands.")
+    parser.add_argument('--data', default=str(DATA_PATH), help="Training CSV (sonar_data.csv layout)")
+    parser.add_argument('--model', choices=list(CANDIDATES), default='xgboost', help="Candidate to retrain")
+    parser.add_argument('--k', type=int, help="Use this K instead of choosing it from the curve")
+    parser.add_argument('--max-loss', type=float, default=MAX_ACCURACY_LOSS,
+                        help="Accepted CV accuracy drop from the 60-band model")
+    parser.add_argument('--jobs', type=int, default=-1, help="Parallel jobs (default: all cores)")
+    parser.add_argument('--cache-dir', help="Memory-map the scaled folds from this folder")
+    add_output_arguments(parser)
+    parser.add_argument('--no-export', action='store_true', help="Only print the curve")
+    parser.add_argument('--report', help="Also write the curve as JSON")
+    args = parser.parse_args(argv)
+
+    if args.k is not None and not 1 <= args.k <= N_BANDS:
+        print(f"❌ --k must be between 1 and {N_BANDS}")
+        return 1
+    if not available_candidates([args.model]):
+        return 1
+
+    start = time.perf_counter()
+    X, y = load_dataset(args.data)
+    cache = make_fold_cache(X, y, args.cache_dir)
+    k_grid = sorted(set(K_GRID) | ({args.k} if args.k else set()))
+    print(f"📂 {len(y)} returns; {args.model} on the top K bands for K in {k_grid}")
+
+    curve = band_curve(cache, args.model, k_grid, args.jobs)
+    full = next(row for row in curve if row['k'] == N_BANDS)
+    chosen = next(row for row in curve if row['k'] == args.k) if args.k else choose_k(curve, args.max_loss)
+
+    print("\n" + "=" * 70)
+    print("ACCURACY VS BANDS (5-fold CV, bands ranked inside each fold)")
+    print("=" * 70)
+    print(f"{'K':>4} {'accuracy':>9} {'std':>7} {'roc_auc':>8}")
+    for row in curve:
+        marker = '  <- chosen' if row is chosen else ''
+        print(f"{row['k']:4d} {row['accuracy']:9.4f} {row['accuracy_std']:7.4f} {row['roc_auc']:8.4f}{marker}")
+
+    # Final bands come from a ranking on all rows
+    ranking = rank_bands(StandardScaler().fit_transform(X), y)
+    bands = top_bands(ranking, chosen['k'])
+    model, backup_model, risk_factors = fit_subset_models(X, y, args.model, bands)
+    full_model, _, _ = fit_subset_models(X, y, args.model, np.arange(N_BANDS))
+    subset_latency = measure_latency(model, X[:, bands])
+    full_latency = measure_latency(full_model, X)
+    subset_bytes, full_bytes = payload_bytes(X, bands), payload_bytes(X)
+
+    print(f"\n🎯 K = {chosen['k']}: bands {bands.tolist()}")
+    print(f"   Accuracy cost:   {full['accuracy'] - chosen['accuracy']:+.4f} "
+          f"({full['accuracy']:.4f} -> {chosen['accuracy']:.4f}), "
+          f"ROC-AUC {full['roc_auc']:.4f} -> {chosen['roc_auc']:.4f}")
+    print(f"   JSON request:    {full_bytes:.0f} -> {subset_bytes:.0f} bytes; "
+          f"octet {N_BANDS * 4} -> {chosen['k'] * 4} bytes")
+    print(f"   predict_proba:   {full_latency['single_row_us']:.0f} -> {subset_latency['single_row_us']:.0f} us "
+          f"per single row, {full_latency['batch_row_us']:.1f} -> {subset_latency['batch_row_us']:.1f} us per batch row")
+    print(f"⏱️  Finished in {time.perf_counter() - start:.1f}s")
+
+    if args.report:
+        with open(args.report, 'w') as f:
+            json.dump({'model': args.model, 'max_loss': args.max_loss, 'curve': curve, 'chosen_k': chosen['k'],
+                       'bands': bands.tolist(), 'accuracy_cost': full['accuracy'] - chosen['accuracy'],
+                       'json_bytes': {'full': full_bytes, 'subset': subset_bytes},
+                       'latency_us': {'full': full_latency, 'subset': subset_latency}}, f, indent=2)
+        print(f"💾 Report saved to {args.report}")
+
+    if args.no_export:
+        return 0
+
+    output_dir = output_dir_from(args)
+    export_models(output_dir, model, backup_model, risk_factors, f"{args.model}_top{chosen['k']}_bands", chosen,
+                  bands=bands)
+    print(f"✅ Exported {chosen['k']}-band {args.model} to {output_dir}")
+    print_deploy_hint(output_dir)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
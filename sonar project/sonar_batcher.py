@@ -0,0 +1,150 @@
+"""
+Micro-batching for single-row SONAR predictions.
+
+Concurrent single-row requests (gunicorn --threads, the ASGI entry point)
+are coalesced into one vectorized model call. The first queued request
+waits at most the batch window for others to join; a full batch is
+dispatched at once. One dispatcher thread per process scores each batch
+with the inference function it was given and routes every row's result
+back to the request waiting for it.
+
+Each row is queued with the model bundle its request was validated
+against. Rows are grouped by tier and model version, so a hot reload
+(which may change the band count) never mixes rows of two bundles in one
+model call.
+"""
+
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+
+import numpy as np
+
+
+class PredictionBatcher:
+    """
+    Dynamic batcher for single-row predictions.
+
+    Requests wait at most window_ms (counted from the first request in the
+    batch) or until max_size requests are queued, then a single inference
+    call scores them all and each result is routed back to its waiting
+    request.
+    """
+
+    def __init__(self, infer, window_ms, max_size, result_timeout=1.0):
+        """
+        Args:
+            infer (callable): infer(features, tier, models) -> ((N x 2) probabilities, timings dict)
+            window_ms (float): Longest wait for a batch to fill (0 disables batching)
+            max_size (int): A batch is dispatched as soon as it holds this many requests
+            result_timeout (float): Seconds after which a request is scored on its own
+        """
+        self.run_inference = infer
+        self.window = window_ms / 1000
+        self.max_size = max(1, max_size)
+        self.result_timeout = result_timeout
+        self.queue = None
+        self._pid = None
+        self._start_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self.batch_sizes = {}
+        self.batches = 0
+        self.requests = 0
+
+    @property
+    def enabled(self):
+        return self.window > 0
+
+    def _ensure_worker(self):
+        """Start the dispatcher thread once per process (threads do not survive a fork)."""
+        if self._pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._pid != os.getpid():
+                self.queue = queue.Queue()
+                threading.Thread(target=self._run, name='prediction-batcher', daemon=True).start()
+                self._pid = os.getpid()
+
+    def infer(self, features, tier, models):
+        """
+        Score one (1 x bands) row as part of the next batch.
+
+        Args:
+            features (ndarray): (1 x bands) validated row
+            tier (str): Model tier
+            models (dict): Model bundle the row was validated against
+
+        Returns:
+            tuple: ((1 x 2) probabilities, dict of stage timings in ms incl. queue_ms)
+        """
+        self._ensure_worker()
+        future = Future()
+        # Copy: the caller's input buffer is reused by its next request
+        self.queue.put((features[0].copy(), tier, models, future, time.perf_counter()))
+
+        try:
+            return future.result(timeout=self.result_timeout)
+        except FutureTimeoutError:
+            if future.cancel():
+                return self.run_inference(features, tier, models)
+            return future.result()
+
+    def _run(self):
+        """Dispatcher loop: collect a batch, score it, repeat."""
+        while True:
+            first = self.queue.get()
+            batch = [first]
+            deadline = first[4] + self.window
+
+            while len(batch) < self.max_size:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self.queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            self._dispatch(batch)
+
+    def _dispatch(self, batch):
+        """Run one inference per tier and model version in the batch and resolve every waiting future."""
+        batch = [item for item in batch if item[3].set_running_or_notify_cancel()]
+        if not batch:
+            return
+
+        groups = {}
+        for item in batch:
+            groups.setdefault((item[1], item[2]['version']), []).append(item)
+
+        dispatched_at = time.perf_counter()
+        for (tier, _), items in groups.items():
+            try:
+                probabilities, timings = self.run_inference(np.stack([item[0] for item in items]), tier, items[0][2])
+            except Exception as e:
+                for item in items:
+                    item[3].set_exception(e)
+                continue
+
+            for i, (_, _, _, future, queued_at) in enumerate(items):
+                future.set_result((probabilities[i:i + 1], dict(timings, queue_ms=(dispatched_at - queued_at) * 1000)))
+
+            with self._stats_lock:
+                self.batch_sizes[len(items)] = self.batch_sizes.get(len(items), 0) + 1
+                self.batches += 1
+                self.requests += len(items)
+
+    def stats(self):
+        """Batch-size distribution and totals since the process started."""
+        with self._stats_lock:
+            return {
+                'enabled': self.enabled,
+                'window_ms': self.window * 1000,
+                'max_size': self.max_size,
+                'batches': self.batches,
+                'requests': self.requests,
+                'mean_batch_size': round(self.requests / self.batches, 2) if self.batches else 0,
+                'batch_sizes': {str(size): count for size, count in sorted(self.batch_sizes.items())}
+            }
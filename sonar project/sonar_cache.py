@@ -0,0 +1,99 @@
+"""
+Prediction cache for the SONAR prediction app.
+
+Rigs often re-send the same (or nearly the same) return, so
+app_sonar_predict.py caches [Rock, Mine] probabilities per quantized
+input vector and model tier. The cache is a bounded LRU with a TTL, and
+it empties itself whenever the served model version changes, so a hot
+reload never serves the old model's answers.
+"""
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+
+class PredictionCache:
+    """
+    Bounded LRU + TTL cache of [Rock, Mine] probabilities.
+
+    Keys are a hash of the input quantized to a number of decimals plus
+    the model tier.
+    """
+
+    def __init__(self, max_entries, ttl, decimals):
+        """
+        Args:
+            max_entries (int): Maximum cached results (0 disables the cache)
+            ttl (float): Seconds a cached result stays valid
+            decimals (int): Decimal places inputs are rounded to before hashing
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.scale = 10.0 ** decimals
+        self.entries = OrderedDict()
+        self.version = None
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def enabled(self):
+        return self.max_entries > 0
+
+    def key(self, features, tier):
+        """Hash of the quantized (1 x bands) input and the tier."""
+        quantized = np.rint(features[0] * self.scale).astype(np.int64)
+        return hashlib.blake2b(quantized.tobytes() + tier.encode('ascii'), digest_size=16).digest()
+
+    def _check_version(self, version):
+        """Drop every entry when a different model version is being served (lock held)."""
+        if version != self.version:
+            self.entries.clear()
+            self.version = version
+
+    def get(self, key, version):
+        """Return cached probabilities, or None on a miss or expired entry."""
+        with self.lock:
+            self._check_version(version)
+            entry = self.entries.get(key)
+            if entry is None or time.monotonic() - entry[1] > self.ttl:
+                if entry is not None:
+                    del self.entries[key]
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, version, probabilities):
+        """Store probabilities for a key, evicting the least recently used entry if full."""
+        # Own copy: a batched row is a view into the whole batch's array, which
+        # it would keep alive, and the caller may reuse or change that array
+        probabilities = probabilities.copy()
+        with self.lock:
+            self._check_version(version)
+            self.entries[key] = (probabilities, time.monotonic())
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def stats(self):
+        """Hit/miss counters and current size."""
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                'enabled': self.enabled,
+                'entries': len(self.entries),
+                'max_entries': self.max_entries,
+                'ttl_seconds': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0
+            }
@@ -0,0 +1,112 @@
+"""
+Dependency-light evaluator for SONAR tree models exported by export_edge_model.py.
+
+An edge model is one .npz file of flat NumPy arrays. The scaler is folded
+into the split thresholds, and thresholds and leaf values are quantized to
+small integers. Evaluating it needs only NumPy: no sklearn, xgboost, pandas
+or pickle.
+
+Layout (one entry per node, all trees concatenated):
+    feature    uint8       input column tested by a split
+    threshold  uint8/16    split threshold code: go left if code(x) < threshold
+    left/right uint16/32   child node indices; leaves point to themselves
+    leaf       int8/16     leaf value code (0 on splits)
+    roots      uint16/32   root node of every tree
+    meta       str (JSON)  bits, scales, base margin, depth, bands
+
+Band values must be in [0, 1], the app's validated range. A value maps to
+floor(x * (2**threshold_bits - 1)).
+"""
+
+import json
+
+import numpy as np
+
+
+FORMAT_VERSION = 1
+
+# Bands per full SONAR return
+N_BANDS = 60
+
+
+class EdgeModel:
+    """Flattened, quantized tree ensemble evaluated with vectorized NumPy gathers."""
+
+    def __init__(self, arrays, meta):
+        """
+        Args:
+            arrays (dict): feature, threshold, left, right, leaf and roots arrays
+            meta (dict): Model metadata (see module docstring)
+        """
+        if meta.get('format_version') != FORMAT_VERSION:
+            raise ValueError(f"Unsupported edge model format {meta.get('format_version')!r}")
+        self.feature = arrays['feature']
+        self.threshold = arrays['threshold']
+        self.left = arrays['left']
+        self.right = arrays['right']
+        self.leaf = arrays['leaf']
+        self.roots = arrays['roots']
+        self.meta = meta
+        self.code_max = (1 << meta['threshold_bits']) - 1
+        self.bands = np.asarray(meta['bands'], dtype=np.intp) if meta.get('bands') is not None else None
+
+    @classmethod
+    def load(cls, path):
+        """Read an exported .npz edge model (no pickle involved)."""
+        with np.load(path, allow_pickle=False) as data:
+            arrays = {name: data[name] for name in ('feature', 'threshold', 'left', 'right', 'leaf', 'roots')}
+            meta = json.loads(str(data['meta']))
+        return cls(arrays, meta)
+
+    def save(self, path):
+        """Write the model as a compressed .npz file."""
+        np.savez_compressed(path, feature=self.feature, threshold=self.threshold, left=self.left,
+                            right=self.right, leaf=self.leaf, roots=self.roots, meta=json.dumps(self.meta))
+
+    @property
+    def nbytes(self):
+        """In-memory size of the node arrays."""
+        return sum(array.nbytes for array in (self.feature, self.threshold, self.left, self.right,
+                                              self.leaf, self.roots))
+
+    def encode(self, X):
+        """
+        Validate (N x bands) values in [0, 1] and map them to threshold codes.
+
+        Accepts full 60-band rows or, for a band subset model, its bands only.
+
+        Raises:
+            ValueError: On a wrong shape, or values outside [0, 1] / NaN
+        """
+        X = np.asarray(X, dtype=np.float64)
+        if X.ndim == 1:
+            X = X[np.newaxis]
+        width = self.meta['n_features']
+        if self.bands is not None and X.shape[1] == N_BANDS:
+            X = X[:, self.bands]
+        if X.shape[1] != width:
+            raise ValueError(f"Expected {width} band values per row, got {X.shape[1]}")
+        if not ((X >= 0) & (X <= 1)).all():
+            raise ValueError("Band values must be between 0 and 1")
+        return np.floor(X * self.code_max).astype(self.threshold.dtype)
+
+    def decision_function(self, X):
+        """Raw margins (log-odds of Mine), one per row."""
+        codes = self.encode(X)
+        rows = np.arange(len(codes))[:, np.newaxis]
+        nodes = np.broadcast_to(self.roots, (len(codes), len(self.roots)))
+        # Leaves point to themselves, so max_depth steps land every row on its leaf
+        for _ in range(self.meta['max_depth']):
+            go_left = codes[rows, self.feature[nodes]] < self.threshold[nodes]
+            nodes = np.where(go_left, self.left[nodes], self.right[nodes])
+        leaf_sum = self.leaf[nodes].sum(axis=1, dtype=np.int64)
+        return self.meta['base_margin'] + self.meta['leaf_scale'] * leaf_sum
+
+    def predict_proba(self, X):
+        """(N x 2) [Rock, Mine] probabilities, like the pipeline's predict_proba."""
+        mine_probability = 0.5 * (1.0 + np.tanh(0.5 * self.decision_function(X)))
+        return np.column_stack((1 - mine_probability, mine_probability))
+
+    def predict(self, X, threshold=0.5):
+        """1 = Mine, 0 = Rock."""
+        return (self.predict_proba(X)[:, 1] > threshold).astype(int)
@@ -0,0 +1,137 @@
+"""
+Fold-wise feature cache for SONAR cross-validation experiments.
+
+The notebooks split sonar_data.csv with the same
+StratifiedKFold(n_splits=5, shuffle=True, random_state=42) for every model
+and refit a StandardScaler inside each cross_validate call. FoldCache does
+that work once:
+
+- the band values are held as one float32 array
+- the fold indices are computed once
+- each fold's StandardScaler is fitted once. Its scaled rows are stored
+  train rows first, so X_train and X_test are views with no copy per fit
+
+Any estimator can then be scored on the cached folds, so adding a model to
+a comparison costs only that model's fits. With mmap_dir the scaled folds
+are written to a .npy file named after the data and split settings. Later
+runs and joblib workers memory-map it instead of rebuilding it.
+
+Models that are exported for serving should still be refitted on the
+float64 CSV values (see train_sonar_models.load_dataset). The app scores
+float64 inputs, and tree split thresholds learned from float32-rounded
+values can differ from them.
+"""
+
+import hashlib
+import os
+import time
+from pathlib import Path
+
+import numpy as np
+from joblib import Parallel, delayed
+from sklearn.model_selection import StratifiedKFold
+from sklearn.preprocessing import StandardScaler
+
+
+def _fit_predict(factory, X_train, y_train, X_test):
+    start = time.perf_counter()
+    classifier = factory().fit(X_train, y_train)
+    return classifier.predict_proba(X_test)[:, 1], time.perf_counter() - start
+
+
+class FoldCache:
+    """Band values, fold indices and per-fold scaled matrices, built once."""
+
+    def __init__(self, X, y, n_splits=5, random_state=42, mmap_dir=None):
+        """
+        Args:
+            X (ndarray): (N x bands) band values
+            y (ndarray): N int labels
+            n_splits (int): StratifiedKFold folds
+            random_state (int): StratifiedKFold shuffle seed
+            mmap_dir (Path): Folder for the memory-mapped scaled folds, or None to keep them in memory
+        """
+        self.X = np.ascontiguousarray(X, dtype=np.float32)
+        self.y = np.asarray(y)
+        self.n_splits = n_splits
+        self.random_state = random_state
+        splitter = StratifiedKFold(n_splits=n_splits, shuffle=True, random_state=random_state)
+        self.folds = list(splitter.split(self.X, self.y))
+        self.n_train = [len(train_idx) for train_idx, _ in self.folds]
+        self.path = None
+        if mmap_dir is None:
+            self.scaled = self._scale_folds()
+        else:
+            self.scaled = self._load_or_build(Path(mmap_dir))
+
+    def signature(self):
+        """Short hash of the data and split settings (names the memory-mapped file)."""
+        digest = hashlib.sha256()
+        digest.update(self.X.tobytes())
+        digest.update(self.y.astype(np.int64).tobytes())
+        digest.update(f"{self.n_splits}-{self.random_state}".encode())
+        return digest.hexdigest()[:16]
+
+    def _scale_folds(self, out=None):
+        """
+        Scale every fold with a StandardScaler fitted on its training rows.
+
+        Returns:
+            ndarray: (folds x N x bands) float32; row order per fold is train rows then test rows
+        """
+        if out is None:
+            out = np.empty((self.n_splits,) + self.X.shape, dtype=np.float32)
+        for fold, (train_idx, test_idx) in enumerate(self.folds):
+            scaler = StandardScaler().fit(self.X[train_idx])
+            out[fold, :len(train_idx)] = scaler.transform(self.X[train_idx])
+            out[fold, len(train_idx):] = scaler.transform(self.X[test_idx])
+        return out
+
+    def _load_or_build(self, directory):
+        self.path = directory / f"sonar-folds-{self.signature()}.npy"
+        if not self.path.exists():
+            directory.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.path.with_name(f"{self.path.stem}.{os.getpid()}.tmp.npy")
+            out = np.lib.format.open_memmap(tmp_path, mode='w+', dtype=np.float32,
+                                            shape=(self.n_splits,) + self.X.shape)
+            self._scale_folds(out)
+            out.flush()
+            del out
+            os.replace(tmp_path, self.path)
+            print(f"💾 Scaled folds cached in {self.path}")
+        return np.load(self.path, mmap_mode='r')
+
+    def fold(self, fold):
+        """
+        Scaled training and test rows of one fold.
+
+        Returns:
+            tuple: (X_train, y_train, X_test, y_test); X_train and X_test are views of the cache
+        """
+        train_idx, test_idx = self.folds[fold]
+        n_train = self.n_train[fold]
+        return self.scaled[fold, :n_train], self.y[train_idx], self.scaled[fold, n_train:], self.y[test_idx]
+
+    def out_of_fold(self, factories, n_jobs=-1):
+        """
+        Fit estimators on every cached fold in parallel and collect their test predictions.
+
+        Args:
+            factories (dict): Name -> callable returning a fresh, unfitted classifier
+            n_jobs (int): joblib jobs across estimator x fold fits
+
+        Returns:
+            tuple: (dict name -> N out-of-fold positive-class probabilities,
+                    dict name -> total fit seconds)
+        """
+        jobs = [(name, fold) for name in factories for fold in range(self.n_splits)]
+        outputs = Parallel(n_jobs=n_jobs)(
+            delayed(_fit_predict)(factories[name], *self.fold(fold)[:3]) for name, fold in jobs
+        )
+
+        oof = {name: np.empty(len(self.y)) for name in factories}
+        fit_seconds = dict.fromkeys(factories, 0.0)
+        for (name, fold), (probabilities, seconds) in zip(jobs, outputs):
+            oof[name][self.folds[fold][1]] = probabilities
+            fit_seconds[name] += seconds
+        return oof, fit_seconds
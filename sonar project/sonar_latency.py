@@ -0,0 +1,36 @@
+"""
+Model latency measurement shared by the offline SONAR scripts.
+
+distill_sonar_model.py and select_sonar_bands.py report the serving cost
+of the models they compare next to their accuracy; both time the fitted
+sklearn pipelines with measure_latency().
+"""
+
+import time
+
+import numpy as np
+
+
+# Timed one-row calls per model (the median is reported)
+LATENCY_REPEATS = 200
+
+
+def measure_latency(model, X, repeats=LATENCY_REPEATS):
+    """
+    Time predict_proba on the sklearn pipeline.
+
+    Returns:
+        dict: 'single_row_us' (median of repeated one-row calls) and
+              'batch_row_us' (per-row time of one call on all rows)
+    """
+    row = X[:1]
+    model.predict_proba(row)  # warm-up
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        model.predict_proba(row)
+        timings.append(time.perf_counter() - start)
+    start = time.perf_counter()
+    model.predict_proba(X)
+    batch_seconds = time.perf_counter() - start
+    return {'single_row_us': float(np.median(timings) * 1e6), 'batch_row_us': batch_seconds / len(X) * 1e6}
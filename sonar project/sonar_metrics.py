@@ -0,0 +1,184 @@
+"""
+Prometheus text-format metrics for the SONAR prediction app.
+
+Dependency-free counters and histograms, cheap enough to leave on in
+production: recording a value is a bucket lookup and one lock-protected
+increment (about a microsecond). Everything is rendered on demand by the
+/metrics route of app_sonar_predict.py and asgi_sonar_predict.py.
+
+Values live in the serving process. Under gunicorn with several workers
+each worker keeps its own numbers and a scrape reaches whichever worker
+accepts it, so scrape each worker separately (e.g. one ASGI process per
+port) or run a single worker with threads when exact totals matter.
+"""
+
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Seconds; spans a cached single-row prediction (~50 us) to a large batch
+LATENCY_BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005,
+                   0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+# Rows per model call
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 1024, 4096, 16384)
+
+_registry = []
+
+
+def _format_labels(names, values):
+    if not names:
+        return ''
+    pairs = []
+    for name, value in zip(names, values):
+        value = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        pairs.append(f'{name}="{value}"')
+    return '{' + ','.join(pairs) + '}'
+
+
+class Counter:
+    """Monotonic counter with optional labels."""
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def inc(self, *labels, amount=1):
+        """Add amount to the series for the given label values."""
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def collect(self):
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} counter"
+        with self._lock:
+            items = list(self._values.items())
+        for labels, value in items:
+            yield f"{self.name}{_format_labels(self.labelnames, labels)} {value}"
+
+
+class Histogram:
+    """Fixed-bucket histogram with optional labels."""
+
+    def __init__(self, name, documentation, buckets, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(sorted(buckets))
+        self.labelnames = tuple(labelnames)
+        self._series = {}  # label values -> [per-bucket counts (+Inf last), sum]
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def observe(self, value, *labels):
+        """Record one value for the given label values."""
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = [[0] * (len(self.buckets) + 1), 0.0]
+                self._series[labels] = series
+            series[0][index] += 1
+            series[1] += value
+
+    def collect(self):
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} histogram"
+        with self._lock:
+            items = [(labels, list(counts), total) for labels, (counts, total) in self._series.items()]
+        for labels, counts, total in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), counts):
+                cumulative += count
+                bucket_labels = _format_labels(self.labelnames + ('le',), labels + (bound,))
+                yield f"{self.name}_bucket{bucket_labels} {cumulative}"
+            series_labels = _format_labels(self.labelnames, labels)
+            yield f"{self.name}_sum{series_labels} {total}"
+            yield f"{self.name}_count{series_labels} {cumulative}"
+
+
+class GaugeFunction:
+    """Gauge whose samples are read from application state at scrape time."""
+
+    def __init__(self, name, documentation, function, labelnames=()):
+        """
+        Args:
+            function (callable): Returns a list of (label values tuple, value)
+        """
+        self.name = name
+        self.documentation = documentation
+        self.function = function
+        self.labelnames = tuple(labelnames)
+        _registry.append(self)
+
+    def collect(self):
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} gauge"
+        for labels, value in self.function():
+            yield f"{self.name}{_format_labels(self.labelnames, labels)} {value}"
+
+
+@contextmanager
+def time_stage(stage):
+    """Record the duration of the enclosed block under sonar_stage_duration_seconds."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_SECONDS.observe(time.perf_counter() - start, stage)
+
+
+def render():
+    """
+    All metrics in the Prometheus text exposition format.
+
+    Returns:
+        str: Response body for /metrics
+    """
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.collect())
+    return '\n'.join(lines) + '\n'
+
+
+# ------------------------------------------
+# Application metrics
+# ------------------------------------------
+
+REQUESTS = Counter(
+    'sonar_http_requests_total', 'HTTP requests by route, method and status code',
+    ('route', 'method', 'status')
+)
+
+REQUEST_SECONDS = Histogram(
+    'sonar_http_request_duration_seconds', 'Time to produce a response (first byte for streams)',
+    LATENCY_BUCKETS, ('route',)
+)
+
+# Stages: decode (JSON/binary/form parsing), validate, scale, trees (model),
+# post (interpretation), risk_factors, encode (response serialization), render (HTML)
+STAGE_SECONDS = Histogram(
+    'sonar_stage_duration_seconds', 'Time spent in each prediction pipeline stage',
+    LATENCY_BUCKETS, ('stage',)
+)
+
+INFERENCE_BATCH_SIZE = Histogram(
+    'sonar_inference_batch_size', 'Rows scored per model inference call',
+    BATCH_SIZE_BUCKETS, ('tier',)
+)
+
+PREDICTIONS = Counter(
+    'sonar_predictions_total', 'Predictions by class and model tier',
+    ('object_type', 'tier')
+)
+
+# Kinds: invalid_input (rejected single return), invalid_row (rejected batch
+# row), prediction (model call failed), server (unhandled 5xx response)
+ERRORS = Counter('sonar_errors_total', 'Errors by kind', ('kind',))
@@ -0,0 +1,170 @@
+"""
+Sampling profiler for slow SONAR prediction requests.
+
+One background thread samples the Python stacks of the request threads
+that are currently registered, every interval, using sys._current_frames().
+Requests that stay under the latency threshold are discarded. Slower ones
+are written as JSON profiles into a bounded on-disk ring buffer, with
+stacks in the folded "frame;frame;frame count" form that flamegraph.pl and
+speedscope read.
+
+Nothing is sampled unless a request is registered, so an idle or disabled
+profiler costs nothing. While requests are in flight the cost is one stack
+walk per request thread per interval.
+"""
+
+import json
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter
+
+
+# Profile files: <unix ms>-<pid>-<route>-<duration ms>ms.json
+PROFILE_NAME = re.compile(r'^\d+-\d+-[\w.-]+-\d+ms\.json$')
+
+
+def _frame_label(code):
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def fold_stack(frame):
+    """Root-first 'a;b;c' label of a frame's call stack."""
+    labels = []
+    while frame is not None:
+        labels.append(_frame_label(frame.f_code))
+        frame = frame.f_back
+    return ';'.join(reversed(labels))
+
+
+class SamplingProfiler:
+    """Samples registered request threads and keeps profiles of slow requests."""
+
+    def __init__(self, directory, interval_ms=5, max_profiles=50):
+        """
+        Args:
+            directory (Path): Folder of the on-disk ring buffer
+            interval_ms (float): Sampling interval
+            max_profiles (int): Profiles kept on disk; the oldest are deleted first
+        """
+        self.directory = directory
+        self.interval = interval_ms / 1000
+        self.max_profiles = max_profiles
+        self.active = {}  # thread ident -> Counter of folded stacks
+        self.lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.thread = None
+        self.saved = 0
+
+    def start(self):
+        """Register the calling thread for sampling and return its token."""
+        ident = threading.get_ident()
+        with self.lock:
+            self.active[ident] = Counter()
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(target=self._sample_loop, name='sonar-profiler', daemon=True)
+                self.thread.start()
+            self.wakeup.set()
+        return ident
+
+    def finish(self, token, duration_ms, keep, meta):
+        """
+        Stop sampling a request and save its profile if keep is set.
+
+        Args:
+            token (int): Value returned by start()
+            duration_ms (float): Request latency
+            keep (bool): Whether to store the profile
+            meta (dict): Extra fields stored with the profile (route, method, ...)
+
+        Returns:
+            str: Profile file name, or None if nothing was stored
+        """
+        with self.lock:
+            samples = self.active.pop(token, None)
+        if not keep or samples is None:
+            return None
+
+        route = re.sub(r'[^\w.-]+', '_', meta.get('route', 'request')).strip('_') or 'index'
+        name = f"{int(time.time() * 1000)}-{os.getpid()}-{route}-{int(duration_ms)}ms.json"
+        profile = {
+            **meta,
+            'duration_ms': round(duration_ms, 3),
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'pid': os.getpid(),
+            'interval_ms': self.interval * 1000,
+            'sample_count': sum(samples.values()),
+            'samples': dict(samples.most_common())
+        }
+        # Write off the request thread; only slow requests get here
+        threading.Thread(target=self._save, args=(name, profile), daemon=True).start()
+        return name
+
+    def _sample_loop(self):
+        while True:
+            with self.lock:
+                idle = not self.active
+                if idle:
+                    # Cleared under the lock so a concurrent start() can't be missed
+                    self.wakeup.clear()
+            if idle:
+                self.wakeup.wait()
+                continue
+
+            time.sleep(self.interval)
+            frames = sys._current_frames()
+            with self.lock:
+                for ident, samples in self.active.items():
+                    frame = frames.get(ident)
+                    if frame is not None:
+                        samples[fold_stack(frame)] += 1
+            del frames
+
+    def _save(self, name, profile):
+        try:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            path = self.directory / name
+            tmp_path = path.with_suffix('.tmp')
+            tmp_path.write_text(json.dumps(profile))
+            os.replace(tmp_path, path)
+            self.saved += 1
+            self._trim()
+        except OSError as e:
+            print(f"⚠️  Could not save profile {name}: {e}")
+
+    def _trim(self):
+        """Delete the oldest profiles beyond max_profiles (names sort by time)."""
+        for name in self.list_profiles()[self.max_profiles:]:
+            try:
+                (self.directory / name).unlink()
+            except FileNotFoundError:
+                pass  # another worker trimmed it first
+
+    def list_profiles(self):
+        """Stored profile names, newest first."""
+        try:
+            names = [name for name in os.listdir(self.directory) if PROFILE_NAME.match(name)]
+        except FileNotFoundError:
+            return []
+        return sorted(names, key=lambda name: int(name.split('-', 1)[0]), reverse=True)
+
+    def read_profile(self, name):
+        """
+        Load one stored profile.
+
+        Returns:
+            dict: The profile, or None if the name is unknown or invalid
+        """
+        if not PROFILE_NAME.match(name):
+            return None
+        try:
+            return json.loads((self.directory / name).read_text())
+        except (OSError, ValueError):
+            return None
+
+
+def to_folded(profile):
+    """Render a profile's samples as folded stacks (one 'stack count' per line)."""
+    return ''.join(f"{stack} {count}\n" for stack, count in profile['samples'].items())
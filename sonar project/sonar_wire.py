@@ -0,0 +1,204 @@
+"""
+Binary wire formats for the SONAR prediction API.
+
+JSON stays the default. Two binary encodings are accepted on
+/api/predict and /api/predict/batch of app_sonar_predict.py and
+asgi_sonar_predict.py:
+
+- 'octet' (application/octet-stream): raw little-endian float32 band
+  values, one row of 60 (or X-Sonar-Band-Count) values per return
+- 'msgpack' (application/msgpack): the JSON object as MessagePack; band
+  values may be sent as a bin field holding the same float32 bytes
+
+float32 rounds the band values, and the XGBoost thresholds sit exactly on
+float64 training values, so a float32 return near a split can score a few
+probability points away from the same return sent as JSON. Clients that
+need JSON parity send 'X-Sonar-Dtype: float64' with float64 bytes.
+
+Decoded bodies are the dicts the request handlers expect, with binary band
+values viewed in place as read-only arrays. msgpack is optional; without it
+MessagePack requests get an error and responses fall back to JSON.
+"""
+
+import numpy as np
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+
+OCTET_STREAM = 'application/octet-stream'
+MSGPACK_TYPES = ('application/msgpack', 'application/x-msgpack')
+
+# Element type of binary band values and octet responses, chosen with X-Sonar-Dtype
+WIRE_DTYPES = {'float32': np.dtype('<f4'), 'float64': np.dtype('<f8')}
+WIRE_DTYPE = WIRE_DTYPES['float32']
+DTYPE_HEADER = 'X-Sonar-Dtype'
+
+# Band values per full SONAR return
+N_BANDS = 60
+
+# Binary rows carry 60 bands unless this header names the subset model's band count
+BAND_COUNT_HEADER = 'X-Sonar-Band-Count'
+
+
+def request_wire_format(mimetype):
+    """
+    Map a request Content-Type (without parameters) to 'json', 'octet' or 'msgpack'.
+    """
+    mimetype = (mimetype or '').lower()
+    if mimetype == OCTET_STREAM:
+        return 'octet'
+    if mimetype in MSGPACK_TYPES:
+        return 'msgpack'
+    return 'json'
+
+
+def response_wire_format(accept, request_wire):
+    """
+    Pick the response encoding: an explicit Accept wins, otherwise answer
+    in the same encoding the request used.
+    """
+    accept = (accept or '').lower()
+    if OCTET_STREAM in accept:
+        return 'octet'
+    if any(mimetype in accept for mimetype in MSGPACK_TYPES):
+        return 'msgpack'
+    if 'application/json' in accept:
+        return 'json'
+    return request_wire
+
+
+def request_band_count(header_value, accepted_counts=(N_BANDS,)):
+    """
+    Row width of a binary request, from its X-Sonar-Band-Count header.
+
+    Args:
+        header_value (str): Header value, or None (60 bands)
+        accepted_counts (tuple): Row widths the served model accepts
+
+    Returns:
+        tuple: (band count, error message if the served model can't take it)
+    """
+    if header_value is None:
+        return N_BANDS, None
+    try:
+        count = int(header_value)
+    except ValueError:
+        count = None
+    if count not in accepted_counts:
+        return None, f"{BAND_COUNT_HEADER} must be one of {list(accepted_counts)} for the served model."
+    return count, None
+
+
+def request_wire_dtype(header_value):
+    """
+    Element type of binary band values, from the X-Sonar-Dtype header.
+
+    Args:
+        header_value (str): 'float32' (the default when None) or 'float64'
+
+    Returns:
+        tuple: (numpy dtype, error message if the value is unknown)
+    """
+    if header_value is None:
+        return WIRE_DTYPE, None
+    dtype = WIRE_DTYPES.get(header_value.strip().lower())
+    if dtype is None:
+        return None, f"{DTYPE_HEADER} must be one of {list(WIRE_DTYPES)}."
+    return dtype, None
+
+
+def _bands_from_buffer(buffer, field, width=N_BANDS, dtype=WIRE_DTYPE):
+    """
+    View little-endian float32 (or float64) bytes as band values without copying.
+
+    Returns:
+        tuple: (read-only ndarray, 1-D for 'frequency_values' or
+                (N x width) for 'frequency_matrix'; error message if any)
+    """
+    row_bytes = width * dtype.itemsize
+    values = f"little-endian {dtype.name} values"
+    if field == 'frequency_matrix':
+        if not buffer or len(buffer) % row_bytes:
+            return None, f"Binary matrix must be a non-empty multiple of {row_bytes} bytes ({width} {values} per row)."
+        return np.frombuffer(buffer, dtype=dtype).reshape(-1, width), None
+    if len(buffer) != row_bytes:
+        return None, f"Binary payload must be exactly {row_bytes} bytes ({width} {values})."
+    return np.frombuffer(buffer, dtype=dtype), None
+
+
+def decode_request_body(body, wire, field, width=N_BANDS, dtype=WIRE_DTYPE):
+    """
+    Decode a binary request body into the dict the handlers expect.
+
+    Args:
+        body (bytes): Raw request body
+        wire (str): 'octet' or 'msgpack'
+        field (str): 'frequency_values' (one return) or 'frequency_matrix' (batch)
+        width (int): Band values per row in binary payloads (see request_band_count)
+        dtype (np.dtype): Element type of binary band values (see request_wire_dtype)
+
+    Returns:
+        tuple: (data dict, error message if the body can't be decoded)
+    """
+    if wire == 'octet':
+        values, error = _bands_from_buffer(body, field, width, dtype)
+        if error:
+            return None, error
+        return {field: values}, None
+
+    if msgpack is None:
+        return None, "MessagePack requests need the msgpack package (pip install msgpack)."
+
+    try:
+        data = msgpack.unpackb(body, raw=False)
+    except (ValueError, TypeError) as e:
+        return None, f"Invalid MessagePack body: {str(e)}"
+
+    # Band values sent as a bin field are float32 (or float64) bytes: view them in place
+    if isinstance(data, dict) and isinstance(data.get(field), bytes):
+        values, error = _bands_from_buffer(data[field], field, width, dtype)
+        if error:
+            return None, error
+        data[field] = values
+
+    return data, None
+
+
+def encode_binary_response(payload, wire, dtype=WIRE_DTYPE):
+    """
+    Serialize a handler payload for a binary response.
+
+    MessagePack carries the full payload. The octet format carries only the
+    probabilities as little-endian float32 (or float64) percentages: [rock,
+    mine] for one return, or an (N x 2) matrix for a batch with NaN rows where
+    a row failed. The handler should leave them unrounded (rounded=False), so
+    the octet body is at least as precise as JSON.
+
+    Args:
+        payload (dict): Response payload from a handler
+        wire (str): Response wire format
+        dtype (np.dtype): Element type of an octet body (the request's X-Sonar-Dtype)
+
+    Returns:
+        tuple: (body bytes, mimetype), or None to send the payload as JSON
+               (JSON requested, or an error the octet format can't express)
+    """
+    if wire == 'msgpack' and msgpack is not None:
+        return msgpack.packb(payload, use_bin_type=True), MSGPACK_TYPES[0]
+
+    if wire == 'octet' and payload.get('success'):
+        if 'results' in payload:
+            probabilities = np.full((len(payload['results']), 2), np.nan, dtype=dtype)
+            for i, result in enumerate(payload['results']):
+                if result['success']:
+                    probabilities[i] = (result['probabilities']['rock'], result['probabilities']['mine'])
+        else:
+            probabilities = np.array(
+                [payload['probabilities']['rock'], payload['probabilities']['mine']], dtype=dtype
+            )
+        return probabilities.tobytes(), OCTET_STREAM
+
+    return None
@@ -0,0 +1,717 @@
+"""
+Tests for the SONAR prediction app on the bundled models/ and sonar_data.csv.
+
+Usage:
+    python -m pytest -q
+"""
+
+import io
+import json
+import shutil
+import threading
+import time
+
+import joblib
+import numpy as np
+import pytest
+from flask import render_template
+
+import app_sonar_predict as sonar
+import benchmark_sonar
+import export_edge_model
+import score_sonar_csv
+import select_sonar_bands
+import train_sonar_models
+from sonar_batcher import PredictionBatcher
+from sonar_cache import PredictionCache
+from sonar_profiler import SamplingProfiler
+
+
+pytestmark = pytest.mark.skipif(sonar.ensure_models_loaded() is None, reason="models/ could not be loaded")
+
+
+@pytest.fixture(scope='module')
+def models():
+    return sonar.ensure_models_loaded()
+
+
+@pytest.fixture(scope='module')
+def rows():
+    return sonar.load_reference_rows()
+
+
+@pytest.fixture
+def client(monkeypatch):
+    # A cache hit would answer a float32 request with a float64 result (and vice versa)
+    monkeypatch.setattr(sonar, 'PREDICTION_CACHE', PredictionCache(0, 0, 4))
+    return sonar.app.test_client()
+
+
+def mine_percent(pipeline, values):
+    return pipeline.predict_proba(np.atleast_2d(values))[:, 1] * 100
+
+
+# ------------------------------------------
+# Batch input
+# ------------------------------------------
+
+def test_batch_reports_bad_rows_individually(client, models, rows):
+    matrix = [
+        rows[0].tolist(),
+        [0.1] * 10,
+        ['x'] + rows[1].tolist()[1:],
+        [[0.1]] * 60,
+        [[0.1] * 60] * 60,
+        rows[2].tolist(),
+    ]
+    response = client.post('/api/predict/batch', json={'frequency_matrix': matrix})
+    assert response.status_code == 200
+    payload = response.get_json()
+    results = payload['results']
+
+    assert [result['row'] for result in results] == list(range(len(matrix)))
+    assert [result['success'] for result in results] == [True, False, False, False, False, True]
+    assert (payload['scored_rows'], payload['failed_rows']) == (2, 4)
+    assert results[1]['error'] == sonar.band_count_error(None)
+    assert all(result['error'].startswith('Invalid input') for result in results[2:5])
+    mine = [results[0]['probabilities']['mine'], results[5]['probabilities']['mine']]
+    assert mine == pytest.approx(mine_percent(models['model'], rows[[0, 2]]), abs=0.005)
+
+
+def test_batch_of_nested_rows_is_not_reshaped(client):
+    # Equal-length nested rows convert to a 3-D array on their own
+    for row in ([[0.1]] * 60, [[0.1] * 60] * 60):
+        response = client.post('/api/predict/batch', json={'frequency_matrix': [row]})
+        assert response.status_code == 200
+        result = response.get_json()['results'][0]
+        assert not result['success']
+        assert result['error'].startswith('Invalid input')
+
+
+# ------------------------------------------
+# Optimized predictors
+# ------------------------------------------
+
+def test_fused_predictor_matches_pipeline(models, rows):
+    assert models['fused_model'] is not None
+    difference = np.abs(models['fused_model'].predict_proba(rows) - models['model'].predict_proba(rows)).max()
+    assert difference <= 1e-6
+
+
+def test_fast_tier_matches_backup_model(models, rows):
+    assert models['fast_model'] is not None
+    probabilities, _ = sonar.run_inference(rows, 'fast', models)
+    assert np.abs(probabilities - models['backup_model'].predict_proba(rows)).max() <= 1e-6
+
+
+def test_latency_budget_picks_the_tier(client, monkeypatch, rows):
+    body = {'frequency_values': rows[0].tolist()}
+    monkeypatch.setitem(sonar._primary_latency, 'ewma_ms', 5.0)
+    monkeypatch.setitem(sonar._primary_latency, 'requests', 1)
+
+    # Primary tier slower than the budget: automatic requests go to the fast tier
+    monkeypatch.setattr(sonar, 'LATENCY_BUDGET_MS', 1.0)
+    assert client.post('/api/predict', json=body).get_json()['model_tier'] == 'fast'
+    assert client.post('/api/predict?model=primary', json=body).get_json()['model_tier'] == 'primary'
+
+    # Within budget: the primary tier serves
+    monkeypatch.setattr(sonar, 'LATENCY_BUDGET_MS', 1000.0)
+    assert client.post('/api/predict', json=body).get_json()['model_tier'] == 'primary'
+
+
+def test_primary_tier_matches_pipeline(models, rows):
+    probabilities, timings = sonar.run_inference(rows, 'primary', models)
+    assert np.abs(probabilities - models['model'].predict_proba(rows)).max() <= 1e-6
+    assert set(timings) == {'scale_ms', 'trees_ms'}
+
+
+# ------------------------------------------
+# Wire formats
+# ------------------------------------------
+
+def test_json_predict(client, models, rows):
+    response = client.post('/api/predict', json={'frequency_values': rows[0].tolist()})
+    assert response.status_code == 200
+    payload = response.get_json()
+    assert payload['probabilities']['mine'] == pytest.approx(mine_percent(models['model'], rows[0])[0], abs=0.005)
+
+
+def test_malformed_json_is_a_400(client):
+    response = client.post('/api/predict', data=b'{"frequency_values": [', content_type='application/json')
+    assert response.status_code == 400
+    assert response.get_json()['error'] == sonar.INVALID_JSON_ERROR
+
+
+def test_octet_float64_matches_json(client, models, rows):
+    response = client.post('/api/predict', data=rows[0].astype('<f8').tobytes(),
+                           content_type='application/octet-stream', headers={'X-Sonar-Dtype': 'float64'})
+    assert response.status_code == 200
+    rock, mine = np.frombuffer(response.data, dtype='<f8')
+    assert mine == pytest.approx(mine_percent(models['model'], rows[0])[0], abs=1e-6)
+    assert rock + mine == pytest.approx(100)
+
+
+def test_octet_float32_scores_the_rounded_values(client, models, rows):
+    values = rows[0].astype('<f4')
+    response = client.post('/api/predict', data=values.tobytes(), content_type='application/octet-stream')
+    assert response.status_code == 200
+    _, mine = np.frombuffer(response.data, dtype='<f4')
+    expected = mine_percent(models['model'], values.astype(np.float64))[0]
+    assert mine == pytest.approx(expected, abs=1e-3)
+
+
+def test_octet_batch_round_trip(client, models, rows):
+    matrix = rows[:5].astype('<f8')
+    response = client.post('/api/predict/batch', data=matrix.tobytes(),
+                           content_type='application/octet-stream', headers={'X-Sonar-Dtype': 'float64'})
+    assert response.status_code == 200
+    probabilities = np.frombuffer(response.data, dtype='<f8').reshape(-1, 2)
+    assert np.abs(probabilities[:, 1] - mine_percent(models['model'], rows[:5])).max() <= 1e-6
+
+
+def test_octet_wrong_length_is_a_400(client, rows):
+    response = client.post('/api/predict', data=rows[0].astype('<f4').tobytes(),
+                           content_type='application/octet-stream', headers={'X-Sonar-Dtype': 'float64'})
+    assert response.status_code == 400
+    assert '480 bytes' in response.get_json()['error']
+
+
+def test_unknown_dtype_is_a_400(client, rows):
+    response = client.post('/api/predict', data=rows[0].astype('<f4').tobytes(),
+                           content_type='application/octet-stream', headers={'X-Sonar-Dtype': 'float16'})
+    assert response.status_code == 400
+
+
+def test_msgpack_round_trip(client, models, rows):
+    msgpack = pytest.importorskip('msgpack')
+    body = msgpack.packb({'frequency_values': rows[0].astype('<f8').tobytes()}, use_bin_type=True)
+    response = client.post('/api/predict', data=body, content_type='application/msgpack',
+                           headers={'X-Sonar-Dtype': 'float64'})
+    assert response.status_code == 200
+    assert response.mimetype == 'application/msgpack'
+    payload = msgpack.unpackb(response.data, raw=False)
+    assert payload['success']
+    assert payload['probabilities']['mine'] == pytest.approx(mine_percent(models['model'], rows[0])[0], abs=0.005)
+
+
+def test_asgi_matches_flask(models, rows):
+    pytest.importorskip('starlette')
+    from starlette.testclient import TestClient
+    import asgi_sonar_predict
+
+    with TestClient(asgi_sonar_predict.app) as asgi_client:
+        response = asgi_client.post('/api/predict', content=rows[0].astype('<f8').tobytes(),
+                                    headers={'Content-Type': 'application/octet-stream', 'X-Sonar-Dtype': 'float64'})
+        assert response.status_code == 200
+        _, mine = np.frombuffer(response.content, dtype='<f8')
+        assert mine == pytest.approx(mine_percent(models['model'], rows[0])[0], abs=1e-6)
+
+        response = asgi_client.post('/api/predict', content=b'{', headers={'Content-Type': 'application/json'})
+        assert response.status_code == 400
+        assert response.json()['error'] == sonar.INVALID_JSON_ERROR
+
+
+# ------------------------------------------
+# Risk factors and hot reload
+# ------------------------------------------
+
+ADMIN_TOKEN = 'test-admin-token'
+
+
+@pytest.fixture
+def staged_models(tmp_path, monkeypatch):
+    """A copy of models/ that reloads read from; the served bundle is restored afterwards."""
+    shutil.copytree(sonar.SCRIPT_DIR / 'models', tmp_path / 'models')
+    monkeypatch.setattr(sonar, 'SCRIPT_DIR', tmp_path)
+    monkeypatch.setattr(sonar, 'MODELS', sonar.MODELS)
+    monkeypatch.setattr(sonar, 'ADMIN_TOKEN', ADMIN_TOKEN)
+    return tmp_path / 'models'
+
+
+def retrain_risk_factors(models_dir):
+    """Stand-in for a retrain: the risk factors are ranked the other way round, so the version changes."""
+    path = models_dir / 'top_risk_factors.pkl'
+    joblib.dump(joblib.load(path).iloc[::-1], path)
+
+
+def reload_models(client):
+    return client.post('/admin/reload?wait=1', headers={'X-Admin-Token': ADMIN_TOKEN})
+
+
+def test_risk_factors_etag(client, staged_models):
+    response = client.get('/api/risk-factors')
+    assert response.status_code == 200
+    etag = response.headers['ETag']
+    assert client.get('/api/risk-factors', headers={'If-None-Match': etag}).status_code == 304
+
+    retrain_risk_factors(staged_models)
+    assert reload_models(client).status_code == 200
+    response = client.get('/api/risk-factors', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.headers['ETag'] != etag
+    bands = [factor['frequency_band'] for factor in response.get_json()['risk_factors']]
+    assert bands == [int(band) for band in sonar.MODELS['risk_factors'].index]
+
+
+def test_reload_rejected_by_golden_set(client, staged_models, monkeypatch):
+    served = sonar.MODELS
+    retrain_risk_factors(staged_models)
+    monkeypatch.setattr(sonar, 'GOLDEN_MIN_ACCURACY', 1.01)
+
+    response = reload_models(client)
+    assert response.status_code == 409
+    payload = response.get_json()
+    assert not payload['success']
+    assert 'golden set' in payload['error']
+    assert payload['version'] == served['version']
+    assert sonar.MODELS is served
+
+
+def test_reload_accepted_by_golden_set(client, staged_models, rows):
+    served = sonar.MODELS
+    retrain_risk_factors(staged_models)
+
+    response = reload_models(client)
+    assert response.status_code == 200
+    payload = response.get_json()
+    assert payload['success']
+    assert payload['version'] != served['version']
+    assert sonar.MODELS['version'] == payload['version']
+
+    # A request that started on the old bundle explains itself with that bundle
+    old_factors = sonar.build_risk_factors(served['risk_factors'])
+    new_factors = sonar.build_risk_factors(sonar.MODELS['risk_factors'])
+    assert old_factors != new_factors
+    payload, status = sonar.handle_predict({'frequency_values': rows[0].tolist()}, models=served)
+    assert status == 200
+    assert payload['top_risk_factors'] == old_factors[:5]
+    assert sonar.get_risk_factors() == new_factors
+
+
+# ------------------------------------------
+# Micro-batcher
+# ------------------------------------------
+
+def test_batcher_groups_rows_by_model_version():
+    calls = []
+
+    def infer(features, tier, models):
+        calls.append((models['version'], features[:, 0].tolist()))
+        return np.column_stack((features[:, 0], features[:, 1])), {'trees_ms': 0.0}
+
+    batcher = PredictionBatcher(infer, window_ms=50, max_size=64)
+    bundles = {'a': {'version': 'a'}, 'b': {'version': 'b'}}
+    jobs = [('a', 0.1), ('a', 0.2), ('b', 0.3), ('a', 0.4), ('b', 0.5)]
+    results = {}
+
+    def request(version, value):
+        row = np.full((1, 60), value)
+        results[value] = batcher.infer(row, 'primary', bundles[version])
+
+    threads = [threading.Thread(target=request, args=job) for job in jobs]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    for value, (probabilities, timings) in results.items():
+        assert probabilities.tolist() == [[value, value]]
+        assert 'queue_ms' in timings
+    version_of = {value: version for version, value in jobs}
+    for version, values in calls:
+        assert {version_of[value] for value in values} == {version}
+    assert sum(len(values) for _, values in calls) == len(jobs)
+    assert batcher.stats()['requests'] == len(jobs)
+
+
+def test_batcher_scores_alone_after_timeout():
+    release = threading.Event()
+
+    def infer(features, tier, models):
+        if len(features) and features[0, 0] == 0.0:
+            release.wait(1)  # keeps the dispatcher busy
+        return np.zeros((len(features), 2)), {}
+
+    batcher = PredictionBatcher(infer, window_ms=1, max_size=1, result_timeout=0.05)
+    blocker = threading.Thread(target=batcher.infer, args=(np.zeros((1, 60)), 'primary', {'version': 'a'}))
+    blocker.start()
+    time.sleep(0.02)
+    start = time.perf_counter()
+    probabilities, _ = batcher.infer(np.ones((1, 60)), 'primary', {'version': 'a'})
+    assert probabilities.shape == (1, 2)
+    assert time.perf_counter() - start < 0.5
+    release.set()
+    blocker.join()
+
+
+# ------------------------------------------
+# Prediction cache
+# ------------------------------------------
+
+def test_cache_quantizes_keys():
+    cache = PredictionCache(8, 60, 4)
+    row = np.full((1, 60), 0.5)
+    assert cache.key(row, 'primary') == cache.key(row + 1e-6, 'primary')
+    assert cache.key(row, 'primary') != cache.key(row + 1e-3, 'primary')
+    assert cache.key(row, 'primary') != cache.key(row, 'fast')
+
+
+def test_cache_evicts_least_recently_used():
+    cache = PredictionCache(2, 60, 4)
+    cache.put(b'a', 'v1', np.array([0.1, 0.9]))
+    cache.put(b'b', 'v1', np.array([0.2, 0.8]))
+    assert cache.get(b'a', 'v1').tolist() == [0.1, 0.9]
+    cache.put(b'c', 'v1', np.array([0.3, 0.7]))
+    assert cache.get(b'b', 'v1') is None
+    assert cache.get(b'a', 'v1').tolist() == [0.1, 0.9]
+    assert cache.stats()['evictions'] == 1
+
+
+def test_cache_expires_and_clears_on_new_version():
+    cache = PredictionCache(4, 60, 4)
+    cache.put(b'a', 'v1', np.array([0.1, 0.9]))
+    assert cache.get(b'a', 'v2') is None
+    assert cache.stats()['entries'] == 0
+
+    expired = PredictionCache(4, -1, 4)
+    expired.put(b'a', 'v1', np.array([0.1, 0.9]))
+    assert expired.get(b'a', 'v1') is None
+
+
+def test_cache_stores_a_copy_of_batch_rows():
+    cache = PredictionCache(4, 60, 4)
+    batch = np.array([[0.2, 0.8], [0.6, 0.4]])
+    cache.put(b'a', 'v1', batch[0])
+    batch[0] = 0.0
+    cached = cache.get(b'a', 'v1')
+    assert cached.tolist() == [0.2, 0.8]
+    assert cached.base is None
+
+
+# ------------------------------------------
+# NDJSON stream parser
+# ------------------------------------------
+
+def read_ndjson(body):
+    return [json.loads(line) for chunk in sonar.iter_ndjson_results(io.BytesIO(body)) for line in chunk.splitlines()]
+
+
+def test_ndjson_line_results_and_errors(models, rows):
+    body = b'\n'.join([
+        json.dumps({'frequency_values': rows[0].tolist(), 'id': 'a'}).encode(),
+        json.dumps(rows[1].tolist()).encode(),
+        b'',
+        b'{"frequency_values": [',
+        json.dumps({'frequency_values': [0.1] * 10}).encode(),
+        json.dumps({'frequency_values': [2.0] * 60}).encode(),
+    ]) + b'\n'
+    results = read_ndjson(body)
+
+    assert [result['line'] for result in results] == [1, 2, 4, 5, 6]
+    assert results[0]['id'] == 'a'
+    assert results[0]['success'] and results[1]['success']
+    assert results[1]['probabilities']['mine'] == pytest.approx(mine_percent(models['model'], rows[1])[0], abs=0.005)
+    assert results[2]['error'].startswith('Invalid JSON')
+    assert not results[3]['success'] and not results[4]['success']
+
+
+def test_ndjson_oversized_line_is_skipped(rows):
+    valid = json.dumps({'frequency_values': rows[0].tolist()}).encode()
+    oversized = b'[' + b' ' * (2 * sonar.STREAM_MAX_LINE_BYTES) + b']'
+    results = read_ndjson(b'\n'.join([valid, oversized, valid]) + b'\n')
+
+    assert [result['line'] for result in results] == [1, 2, 3]
+    assert results[1]['error'] == f"Line longer than {sonar.STREAM_MAX_LINE_BYTES} bytes."
+    assert results[0]['success'] and results[2]['success']
+
+
+def test_ndjson_batches_keep_line_numbers(monkeypatch, rows):
+    monkeypatch.setattr(sonar, 'STREAM_BATCH_SIZE', 2)
+    body = b''.join(json.dumps(row.tolist()).encode() + b'\n' for row in rows[:5])
+    results = read_ndjson(body)
+    assert [result['line'] for result in results] == [1, 2, 3, 4, 5]
+    assert all(result['success'] for result in results)
+
+
+# ------------------------------------------
+# CSV scorer
+# ------------------------------------------
+
+def test_csv_reader_flags_non_numeric_cells(tmp_path, rows):
+    lines = [','.join(f'band_{i}' for i in range(60)) + ',label']
+    lines += [','.join(map(str, row)) + ',R' for row in rows[:3]]
+    bad = [str(value) for value in rows[3]]
+    bad[5] = 'n/a'
+    lines.append(','.join(bad) + ',M')
+    path = tmp_path / 'returns.csv'
+    path.write_text('\n'.join(lines) + '\n')
+
+    values, labels = next(score_sonar_csv.iter_chunks(path, 100))
+    non_numeric = np.isnan(values).any(axis=1)
+    assert non_numeric.tolist() == [True, False, False, False, True]
+    assert np.array_equal(values[1:4], rows[:3])
+    assert labels.tolist() == ['LABEL', 'R', 'R', 'R', 'M']
+
+
+# ------------------------------------------
+# HTML form and pages
+# ------------------------------------------
+
+def test_paste_form_scores_rows_and_names_bad_bands(client, models, rows):
+    bad = [str(value) for value in rows[1]]
+    bad[7], bad[9] = 'x', 'n/a'
+    text = '\n'.join([
+        ','.join(map(str, rows[0])) + ',R',
+        ','.join(bad),
+        '\t'.join(map(str, rows[2])),
+    ])
+    response = client.post('/', data={'paste': text})
+    assert response.status_code == 200
+    page = response.get_data(as_text=True)
+
+    assert '3 Returns Analyzed' in page
+    assert '1 invalid' in page
+    assert 'Frequency bands [7, 9] have non-numeric values' in page
+    for mine in mine_percent(models['model'], rows[[0, 2]]):
+        assert f'>{mine:.1f}<' in page
+
+
+def test_static_pages_match_their_templates(client):
+    for path, template in (('/', 'sonar_form.html'), ('/about', 'sonar_about.html')):
+        response = client.get(path)
+        assert response.status_code == 200
+        with sonar.app.test_request_context(path):
+            expected = render_template(template, sonar_info=sonar.SONAR_INFO)
+        assert response.get_data(as_text=True) == expected
+        assert client.get(path, headers={'If-None-Match': response.headers['ETag']}).status_code == 304
+
+
+def test_risk_factor_cards_follow_a_reload(client, staged_models, rows):
+    form = {f'freq_{i}': str(value) for i, value in enumerate(rows[0])}
+
+    def rendered_cards():
+        return sonar.app.jinja_env.get_template('_risk_factor_cards.html').render(
+            risk_factors=sonar.build_risk_factors(sonar.MODELS['risk_factors']))
+
+    before = rendered_cards()
+    assert sonar.get_risk_factor_cards() == before
+    assert before in client.post('/', data=form).get_data(as_text=True)
+
+    retrain_risk_factors(staged_models)
+    assert reload_models(client).status_code == 200
+    after = rendered_cards()
+    assert after != before
+    assert sonar.get_risk_factor_cards() == after
+    assert after in client.post('/', data=form).get_data(as_text=True)
+
+
+# ------------------------------------------
+# Metrics
+# ------------------------------------------
+
+def metric_value(text, sample):
+    """Value of one sample in Prometheus text format (0 before its first observation)."""
+    for line in text.splitlines():
+        if line.startswith(sample + ' '):
+            return float(line.rsplit(' ', 1)[1])
+    return 0.0
+
+
+PREDICT_SAMPLES = (
+    'sonar_http_requests_total{route="/api/predict",method="POST",status="200"}',
+    'sonar_http_request_duration_seconds_count{route="/api/predict"}',
+)
+
+
+def test_metrics_count_flask_predictions(client, rows):
+    samples = PREDICT_SAMPLES + ('sonar_stage_duration_seconds_count{stage="trees"}',)
+    before = client.get('/metrics').get_data(as_text=True)
+    assert client.post('/api/predict', json={'frequency_values': rows[0].tolist()}).status_code == 200
+    after = client.get('/metrics').get_data(as_text=True)
+    for sample in samples:
+        assert metric_value(after, sample) == metric_value(before, sample) + 1
+
+
+def test_metrics_count_asgi_predictions(rows):
+    pytest.importorskip('starlette')
+    from starlette.testclient import TestClient
+    import asgi_sonar_predict
+
+    with TestClient(asgi_sonar_predict.app) as asgi_client:
+        before = asgi_client.get('/metrics').text
+        response = asgi_client.post('/api/predict', json={'frequency_values': rows[0].tolist()})
+        assert response.status_code == 200
+        after = asgi_client.get('/metrics').text
+    for sample in PREDICT_SAMPLES:
+        assert metric_value(after, sample) == metric_value(before, sample) + 1
+
+
+# ------------------------------------------
+# Benchmark
+# ------------------------------------------
+
+def test_benchmark_counts_new_errors_as_a_regression():
+    baseline = {'single': {'p50_ms': 1.0, 'p95_ms': 2.0, 'p99_ms': 3.0, 'rows_per_s': 1000, 'errors': 0}}
+    failing = {'single': {'p50_ms': 0.5, 'p95_ms': 1.0, 'p99_ms': 1.5, 'rows_per_s': 2000, 'errors': 12}}
+    assert benchmark_sonar.compare_to_baseline(failing, baseline, 0.2) == ['single.errors: 0 -> 12']
+    assert benchmark_sonar.compare_to_baseline(baseline, failing, 0.2) == [
+        'single.p50_ms: 0.500 -> 1.000 ms', 'single.p95_ms: 1.000 -> 2.000 ms', 'single.p99_ms: 1.500 -> 3.000 ms',
+        'single.rows_per_s: 2,000 -> 1,000'
+    ]
+    assert benchmark_sonar.compare_to_baseline(baseline, baseline, 0.2) == []
+
+
+# ------------------------------------------
+# Profiling and admin routes
+# ------------------------------------------
+
+def wait_for_profile(profiler, name, timeout=5):
+    """Profiles are written by a background thread; poll until this one is on disk."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        profile = profiler.read_profile(name)
+        if profile is not None:
+            return profile
+        time.sleep(0.01)
+    return None
+
+
+def test_admin_routes_need_the_token(client, monkeypatch):
+    monkeypatch.setattr(sonar, 'ADMIN_TOKEN', ADMIN_TOKEN)
+    for method, path in (('post', '/admin/reload?wait=1'), ('get', '/admin/profiles'),
+                         ('get', '/admin/profiles/1-1-api_predict-1ms.json')):
+        assert client.open(path, method=method.upper()).status_code == 403
+        assert client.open(path, method=method.upper(), headers={'X-Admin-Token': 'wrong'}).status_code == 403
+
+    # No token configured: the admin routes are closed to everyone
+    monkeypatch.setattr(sonar, 'ADMIN_TOKEN', None)
+    assert client.get('/admin/profiles', headers={'X-Admin-Token': ''}).status_code == 403
+
+
+def test_profiler_keeps_samples_of_a_slow_request(tmp_path):
+    profiler = SamplingProfiler(tmp_path, interval_ms=1)
+    token = profiler.start()
+    deadline = time.perf_counter() + 0.1
+    while time.perf_counter() < deadline:
+        pass
+    name = profiler.finish(token, 100.0, True, {'route': '/api/predict'})
+
+    profile = wait_for_profile(profiler, name)
+    assert profile['sample_count'] > 0
+    assert sum(profile['samples'].values()) == profile['sample_count']
+    assert any('test_profiler_keeps_samples_of_a_slow_request' in stack for stack in profile['samples'])
+    assert profiler.finish(profiler.start(), 1.0, False, {}) is None
+    assert profiler.list_profiles() == [name]
+
+
+def test_admin_can_force_a_profile(client, monkeypatch, tmp_path, rows):
+    monkeypatch.setattr(sonar, 'ADMIN_TOKEN', ADMIN_TOKEN)
+    monkeypatch.setattr(sonar, 'PROFILER', SamplingProfiler(tmp_path, interval_ms=1))
+    admin = {'X-Admin-Token': ADMIN_TOKEN}
+    body = {'frequency_values': rows[0].tolist()}
+
+    # Without the token the header is ignored (no threshold is set)
+    assert 'X-Sonar-Profile' not in client.post('/api/predict', json=body, headers={'X-Sonar-Profile': '1'}).headers
+
+    response = client.post('/api/predict', json=body, headers={**admin, 'X-Sonar-Profile': '1'})
+    assert response.status_code == 200
+    name = response.headers['X-Sonar-Profile']
+    assert wait_for_profile(sonar.PROFILER, name) is not None
+
+    assert client.get('/admin/profiles', headers=admin).get_json()['profiles'] == [name]
+    profile = client.get(f'/admin/profiles/{name}', headers=admin).get_json()
+    assert (profile['route'], profile['method'], profile['status']) == ('/api/predict', 'POST', 200)
+    assert profile['model_version'] == sonar.MODELS['version']
+    assert 'samples' in profile
+
+
+# ------------------------------------------
+# Band subset model
+# ------------------------------------------
+
+SUBSET_BANDS = list(range(0, 60, 5))
+
+
+@pytest.fixture(scope='module')
+def subset_models(tmp_path_factory):
+    """A bundle trained on every fifth band, loaded the way the app loads models/."""
+    X, y = train_sonar_models.load_dataset(sonar.DATA_PATH)
+    model, backup, risk_factors = select_sonar_bands.fit_subset_models(X, y, 'logistic_regression', SUBSET_BANDS)
+    directory = tmp_path_factory.mktemp('subset')
+    train_sonar_models.export_models(directory / 'models', model, backup, risk_factors, 'logistic_regression',
+                                     {'accuracy': 0.0, 'roc_auc': 0.0}, bands=SUBSET_BANDS)
+    with pytest.MonkeyPatch.context() as patch:
+        patch.setattr(sonar, 'SCRIPT_DIR', directory)
+        return sonar.load_models()
+
+
+@pytest.fixture
+def subset_client(client, monkeypatch, subset_models):
+    monkeypatch.setattr(sonar, 'MODELS', subset_models)
+    return client
+
+
+def test_subset_model_accepts_60_or_k_values(subset_client, subset_models, rows):
+    expected = mine_percent(subset_models['model'], rows[0, SUBSET_BANDS])[0]
+    for values in (rows[0], rows[0, SUBSET_BANDS]):
+        response = subset_client.post('/api/predict', json={'frequency_values': values.tolist()})
+        assert response.status_code == 200
+        assert response.get_json()['probabilities']['mine'] == pytest.approx(expected, abs=0.005)
+
+    response = subset_client.post('/api/predict', data=rows[0, SUBSET_BANDS].astype('<f8').tobytes(),
+                                  content_type='application/octet-stream',
+                                  headers={'X-Sonar-Dtype': 'float64', 'X-Sonar-Band-Count': str(len(SUBSET_BANDS))})
+    assert response.status_code == 200
+    _, mine = np.frombuffer(response.data, dtype='<f8')
+    assert mine == pytest.approx(expected, abs=1e-6)
+
+
+def test_subset_model_validates_unused_bands(subset_client, rows):
+    values = rows[0].copy()
+    values[1] = 1.5  # band 1 is not read by the model
+    response = subset_client.post('/api/predict', json={'frequency_values': values.tolist()})
+    assert response.status_code == 400
+    assert response.get_json()['error'].startswith('Frequency band 1 has invalid value 1.5')
+
+    matrix = [values.tolist(), rows[1].tolist(), rows[2, SUBSET_BANDS].tolist()]
+    results = subset_client.post('/api/predict/batch', json={'frequency_matrix': matrix}).get_json()['results']
+    assert [result['success'] for result in results] == [False, True, True]
+    assert results[0]['error'].startswith('Frequency band 1 has invalid value 1.5')
+
+
+def test_csv_scorer_checks_all_60_bands(monkeypatch, subset_models, rows):
+    monkeypatch.setattr(sonar, 'MODELS', subset_models)
+    values = rows[:4].copy()
+    values[1, 1] = np.nan  # unused bands: still non-numeric / out of range
+    values[2, 1] = 1.5
+    mine_probability, valid, non_numeric = score_sonar_csv.score_chunk(values, 'primary')
+
+    assert valid.tolist() == [True, False, False, True]
+    assert non_numeric.tolist() == [False, True, False, False]
+    assert np.isnan(mine_probability[[1, 2]]).all()
+    expected = mine_percent(subset_models['model'], rows[[0, 3]][:, SUBSET_BANDS]) / 100
+    assert mine_probability[[0, 3]] == pytest.approx(expected, abs=1e-6)
+
+
+# ------------------------------------------
+# Edge export
+# ------------------------------------------
+
+def test_edge_model_matches_pipeline(tmp_path, rows):
+    edge, pipeline, stats = export_edge_model.build_edge_model(sonar.SCRIPT_DIR / 'models')
+    edge.save(tmp_path / 'edge.npz')
+    loaded = export_edge_model.EdgeModel.load(tmp_path / 'edge.npz')
+
+    expected = pipeline.predict_proba(rows)[:, 1]
+    actual = loaded.predict_proba(rows)[:, 1]
+    assert np.abs(actual - expected).max() < 1e-4
+    assert ((actual > 0.5) == (expected > 0.5)).all()
+    assert stats['nodes'] == len(loaded.leaf)
+
+
+def test_edge_flatten_handles_all_zero_leaves():
+    tree = {'left_children': [1, -1, -1], 'right_children': [2, -1, -1],
+            'split_conditions': [0.0, 0.0, 0.0], 'split_indices': [3, 0, 0]}
+    arrays, leaf_scale, _, _ = export_edge_model.flatten_trees([tree], np.full(60, 0.5), np.full(60, 0.2), 16, 16)
+    assert leaf_scale == 1.0
+    assert not arrays['leaf'].any()
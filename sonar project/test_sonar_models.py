@@ -0,0 +1,88 @@
+"""
+Tests for the training scripts on sonar_data.csv, sized to run in seconds.
+
+Usage:
+    python -m pytest -q
+"""
+
+import numpy as np
+import pytest
+
+import distill_sonar_model
+import train_sonar_models
+import tune_sonar_models
+from sonar_fold_cache import FoldCache
+
+
+@pytest.fixture(scope='module')
+def dataset():
+    return train_sonar_models.load_dataset()
+
+
+# ------------------------------------------
+# Model comparison
+# ------------------------------------------
+
+def test_fold_cache_file_is_reused(tmp_path, monkeypatch, dataset):
+    X, y = dataset
+    first = train_sonar_models.make_fold_cache(X, y, tmp_path)
+    assert first.path.exists()
+    other_split = FoldCache(X, y, n_splits=3, mmap_dir=tmp_path)
+    assert other_split.path != first.path
+
+    def rebuild(self, out=None):
+        raise AssertionError("scaled folds were rebuilt instead of memory-mapped")
+
+    monkeypatch.setattr(FoldCache, '_scale_folds', rebuild)
+    second = train_sonar_models.make_fold_cache(X, y, tmp_path)
+    assert second.path == first.path
+    assert np.array_equal(second.scaled, first.scaled)
+
+    oof, _ = train_sonar_models.run_cross_validation(second, ['naive_bayes'], n_jobs=1)
+    assert oof['naive_bayes'].shape == y.shape
+    assert ((oof['naive_bayes'] >= 0) & (oof['naive_bayes'] <= 1)).all()
+
+
+# ------------------------------------------
+# Hyperparameter search
+# ------------------------------------------
+
+def test_tuning_resumes_from_checkpoint(tmp_path, dataset):
+    X, y = dataset
+    cache = train_sonar_models.make_fold_cache(X, y)
+    signature = tune_sonar_models.data_signature(train_sonar_models.DATA_PATH)
+    path = tmp_path / 'trials.jsonl'
+    configs = [('logistic_regression', {'C': 0.1}), ('naive_bayes', {})]
+
+    first = tune_sonar_models.TrialRunner(cache, tune_sonar_models.TrialCheckpoint(path, signature), n_jobs=1)
+    results = first.evaluate(configs, 1.0)
+    assert first.fits == len(configs) * train_sonar_models.N_SPLITS
+
+    resumed = tune_sonar_models.TrialRunner(cache, tune_sonar_models.TrialCheckpoint(path, signature), n_jobs=1)
+    assert resumed.evaluate(configs, 1.0) == results
+    assert resumed.fits == 0
+
+    # Written for other settings: moved aside, and every fit runs again
+    changed = {**signature, 'early_stopping_rounds': signature['early_stopping_rounds'] + 1}
+    fresh = tune_sonar_models.TrialRunner(cache, tune_sonar_models.TrialCheckpoint(path, changed), n_jobs=1)
+    fresh.evaluate(configs[:1], 1.0)
+    assert fresh.fits == train_sonar_models.N_SPLITS
+    assert path.with_name(path.name + '.stale').exists()
+
+
+# ------------------------------------------
+# Distillation
+# ------------------------------------------
+
+# Largest mean |student - teacher| mine probability accepted on the training rows
+STUDENT_TOLERANCE = 0.1
+
+
+def test_distilled_student_tracks_the_teacher(dataset):
+    X, y = dataset
+    teacher, students, _, _ = distill_sonar_model.fit_final(X, y, ['xgboost_depth2'], n_jobs=1)
+    teacher_mine = teacher.predict_proba(X)[:, 1]
+    student_mine = students['xgboost_depth2'].predict_proba(X)[:, 1]
+
+    assert np.abs(student_mine - teacher_mine).mean() <= STUDENT_TOLERANCE
+    assert ((student_mine > 0.5) == (teacher_mine > 0.5)).mean() >= 0.95
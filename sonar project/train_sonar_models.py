@@ -0,0 +1,384 @@
+"""
+Parallel model comparison and export for SONAR Rock vs Mine.
+
+Replaces the cell-by-cell training in ADDITIONAL_MODELS_CODE.py, where
+every candidate was fitted once on a train split and five more times by
+cross_validate, refitting the StandardScaler in each fold. Here:
+
+- sonar_data.csv is loaded once into a FoldCache (sonar_fold_cache.py):
+  the notebooks' StratifiedKFold(n_splits=5, shuffle=True, random_state=42)
+  folds, with the StandardScaler fitted once per fold and the scaled fold
+  matrices shared by every candidate
+- all candidate x fold fits run in parallel across cores (joblib)
+- the comparison table is computed from the out-of-fold (OOF) predictions,
+  fold by fold, so it matches cross_validate on the same folds (labels use
+  the app's 0.5 probability threshold, so the SVM's Platt-scaled accuracy
+  can differ slightly from SVC.predict)
+- the soft-voting ensemble is scored by averaging its members' OOF
+  probabilities, with no extra fits
+- only the winner (and the logistic-regression backup) is refitted on all
+  rows and written in the format load_models() expects, to staging/ unless
+  --deploy writes it into the served models/ folder
+
+Usage:
+    python train_sonar_models.py
+    python train_sonar_models.py --deploy   # write into models/ (a running app hot-swaps it in)
+    python train_sonar_models.py --jobs 4 --candidates xgboost svm random_forest
+    python train_sonar_models.py --output-dir /tmp/candidate_models --report comparison.json
+    python train_sonar_models.py --cache-dir fold_cache   # memory-map the scaled folds
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from pathlib import Path
+
+import joblib
+import numpy as np
+import pandas as pd
+from joblib import Parallel, delayed
+from sklearn.ensemble import RandomForestClassifier, VotingClassifier
+from sklearn.linear_model import LogisticRegression
+from sklearn.metrics import accuracy_score, f1_score, precision_score, recall_score, roc_auc_score
+from sklearn.naive_bayes import GaussianNB
+from sklearn.neighbors import KNeighborsClassifier
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import LabelEncoder, StandardScaler
+from sklearn.svm import SVC
+from sklearn.utils import Bunch
+from xgboost import XGBClassifier
+
+from sonar_fold_cache import FoldCache
+
+
+SCRIPT_DIR = Path(__file__).resolve().parent
+DATA_PATH = SCRIPT_DIR.parent / 'sonar_data' / 'sonar_data.csv'
+MODELS_DIR = SCRIPT_DIR / 'models'
+# Exports land here unless --deploy: the app's watcher hot-swaps whatever appears in models/
+STAGING_DIR = SCRIPT_DIR / 'staging'
+
+N_BANDS = 60
+N_SPLITS = 5
+RANDOM_STATE = 42
+
+# Risk factors stored with the model (top_risk_factors.pkl / feature_info.pkl)
+N_RISK_FACTORS = 10
+
+
+def _lightgbm():
+    from lightgbm import LGBMClassifier
+    return LGBMClassifier(n_estimators=200, max_depth=5, learning_rate=0.1, num_leaves=31,
+                          random_state=RANDOM_STATE, verbose=-1, n_jobs=1)
+
+
+# Candidate name -> factory for a fresh, unfitted classifier. Settings follow
+# ADDITIONAL_MODELS_CODE.py and SONAR_03.ipynb; each fit is single-threaded
+# because the parallelism is across candidate x fold jobs.
+CANDIDATES = {
+    'logistic_regression': lambda: LogisticRegression(max_iter=10000, random_state=RANDOM_STATE),
+    'random_forest': lambda: RandomForestClassifier(n_estimators=200, max_depth=10, min_samples_split=5,
+                                                    min_samples_leaf=2, random_state=RANDOM_STATE, n_jobs=1),
+    'svm': lambda: SVC(kernel='rbf', C=1.0, gamma='scale', probability=True, random_state=RANDOM_STATE),
+    'lightgbm': _lightgbm,
+    'knn': lambda: KNeighborsClassifier(n_neighbors=5, weights='distance', metric='euclidean'),
+    'naive_bayes': lambda: GaussianNB(),
+    'xgboost': lambda: XGBClassifier(n_estimators=200, max_depth=5, learning_rate=0.1, eval_metric='logloss',
+                                     random_state=RANDOM_STATE, n_jobs=1),
+}
+
+# Members of the soft-voting ensemble (the ADDITIONAL_MODELS_CODE.py ensemble cell)
+ENSEMBLE_MEMBERS = ('xgboost', 'random_forest', 'svm', 'logistic_regression')
+ENSEMBLE_NAME = 'soft_voting'
+
+# Candidates with feature_importances_ (source of the exported risk factors)
+TREE_MODELS = {'xgboost', 'random_forest', 'lightgbm'}
+
+# Always refitted and exported as logistic_regression_model.pkl (the app's backup / fast tier)
+BACKUP_MODEL = 'logistic_regression'
+
+
+def available_candidates(names=None):
+    """Candidate names to train, skipping optional libraries that are not installed."""
+    selected = []
+    for name in names or CANDIDATES:
+        if name not in CANDIDATES:
+            raise ValueError(f"Unknown candidate '{name}'. Choose from: {', '.join(CANDIDATES)}")
+        try:
+            CANDIDATES[name]()
+        except ImportError:
+            print(f"⚠️  Skipping {name}: library not installed")
+            continue
+        selected.append(name)
+    return selected
+
+
+def load_dataset(path=DATA_PATH):
+    """
+    Load sonar_data.csv.
+
+    Returns:
+        tuple: ((N x 60) float64 band values, N int labels with Mine = 1)
+    """
+    data = pd.read_csv(path, header=None)
+    X = data.iloc[:, :N_BANDS].to_numpy(dtype=np.float64)
+    y = (data.iloc[:, N_BANDS].astype(str).str.strip().str.upper() == 'M').astype(int).to_numpy()
+    return X, y
+
+
+def make_fold_cache(X, y, mmap_dir=None):
+    """FoldCache of the notebooks' StratifiedKFold(5, shuffle=True, random_state=42) splits."""
+    return FoldCache(X, y, n_splits=N_SPLITS, random_state=RANDOM_STATE, mmap_dir=mmap_dir)
+
+
+def run_cross_validation(cache, names, n_jobs=-1):
+    """
+    Fit every candidate on every cached fold in parallel.
+
+    Returns:
+        tuple: (dict name -> N out-of-fold mine probabilities,
+                dict name -> total fit seconds)
+    """
+    return cache.out_of_fold({name: CANDIDATES[name] for name in names}, n_jobs)
+
+
+def score_oof(y, mine_probability, folds):
+    """
+    Per-fold metrics of out-of-fold predictions, like cross_validate reports.
+
+    Returns:
+        dict: '<metric>' mean and '<metric>_std' for accuracy, precision, recall, f1 and roc_auc
+    """
+    per_fold = {'accuracy': [], 'precision': [], 'recall': [], 'f1': [], 'roc_auc': []}
+    for _, test_idx in folds:
+        truth = y[test_idx]
+        probability = mine_probability[test_idx]
+        predicted = (probability > 0.5).astype(int)
+        per_fold['accuracy'].append(accuracy_score(truth, predicted))
+        per_fold['precision'].append(precision_score(truth, predicted, zero_division=0))
+        per_fold['recall'].append(recall_score(truth, predicted))
+        per_fold['f1'].append(f1_score(truth, predicted))
+        per_fold['roc_auc'].append(roc_auc_score(truth, probability))
+
+    scores = {}
+    for metric, values in per_fold.items():
+        scores[metric] = float(np.mean(values))
+        scores[f'{metric}_std'] = float(np.std(values))
+    return scores
+
+
+def compare_models(y, folds, oof, fit_seconds):
+    """
+    Comparison table of all candidates plus the soft-voting ensemble.
+
+    Returns:
+        DataFrame: One row per model, sorted by accuracy then ROC-AUC
+    """
+    oof = dict(oof)
+    members = [name for name in ENSEMBLE_MEMBERS if name in oof]
+    if len(members) > 1:
+        # Soft voting = mean of the members' probabilities; reuses their OOF fits
+        oof[ENSEMBLE_NAME] = np.mean([oof[name] for name in members], axis=0)
+        fit_seconds = {**fit_seconds, ENSEMBLE_NAME: sum(fit_seconds[name] for name in members)}
+
+    rows = []
+    for name, probabilities in oof.items():
+        rows.append({'model': name, **score_oof(y, probabilities, folds), 'fit_seconds': fit_seconds[name]})
+
+    table = pd.DataFrame(rows).sort_values(['accuracy', 'roc_auc'], ascending=False)
+    return table.reset_index(drop=True), oof
+
+
+def assemble_voting_classifier(members):
+    """
+    Build a fitted soft VotingClassifier from already fitted members.
+
+    Sets the attributes VotingClassifier.fit would set, so the exported
+    pipeline is a plain sklearn object without fitting the members twice.
+
+    Args:
+        members (dict): Name -> fitted binary classifier
+
+    Returns:
+        VotingClassifier: Ready for predict / predict_proba
+    """
+    ensemble = VotingClassifier(estimators=[(name, CANDIDATES[name]()) for name in members], voting='soft')
+    ensemble.estimators_ = list(members.values())
+    ensemble.named_estimators_ = Bunch(**members)
+    ensemble.le_ = LabelEncoder().fit([0, 1])
+    ensemble.classes_ = ensemble.le_.classes_
+    return ensemble
+
+
+def _fit_full(name, X_scaled, y):
+    return name, CANDIDATES[name]().fit(X_scaled, y)
+
+
+def refit_on_all_rows(X, y, names, n_jobs=-1):
+    """
+    Fit the scaler and the named candidates on every row, in parallel.
+
+    Returns:
+        tuple: (fitted StandardScaler, dict name -> fitted classifier)
+    """
+    scaler = StandardScaler().fit(X)
+    X_scaled = scaler.transform(X)
+    fitted = Parallel(n_jobs=n_jobs)(delayed(_fit_full)(name, X_scaled, y) for name in names)
+    return scaler, dict(fitted)
+
+
+def risk_factors_from(classifiers, bands=None):
+    """
+    Top bands by feature importance, taken from the first tree model available.
+
+    Args:
+        classifiers (list): Fitted classifiers to try in order
+        bands (list): Band number of each input column (None for all 60)
+
+    Returns:
+        Series: Importance indexed by band number, largest first (top N_RISK_FACTORS)
+    """
+    for classifier in classifiers:
+        importances = getattr(classifier, 'feature_importances_', None)
+        if importances is not None:
+            index = range(N_BANDS) if bands is None else bands
+            series = pd.Series(np.asarray(importances, dtype=np.float32), index=index)
+            return series.sort_values(ascending=False).head(N_RISK_FACTORS)
+    raise ValueError("No fitted model with feature_importances_ to derive risk factors from")
+
+
+def _dump_atomic(obj, path):
+    """Write an artifact via a temp file so the app's model watcher never sees a partial file."""
+    tmp_path = path.with_name(path.name + '.tmp')
+    joblib.dump(obj, tmp_path)
+    os.replace(tmp_path, path)
+
+
+def export_models(output_dir, model, backup_model, risk_factors, model_name, scores, params=None, bands=None):
+    """
+    Write the four artifacts load_models() reads.
+
+    Args:
+        output_dir (Path): Target folder (see output_dir_from)
+        model (Pipeline): Winning scaler + classifier pipeline
+        backup_model (Pipeline): Scaler + logistic regression pipeline
+        risk_factors (Series): Top band importances
+        model_name (str): Winning candidate name
+        scores (dict): Its cross-validated metrics
+        params (dict): Tuned hyperparameters, recorded in feature_info.pkl
+        bands (list): Bands a subset model reads, in column order (None for all 60)
+    """
+    output_dir.mkdir(parents=True, exist_ok=True)
+    columns = list(range(N_BANDS)) if bands is None else [int(band) for band in bands]
+    feature_info = {
+        'n_features': len(columns),
+        'feature_names': [f'Frequency_Band_{i}' for i in columns],
+        'top_risk_factors': {int(band): float(value) for band, value in risk_factors.items()},
+        'best_accuracy': scores['accuracy'],
+        'best_roc_auc': scores['roc_auc'],
+        'model_name': model_name
+    }
+    if params:
+        feature_info['model_params'] = params
+    if bands is not None:
+        feature_info['selected_bands'] = columns
+    # The model file is replaced last: the app reloads when its signature changes
+    _dump_atomic(backup_model, output_dir / 'logistic_regression_model.pkl')
+    _dump_atomic(feature_info, output_dir / 'feature_info.pkl')
+    _dump_atomic(risk_factors, output_dir / 'top_risk_factors.pkl')
+    _dump_atomic(model, output_dir / 'best_sonar_model.pkl')
+
+
+def add_output_arguments(parser):
+    """--output-dir / --deploy options shared by the exporting scripts."""
+    target = parser.add_mutually_exclusive_group()
+    target.add_argument('--output-dir', default=str(STAGING_DIR),
+                        help="Where to write the artifacts (default: staging/)")
+    target.add_argument('--deploy', action='store_true',
+                        help="Write into the served models/ folder, which a running app hot-swaps in")
+
+
+def output_dir_from(args):
+    """Export folder chosen by add_output_arguments()."""
+    return MODELS_DIR if args.deploy else Path(args.output_dir)
+
+
+def print_deploy_hint(output_dir):
+    """Remind that a staged export is not served yet."""
+    if output_dir.resolve() != MODELS_DIR.resolve():
+        print(f"   Not served yet: check it, then rerun with --deploy or copy the four .pkl files into {MODELS_DIR}")
+
+
+def build_winner(X, y, winner, n_jobs=-1):
+    """
+    Refit the winner (and what the export needs) on all rows.
+
+    Returns:
+        tuple: (winner pipeline, backup pipeline, risk factors Series)
+    """
+    members = list(ENSEMBLE_MEMBERS) if winner == ENSEMBLE_NAME else [winner]
+    needed = list(dict.fromkeys(members + [BACKUP_MODEL]))
+    if not TREE_MODELS.intersection(members):
+        needed.append('xgboost')  # risk factors come from a tree model
+
+    scaler, fitted = refit_on_all_rows(X, y, needed, n_jobs)
+
+    if winner == ENSEMBLE_NAME:
+        classifier = assemble_voting_classifier({name: fitted[name] for name in members})
+    else:
+        classifier = fitted[winner]
+    model = Pipeline([('scaler', scaler), ('clf', classifier)])
+    backup_model = Pipeline([('scaler', scaler), ('clf', fitted[BACKUP_MODEL])])
+
+    return model, backup_model, risk_factors_from([fitted[name] for name in needed])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare SONAR models with cross-validation and export the best.")
+    parser.add_argument('--data', default=str(DATA_PATH), help="Training CSV (sonar_data.csv layout)")
+    parser.add_argument('--candidates', nargs='+', choices=list(CANDIDATES), help="Subset of candidates")
+    parser.add_argument('--jobs', type=int, default=-1, help="Parallel jobs (default: all cores)")
+    add_output_arguments(parser)
+    parser.add_argument('--no-export', action='store_true', help="Only print the comparison")
+    parser.add_argument('--cache-dir', help="Memory-map the scaled folds from this folder")
+    parser.add_argument('--report', help="Also write the comparison table as JSON")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    X, y = load_dataset(args.data)
+    names = available_candidates(args.candidates)
+    cache = make_fold_cache(X, y, args.cache_dir)
+    print(f"📂 {len(y)} returns, {len(names)} candidates x {N_SPLITS} folds = {len(names) * N_SPLITS} fits")
+
+    oof, fit_seconds = run_cross_validation(cache, names, args.jobs)
+    table, _ = compare_models(y, cache.folds, oof, fit_seconds)
+
+    print("\n" + "=" * 70)
+    print("MODEL COMPARISON (5-fold CV, out-of-fold)")
+    print("=" * 70)
+    print(table[['model', 'accuracy', 'accuracy_std', 'precision', 'recall', 'f1', 'roc_auc', 'fit_seconds']]
+          .to_string(index=False, float_format=lambda value: f"{value:.4f}"))
+
+    winner = table.iloc[0]
+    print(f"\n🎯 Best model: {winner['model']} (accuracy {winner['accuracy']:.4f}, ROC-AUC {winner['roc_auc']:.4f})")
+    print(f"⏱️  Cross-validation finished in {time.perf_counter() - start:.1f}s")
+
+    if args.report:
+        with open(args.report, 'w') as f:
+            json.dump({'folds': N_SPLITS, 'results': table.to_dict(orient='records')}, f, indent=2)
+        print(f"💾 Comparison saved to {args.report}")
+
+    if args.no_export:
+        return 0
+
+    model, backup_model, risk_factors = build_winner(X, y, winner['model'], args.jobs)
+    output_dir = output_dir_from(args)
+    export_models(output_dir, model, backup_model, risk_factors, winner['model'], winner.to_dict())
+    print(f"✅ Exported {winner['model']} to {output_dir} in {time.perf_counter() - start:.1f}s total")
+    print_deploy_hint(output_dir)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,479 @@
+"""
+Hyperparameter search for SONAR Rock vs Mine with Hyperband / successive halving.
+
+Searches the candidate models of train_sonar_models.py (the models in
+ADDITIONAL_MODELS_CODE.py) instead of the hand-picked settings of the
+notebooks:
+
+- every trial is a (model, sampled hyperparameters) configuration, scored
+  by 5-fold cross-validation on the notebooks' folds, scaled once per fold
+  by a FoldCache (sonar_fold_cache.py)
+- successive halving scores many configurations on a small budget and keeps
+  the best 1/eta at each rung, on eta times the budget; Hyperband runs
+  several such brackets, from many cheap trials to a few full ones
+- the budget is the number of boosting rounds (xgboost, lightgbm) or trees
+  (random_forest). Boosted trials hold out a stratified slice of the
+  fold's training rows and stop early once its log loss stops improving;
+  the fold's validation rows are only used to score the trial. The other
+  models are cheap, so they always train on the full fold and are scored
+  once per configuration
+- trials are ranked by mean validation log loss, which separates
+  configurations where 40-row fold accuracies tie
+- all trial x fold fits of a rung run in parallel across cores (joblib)
+- every finished fold is appended to a JSON-lines checkpoint. Rerunning the
+  same command resumes an interrupted search and skips finished fits
+- the best full-budget trial is refitted on all rows and exported in the
+  format load_models() expects, to staging/ unless --deploy
+
+Usage:
+    python tune_sonar_models.py
+    python tune_sonar_models.py --candidates xgboost --method halving --n-configs 81
+    python tune_sonar_models.py --no-export --report tuning.json
+"""
+
+import argparse
+import hashlib
+import json
+import math
+import os
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+from joblib import Parallel, delayed
+from scipy.stats import loguniform, randint, uniform
+from sklearn.metrics import log_loss
+from sklearn.model_selection import ParameterSampler, train_test_split
+from sklearn.pipeline import Pipeline
+
+from train_sonar_models import (
+    BACKUP_MODEL, CANDIDATES, DATA_PATH, N_SPLITS, RANDOM_STATE, SCRIPT_DIR, add_output_arguments,
+    available_candidates, export_models, load_dataset, make_fold_cache, output_dir_from, print_deploy_hint,
+    refit_on_all_rows,
+    risk_factors_from, score_oof
+)
+
+
+TUNING_DIR = SCRIPT_DIR / 'tuning'
+
+# Sampled hyperparameters per candidate (lists are choices, scipy
+# distributions are sampled), applied on top of the CANDIDATES defaults
+SEARCH_SPACES = {
+    'xgboost': {
+        'max_depth': randint(2, 9),
+        'learning_rate': loguniform(0.01, 0.3),
+        'subsample': uniform(0.5, 0.5),
+        'colsample_bytree': uniform(0.3, 0.7),
+        'min_child_weight': loguniform(0.5, 10),
+        'reg_lambda': loguniform(0.1, 10),
+    },
+    'lightgbm': {
+        'num_leaves': randint(4, 64),
+        'learning_rate': loguniform(0.01, 0.3),
+        'subsample': uniform(0.5, 0.5),
+        'subsample_freq': [1],
+        'colsample_bytree': uniform(0.3, 0.7),
+        'min_child_samples': randint(5, 31),
+    },
+    'random_forest': {
+        'max_depth': [None, 5, 8, 10, 15, 20],
+        'max_features': ['sqrt', 'log2', 0.3, 0.5],
+        'min_samples_split': randint(2, 11),
+        'min_samples_leaf': randint(1, 6),
+    },
+    'svm': {
+        'C': loguniform(0.1, 100),
+        'gamma': loguniform(1e-4, 1),
+    },
+    'logistic_regression': {
+        'C': loguniform(1e-3, 100),
+    },
+    'knn': {
+        'n_neighbors': randint(1, 26),
+        'weights': ['uniform', 'distance'],
+        'metric': ['euclidean', 'manhattan'],
+    },
+    'naive_bayes': {
+        'var_smoothing': loguniform(1e-12, 1e-3),
+    },
+}
+
+# Budget parameter and its full-budget value; other candidates have no budget
+BUDGETS = {
+    'xgboost': ('n_estimators', 1000),
+    'lightgbm': ('n_estimators', 1000),
+    'random_forest': ('n_estimators', 500),
+}
+
+# Candidates that stop early, on a slice of the fold's training rows
+EARLY_STOPPING = {'xgboost', 'lightgbm'}
+EARLY_STOPPING_ROUNDS = 30
+EARLY_STOPPING_FRACTION = 0.2
+
+ETA = 3
+MIN_BUDGET_FRACTION = 1 / 27  # smallest rung: 37 boosting rounds, 19 trees
+
+
+def _plain(value):
+    """numpy scalars -> Python values, so parameters round-trip through JSON."""
+    return value.item() if isinstance(value, np.generic) else value
+
+
+def sample_configs(names, n_configs, seed):
+    """
+    Draw configurations for one bracket.
+
+    The draw depends only on the seed, so a resumed search samples the same
+    trials and finds them in the checkpoint.
+
+    Returns:
+        list: (model name, params dict) pairs
+    """
+    rng = np.random.default_rng(seed)
+    configs = []
+    for _ in range(n_configs):
+        name = names[rng.integers(len(names))]
+        sampler = ParameterSampler(SEARCH_SPACES[name], n_iter=1, random_state=int(rng.integers(2 ** 31)))
+        params = {key: _plain(value) for key, value in next(iter(sampler)).items()}
+        configs.append((name, params))
+    return configs
+
+
+def budget_value(name, fraction):
+    """Budget parameter value of a candidate at a fraction of its full budget (None if it has none)."""
+    if name not in BUDGETS:
+        return None
+    _, full = BUDGETS[name]
+    return max(1, round(full * fraction))
+
+
+def make_classifier(name, params, budget):
+    """Fresh classifier of a candidate with the given params and budget."""
+    classifier = CANDIDATES[name]().set_params(**params)
+    if budget is not None:
+        classifier.set_params(**{BUDGETS[name][0]: budget})
+    return classifier
+
+
+def trial_key(name, params, budget):
+    return json.dumps([name, params, budget], sort_keys=True)
+
+
+def _fit_fold(name, params, budget, X_train, y_train, X_val, y_val):
+    """
+    One trial x fold job.
+
+    Early-stopped candidates watch a stratified slice of the training rows,
+    never (X_val, y_val): stopping on the rows a trial is scored on would
+    leak their labels into the round count and flatter the log loss.
+
+    Returns:
+        tuple: (validation mine probabilities, boosting rounds used or None, fit seconds)
+    """
+    start = time.perf_counter()
+    classifier = make_classifier(name, params, budget)
+    rounds = None
+    if name in EARLY_STOPPING:
+        X_train, X_stop, y_train, y_stop = train_test_split(
+            X_train, y_train, test_size=EARLY_STOPPING_FRACTION, stratify=y_train, random_state=RANDOM_STATE
+        )
+    if name == 'xgboost':
+        classifier.set_params(early_stopping_rounds=EARLY_STOPPING_ROUNDS)
+        classifier.fit(X_train, y_train, eval_set=[(X_stop, y_stop)], verbose=False)
+        rounds = classifier.best_iteration + 1
+    elif name == 'lightgbm':
+        from lightgbm import early_stopping
+        classifier.fit(X_train, y_train, eval_set=[(X_stop, y_stop)],
+                       callbacks=[early_stopping(EARLY_STOPPING_ROUNDS, verbose=False)])
+        rounds = classifier.best_iteration_ or budget
+    else:
+        classifier.fit(X_train, y_train)
+    # Early-stopped models predict with their best iteration
+    probabilities = classifier.predict_proba(X_val)[:, 1]
+    return probabilities.tolist(), rounds, time.perf_counter() - start
+
+
+def data_signature(path):
+    """Identifies the data and folds a checkpoint belongs to."""
+    digest = hashlib.sha256(Path(path).read_bytes()).hexdigest()
+    return {'data_sha256': digest, 'n_splits': N_SPLITS, 'random_state': RANDOM_STATE,
+            'features': 'float32', 'early_stopping_rounds': EARLY_STOPPING_ROUNDS,
+            'early_stopping_fraction': EARLY_STOPPING_FRACTION}
+
+
+class TrialCheckpoint:
+    """
+    Append-only JSON-lines record of finished trial folds.
+
+    The first line holds the data signature; each further line is one
+    trial x fold result. Loading it back lets a search skip every fit it
+    already finished. A file written for other data or settings is moved
+    aside to <name>.stale and the search starts fresh.
+    """
+
+    def __init__(self, path, signature):
+        """
+        Args:
+            path (Path): Checkpoint file, or None to keep results in memory only
+            signature (dict): data_signature() of the current run
+        """
+        self.path = path
+        self.folds = {}  # (trial key, fold) -> fold result
+        if path is None:
+            return
+        if path.exists() and self._read_signature(path) != signature:
+            stale = path.with_name(path.name + '.stale')
+            path.replace(stale)
+            print(f"⚠️  Checkpoint {path} was written for other data or settings; "
+                  f"moved it to {stale} and starting fresh")
+        if path.exists():
+            with open(path) as f:
+                f.readline()
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue  # torn line of an interrupted run
+                    self.folds[(entry['key'], entry['fold'])] = entry
+            print(f"♻️  Resuming from {path}: {len(self.folds)} trial folds already done")
+        else:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            with open(path, 'w') as f:
+                f.write(json.dumps(signature) + '\n')
+
+    @staticmethod
+    def _read_signature(path):
+        """Signature line of an existing checkpoint (None if unreadable)."""
+        with open(path) as f:
+            try:
+                return json.loads(f.readline())
+            except ValueError:
+                return None
+
+    def get(self, key, fold):
+        return self.folds.get((key, fold))
+
+    def add(self, entry):
+        self.folds[(entry['key'], entry['fold'])] = entry
+        if self.path is not None:
+            with open(self.path, 'a') as f:
+                f.write(json.dumps(entry) + '\n')
+                f.flush()
+                os.fsync(f.fileno())
+
+
+class TrialRunner:
+    """Scores configurations at a budget with cross-validation, through the checkpoint."""
+
+    def __init__(self, cache, checkpoint, n_jobs=-1):
+        self.cache = cache
+        self.y = cache.y
+        self.folds = cache.folds
+        self.checkpoint = checkpoint
+        self.n_jobs = n_jobs
+        self.fits = 0
+
+    def evaluate(self, configs, fraction):
+        """
+        Cross-validate every configuration at a budget fraction.
+
+        Returns:
+            list: One result dict per configuration (model, params, budget,
+                  log_loss, accuracy, roc_auc, ..., rounds per fold)
+        """
+        trials = [(name, params, budget_value(name, fraction)) for name, params in configs]
+        pending = {}  # (key, fold) -> job; budget-less trials repeat across rungs
+        for name, params, budget in trials:
+            key = trial_key(name, params, budget)
+            for fold in range(N_SPLITS):
+                if self.checkpoint.get(key, fold) is None:
+                    pending[(key, fold)] = (name, params, budget)
+        pending = [(key, *job, fold) for (key, fold), job in pending.items()]
+
+        if pending:
+            outputs = Parallel(n_jobs=self.n_jobs, return_as='generator')(
+                delayed(_fit_fold)(name, params, budget, *self.cache.fold(fold))
+                for _, name, params, budget, fold in pending
+            )
+            # Checkpointed as each fold finishes, so an interrupt loses at most the running fits
+            for (key, _, _, _, fold), (probabilities, rounds, seconds) in zip(pending, outputs):
+                self.checkpoint.add({'key': key, 'fold': fold, 'probabilities': probabilities,
+                                     'rounds': rounds, 'seconds': seconds})
+            self.fits += len(pending)
+
+        return [self._result(name, params, budget) for name, params, budget in trials]
+
+    def _result(self, name, params, budget):
+        key = trial_key(name, params, budget)
+        entries = [self.checkpoint.get(key, fold) for fold in range(N_SPLITS)]
+        oof = np.empty(len(self.y))
+        losses = []
+        for (_, test_idx), entry in zip(self.folds, entries):
+            oof[test_idx] = entry['probabilities']
+            losses.append(log_loss(self.y[test_idx], entry['probabilities'], labels=[0, 1]))
+        return {
+            'model': name,
+            'params': params,
+            'budget': budget,
+            'log_loss': float(np.mean(losses)),
+            **score_oof(self.y, oof, self.folds),
+            'rounds': [entry['rounds'] for entry in entries],
+            'fit_seconds': sum(entry['seconds'] for entry in entries)
+        }
+
+
+def successive_halving(runner, configs, fractions, eta=ETA):
+    """
+    Score configs at each budget fraction and keep the best 1/eta for the next.
+
+    Returns:
+        list: Results of every rung, in order
+    """
+    results = []
+    for rung, fraction in enumerate(fractions):
+        scored = sorted(runner.evaluate(configs, fraction), key=lambda result: result['log_loss'])
+        for result in scored:
+            result['rung'] = rung
+        results.extend(scored)
+        best = scored[0]
+        print(f"   rung {rung}: {len(configs):3d} trials at {fraction:.3f} budget, "
+              f"best log loss {best['log_loss']:.4f} ({best['model']})")
+        configs = [(result['model'], result['params']) for result in scored[:max(1, len(scored) // eta)]]
+    return results
+
+
+def hyperband(runner, names, seed, eta=ETA, min_fraction=MIN_BUDGET_FRACTION):
+    """
+    Run the Hyperband brackets, from many cheap trials to a few full-budget ones.
+
+    Returns:
+        list: Results of every bracket and rung
+    """
+    s_max = round(math.log(1 / min_fraction, eta))
+    results = []
+    for s in range(s_max, -1, -1):
+        n_configs = math.ceil((s_max + 1) / (s + 1) * eta ** s)
+        fractions = [eta ** (rung - s) for rung in range(s + 1)]
+        print(f"🎲 Bracket {s_max - s + 1}/{s_max + 1}: {n_configs} trials from {fractions[0]:.3f} budget")
+        configs = sample_configs(names, n_configs, [seed, s])
+        for result in successive_halving(runner, configs, fractions, eta):
+            results.append({**result, 'bracket': s})
+    return results
+
+
+def halving(runner, names, seed, n_configs, eta=ETA, min_fraction=MIN_BUDGET_FRACTION):
+    """Single successive-halving bracket over n_configs trials."""
+    n_rungs = round(math.log(1 / min_fraction, eta)) + 1
+    fractions = [eta ** (rung - n_rungs + 1) for rung in range(n_rungs)]
+    print(f"🎲 Successive halving: {n_configs} trials from {fractions[0]:.3f} budget")
+    configs = sample_configs(names, n_configs, [seed, n_rungs])
+    return [{**result, 'bracket': 0} for result in successive_halving(runner, configs, fractions, eta)]
+
+
+def is_full_budget(result):
+    return result['budget'] is None or result['budget'] == BUDGETS[result['model']][1]
+
+
+def best_full_budget(results):
+    """Lowest-log-loss trial scored at full budget (or with no budget)."""
+    return min(filter(is_full_budget, results), key=lambda result: result['log_loss'])
+
+
+def build_tuned_model(X, y, best, n_jobs=-1):
+    """
+    Refit the best trial on all rows.
+
+    Early-stopped models have no validation set here, so they are trained
+    for the median number of rounds they stopped at across folds.
+
+    Returns:
+        tuple: (tuned pipeline, backup pipeline, risk factors Series, exported params)
+    """
+    name = best['model']
+    budget = best['budget']
+    if name in EARLY_STOPPING:
+        budget = int(np.median(best['rounds']))
+    needed = [BACKUP_MODEL] + ([] if name in BUDGETS else ['xgboost'])  # xgboost for risk factors
+    scaler, fitted = refit_on_all_rows(X, y, needed, n_jobs)
+
+    classifier = make_classifier(name, best['params'], budget).fit(scaler.transform(X), y)
+    model = Pipeline([('scaler', scaler), ('clf', classifier)])
+    backup_model = Pipeline([('scaler', scaler), ('clf', fitted[BACKUP_MODEL])])
+    risk_factors = risk_factors_from([classifier] + [fitted[key] for key in needed])
+
+    params = dict(best['params'])
+    if budget is not None:
+        params[BUDGETS[name][0]] = budget
+    return model, backup_model, risk_factors, params
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Tune SONAR models with Hyperband / successive halving.")
+    parser.add_argument('--data', default=str(DATA_PATH), help="Training CSV (sonar_data.csv layout)")
+    parser.add_argument('--candidates', nargs='+', choices=list(CANDIDATES), help="Subset of candidates")
+    parser.add_argument('--method', choices=['hyperband', 'halving'], default='hyperband')
+    parser.add_argument('--n-configs', type=int, default=81, help="Trials of --method halving")
+    parser.add_argument('--eta', type=int, default=ETA, help="Keep 1/eta of the trials at each rung")
+    parser.add_argument('--seed', type=int, default=RANDOM_STATE, help="Sampling seed")
+    parser.add_argument('--jobs', type=int, default=-1, help="Parallel jobs (default: all cores)")
+    parser.add_argument('--checkpoint', help="Checkpoint file (default: tuning/<method>-seed<seed>.jsonl)")
+    parser.add_argument('--no-checkpoint', action='store_true', help="Keep results in memory only")
+    add_output_arguments(parser)
+    parser.add_argument('--no-export', action='store_true', help="Only print the search results")
+    parser.add_argument('--report', help="Also write every trial result as JSON")
+    parser.add_argument('--cache-dir', help="Memory-map the scaled folds from this folder")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    X, y = load_dataset(args.data)
+    names = available_candidates(args.candidates)
+    checkpoint_path = None
+    if not args.no_checkpoint:
+        checkpoint_path = Path(args.checkpoint or TUNING_DIR / f"{args.method}-seed{args.seed}.jsonl")
+    checkpoint = TrialCheckpoint(checkpoint_path, data_signature(args.data))
+    runner = TrialRunner(make_fold_cache(X, y, args.cache_dir), checkpoint, args.jobs)
+
+    if args.method == 'hyperband':
+        results = hyperband(runner, names, args.seed, args.eta)
+    else:
+        results = halving(runner, names, args.seed, args.n_configs, args.eta)
+    best = best_full_budget(results)
+
+    print("\n" + "=" * 70)
+    print("BEST FULL-BUDGET TRIALS (5-fold CV)")
+    print("=" * 70)
+    seen = set()
+    for result in sorted(filter(is_full_budget, results), key=lambda result: result['log_loss']):
+        key = trial_key(result['model'], result['params'], result['budget'])
+        if key in seen:
+            continue
+        seen.add(key)
+        print(f"{result['model']:>20}  log loss {result['log_loss']:.4f}  accuracy {result['accuracy']:.4f}  "
+              f"ROC-AUC {result['roc_auc']:.4f}  {json.dumps(result['params'])}")
+        if len(seen) == 10:
+            break
+
+    print(f"\n🎯 Best trial: {best['model']} (log loss {best['log_loss']:.4f}, accuracy {best['accuracy']:.4f}, "
+          f"ROC-AUC {best['roc_auc']:.4f})")
+    print(f"⏱️  Search finished in {time.perf_counter() - start:.1f}s ({runner.fits} new fold fits)")
+
+    if args.report:
+        with open(args.report, 'w') as f:
+            json.dump({'method': args.method, 'eta': args.eta, 'seed': args.seed, 'best': best,
+                       'results': results}, f, indent=2)
+        print(f"💾 Trial results saved to {args.report}")
+
+    if args.no_export:
+        return 0
+
+    model, backup_model, risk_factors, params = build_tuned_model(X, y, best, args.jobs)
+    output_dir = output_dir_from(args)
+    export_models(output_dir, model, backup_model, risk_factors, best['model'], best, params)
+    print(f"✅ Exported tuned {best['model']} to {output_dir} in {time.perf_counter() - start:.1f}s total")
+    print_deploy_hint(output_dir)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())